@@ -0,0 +1,135 @@
+"""
+Admin API routes - operational stats
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import case, func, select
+from datetime import datetime, timedelta
+
+from app.db.database import get_async_db
+from app.db.models import User, LLMUsage
+from app.core.security import get_current_admin
+from app.services.ai_service import ai_service
+from app.services.usage_service import usage_recorder
+from app.services.meta_service import meta_service
+from app.services.webhook_service import webhook_processor
+
+router = APIRouter()
+
+USAGE_GROUPS = {
+    "user": LLMUsage.user_id,
+    "route": LLMUsage.route,
+    "method": LLMUsage.method,
+    "model": LLMUsage.model
+}
+
+def _p95_latencies(group_column, since: datetime):
+    """
+    95th percentile latency per group, computed by the database
+
+    Rows are ranked by latency within their group and only the row at
+    95% of the group's count comes back (SQLite has no percentile function).
+    """
+    ranked = select(
+        group_column.label("key"),
+        LLMUsage.latency_ms,
+        func.row_number().over(partition_by=group_column, order_by=LLMUsage.latency_ms).label("rank"),
+        func.count().over(partition_by=group_column).label("total")
+    ).where(
+        LLMUsage.created_at >= since,
+        LLMUsage.latency_ms.isnot(None)
+    ).subquery()
+    return select(ranked.c.key, ranked.c.latency_ms).where(
+        ranked.c.rank == ranked.c.total * 95 // 100 + 1
+    )
+
+# ============== Routes ==============
+
+@router.get("/ai-cache")
+async def get_ai_cache_stats(
+    current_user: User = Depends(get_current_admin)
+):
+    """Hit/miss counts for the generate_content / generate_strategy cache (this worker)"""
+    return await ai_service.cache.stats()
+
+@router.get("/ai-coalescing")
+async def get_ai_coalescing_stats(
+    current_user: User = Depends(get_current_admin)
+):
+    """How many AI calls were shared with an identical in-flight call (this worker)"""
+    return ai_service.flight.stats()
+
+@router.get("/meta-rate-limits")
+async def get_meta_rate_limits(
+    current_user: User = Depends(get_current_admin)
+):
+    """Reported Meta usage and token bucket state per app / object / ad account (this worker)"""
+    return meta_service.rate_limiter.stats()
+
+@router.get("/meta-cache")
+async def get_meta_cache_stats(
+    current_user: User = Depends(get_current_admin)
+):
+    """Hit/miss counts for the Meta pages / Instagram / ad accounts cache (this worker)"""
+    return await meta_service.metadata_cache.stats()
+
+@router.get("/meta-webhooks")
+async def get_meta_webhook_stats(
+    current_user: User = Depends(get_current_admin)
+):
+    """Webhook notifications received, applied and still queued (this worker)"""
+    return webhook_processor.stats()
+
+@router.get("/usage")
+async def get_llm_usage(
+    days: int = 7,
+    group_by: str = "route",  # user, route, method, model
+    current_user: User = Depends(get_current_admin),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Token usage and latency of Claude calls, aggregated per user, route, method or model"""
+    group_column = USAGE_GROUPS.get(group_by)
+    if group_column is None:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {', '.join(USAGE_GROUPS)}")
+    
+    # Include this worker's rows that are still buffered
+    await usage_recorder.flush()
+    since = datetime.utcnow() - timedelta(days=days)
+    
+    rows = (await db.execute(select(
+        group_column.label("key"),
+        func.count(LLMUsage.id).label("calls"),
+        func.sum(case((LLMUsage.status == "ok", 0), else_=1)).label("failed_calls"),
+        func.sum(LLMUsage.input_tokens).label("input_tokens"),
+        func.sum(LLMUsage.output_tokens).label("output_tokens"),
+        func.sum(LLMUsage.cache_read_input_tokens).label("cache_read_input_tokens"),
+        func.sum(LLMUsage.cache_creation_input_tokens).label("cache_creation_input_tokens"),
+        func.avg(LLMUsage.queue_wait_ms).label("avg_queue_wait_ms"),
+        func.avg(LLMUsage.time_to_first_token_ms).label("avg_time_to_first_token_ms"),
+        func.avg(LLMUsage.latency_ms).label("avg_latency_ms")
+    ).where(
+        LLMUsage.created_at >= since
+    ).group_by(group_column).order_by(func.sum(LLMUsage.input_tokens).desc()))).all()
+    
+    p95_latencies = dict((await db.execute(_p95_latencies(group_column, since))).all())
+    
+    return {
+        "days": days,
+        "group_by": group_by,
+        "groups": [
+            {
+                "key": row.key,
+                "calls": row.calls,
+                "failed_calls": row.failed_calls or 0,
+                "input_tokens": row.input_tokens or 0,
+                "output_tokens": row.output_tokens or 0,
+                "cache_read_input_tokens": row.cache_read_input_tokens or 0,
+                "cache_creation_input_tokens": row.cache_creation_input_tokens or 0,
+                "avg_queue_wait_ms": round(row.avg_queue_wait_ms or 0),
+                "avg_time_to_first_token_ms": round(row.avg_time_to_first_token_ms or 0),
+                "avg_latency_ms": round(row.avg_latency_ms or 0),
+                "p95_latency_ms": p95_latencies.get(row.key)
+            }
+            for row in rows
+        ]
+    }
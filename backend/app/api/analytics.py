@@ -1,18 +1,25 @@
 """
 Analytics API routes
 """
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
 from pydantic import BaseModel
 from typing import Optional, List, Dict
 from datetime import datetime, timedelta
 
-from app.db.database import get_db
+from app.db.database import get_async_db
 from app.db.models import User, Content, ContentAnalytics, Campaign, MetaAccount
 from app.core.security import get_current_user
+from app.core.config import settings
 from app.services.ai_service import ai_service
 from app.services.meta_service import meta_service
+from app.services.concurrency import cancel_on_disconnect
+from app.services.analytics_service import apply_insights, content_metrics, refresh_contents, usage_account_id
+from app.services.job_queue import enqueue, serialize
+from app.services.meta_rate_limiter import Priority
 
 router = APIRouter()
 
@@ -52,33 +59,33 @@ class ContentAnalyticsResponse(BaseModel):
 async def get_analytics_overview(
     days: int = 30,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> AnalyticsOverview:
     """Get analytics overview for the user"""
     since = datetime.utcnow() - timedelta(days=days)
     
     # Get content counts
-    total_content = db.query(Content).filter(
+    total_content = await db.scalar(select(func.count(Content.id)).where(
         Content.user_id == current_user.id,
         Content.created_at >= since
-    ).count()
+    ))
     
-    published_content = db.query(Content).filter(
+    published_content = await db.scalar(select(func.count(Content.id)).where(
         Content.user_id == current_user.id,
         Content.status == "published",
         Content.published_at >= since
-    ).count()
+    ))
     
     # Get aggregated analytics
-    analytics = db.query(
+    analytics = (await db.execute(select(
         func.sum(ContentAnalytics.impressions).label("impressions"),
         func.sum(ContentAnalytics.reach).label("reach"),
         func.sum(ContentAnalytics.engagement).label("engagement"),
         func.sum(ContentAnalytics.spend).label("spend")
-    ).join(Content).filter(
+    ).select_from(ContentAnalytics).join(Content).where(
         Content.user_id == current_user.id,
         Content.published_at >= since
-    ).first()
+    ))).first()
     
     # Calculate engagement rate
     total_impressions = analytics.impressions or 0
@@ -86,14 +93,14 @@ async def get_analytics_overview(
     engagement_rate = (total_engagement / total_impressions * 100) if total_impressions > 0 else 0
     
     # Find best performing content type
-    best_type = db.query(
+    best_type = (await db.execute(select(
         Content.content_type,
         func.avg(ContentAnalytics.engagement).label("avg_engagement")
-    ).join(ContentAnalytics).filter(
+    ).join(ContentAnalytics).where(
         Content.user_id == current_user.id
     ).group_by(Content.content_type).order_by(
         func.avg(ContentAnalytics.engagement).desc()
-    ).first()
+    ))).first()
     
     return AnalyticsOverview(
         total_content=total_content,
@@ -110,20 +117,20 @@ async def get_analytics_overview(
 async def get_content_analytics(
     content_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get analytics for specific content"""
-    content = db.query(Content).filter(
+    content = await db.scalar(select(Content).where(
         Content.id == content_id,
         Content.user_id == current_user.id
-    ).first()
+    ))
     
     if not content:
         raise HTTPException(status_code=404, detail="Content not found")
     
-    analytics = db.query(ContentAnalytics).filter(
+    analytics = await db.scalar(select(ContentAnalytics).where(
         ContentAnalytics.content_id == content_id
-    ).first()
+    ))
     
     if not analytics:
         return {
@@ -159,15 +166,16 @@ async def get_content_analytics(
 @router.post("/content/{content_id}/refresh")
 async def refresh_content_analytics(
     content_id: int,
+    background: bool = False,  # Return a job right away instead of waiting for Meta
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Refresh analytics from Meta API"""
-    content = db.query(Content).filter(
+    content = await db.scalar(select(Content).where(
         Content.id == content_id,
         Content.user_id == current_user.id,
         Content.status == "published"
-    ).first()
+    ))
     
     if not content:
         raise HTTPException(status_code=404, detail="Published content not found")
@@ -175,102 +183,124 @@ async def refresh_content_analytics(
     if not content.meta_post_id:
         raise HTTPException(status_code=400, detail="No Meta post ID")
     
+    # The background sync keeps analytics fresh; don't call Meta again for recent data
+    analytics = await db.scalar(select(ContentAnalytics).where(
+        ContentAnalytics.content_id == content_id
+    ))
+    
+    if analytics and analytics.last_updated and (
+        datetime.utcnow() - analytics.last_updated.replace(tzinfo=None)
+    ).total_seconds() < settings.analytics_min_refresh_seconds:
+        return {"status": "fresh", "content_id": content_id}
+    
     # Get Meta account
-    account = db.query(MetaAccount).filter(
+    account = await db.scalar(select(MetaAccount).where(
         MetaAccount.user_id == current_user.id,
         MetaAccount.is_active == True
-    ).first()
+    ))
     
     if not account:
         raise HTTPException(status_code=400, detail="No active Meta account")
     
+    if background:
+        job = await db.run_sync(enqueue, "refresh_content_analytics", {"content_id": content_id}, user_id=current_user.id, priority=Priority.LOW)
+        return JSONResponse(status_code=202, content=jsonable_encoder(serialize(job)))
+    
     # Fetch insights from Meta
     try:
         insights = await meta_service.get_post_insights(
             media_id=content.meta_post_id,
-            access_token=account.access_token
+            access_token=account.access_token,
+            account_id=usage_account_id(account)
         )
         
         if "error" in insights:
             raise HTTPException(status_code=400, detail=insights["error"]["message"])
         
         # Update analytics
-        analytics = db.query(ContentAnalytics).filter(
-            ContentAnalytics.content_id == content_id
-        ).first()
-        
         if not analytics:
             analytics = ContentAnalytics(content_id=content_id)
             db.add(analytics)
         
-        # Parse insights data
-        for metric in insights.get("data", []):
-            name = metric.get("name")
-            value = metric.get("values", [{}])[0].get("value", 0)
-            
-            if name == "impressions":
-                analytics.impressions = value
-            elif name == "reach":
-                analytics.reach = value
-            elif name == "engagement":
-                analytics.engagement = value
-            elif name == "likes":
-                analytics.likes = value
-            elif name == "comments":
-                analytics.comments = value
-            elif name == "shares":
-                analytics.shares = value
-            elif name == "saved":
-                analytics.saves = value
-        
-        analytics.last_updated = datetime.utcnow()
-        db.commit()
+        apply_insights(analytics, insights)
+        await db.commit()
         
         return {"status": "refreshed", "content_id": content_id}
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/refresh")
+async def refresh_all_analytics(
+    campaign_id: Optional[int] = None,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Refresh analytics of all published content (optionally of one campaign) in batched Meta calls"""
+    account = await db.scalar(select(MetaAccount).where(
+        MetaAccount.user_id == current_user.id,
+        MetaAccount.is_active == True
+    ))
+    
+    if not account:
+        raise HTTPException(status_code=400, detail="No active Meta account")
+    
+    query = select(Content).where(
+        Content.user_id == current_user.id,
+        Content.status == "published",
+        Content.meta_post_id.isnot(None)
+    )
+    
+    if campaign_id is not None:
+        query = query.where(Content.campaign_id == campaign_id)
+    
+    result = await refresh_contents(db, (await db.scalars(query)).all(), account.access_token, usage_account_id(account))
+    
+    return {
+        "status": "refreshed",
+        "refreshed": len(result["refreshed"]),
+        "failed": [
+            {"content_id": content_id, "error": error}
+            for content_id, error in result["failed"].items()
+        ]
+    }
+
 @router.post("/content/{content_id}/analyze")
 async def analyze_content_performance(
     content_id: int,
+    http_request: Request,
+    background: bool = False,  # Return a job right away instead of waiting for the AI
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get AI analysis of content performance"""
-    content = db.query(Content).filter(
+    content = await db.scalar(select(Content).where(
         Content.id == content_id,
         Content.user_id == current_user.id
-    ).first()
+    ))
     
     if not content:
         raise HTTPException(status_code=404, detail="Content not found")
     
-    analytics = db.query(ContentAnalytics).filter(
+    analytics = await db.scalar(select(ContentAnalytics).where(
         ContentAnalytics.content_id == content_id
-    ).first()
+    ))
     
     if not analytics:
         raise HTTPException(status_code=400, detail="No analytics available")
     
-    metrics = {
-        "impressions": analytics.impressions,
-        "reach": analytics.reach,
-        "engagement": analytics.engagement,
-        "likes": analytics.likes,
-        "comments": analytics.comments,
-        "shares": analytics.shares,
-        "clicks": analytics.clicks,
-        "spend": analytics.spend,
-        "cpc": analytics.cpc,
-        "roas": analytics.roas
-    }
+    if background:
+        job = await db.run_sync(enqueue, "analyze_content_performance", {"content_id": content_id}, user_id=current_user.id)
+        return JSONResponse(status_code=202, content=jsonable_encoder(serialize(job)))
+    
+    metrics = content_metrics(analytics)
     
-    analysis = await ai_service.analyze_performance(
+    analysis = await cancel_on_disconnect(http_request, ai_service.analyze_performance(
         metrics=metrics,
         content_type=content.content_type,
-        industry=current_user.company_name
-    )
+        industry=current_user.company_name,
+        user_id=current_user.id
+    ))
     
     return {
         "content_id": content_id,
@@ -282,37 +312,37 @@ async def analyze_content_performance(
 async def get_campaign_analytics(
     campaign_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get analytics for a campaign"""
-    campaign = db.query(Campaign).filter(
+    campaign = await db.scalar(select(Campaign).where(
         Campaign.id == campaign_id,
         Campaign.user_id == current_user.id
-    ).first()
+    ))
     
     if not campaign:
         raise HTTPException(status_code=404, detail="Campaign not found")
     
     # Get aggregated analytics for campaign content
-    analytics = db.query(
+    analytics = (await db.execute(select(
         func.count(Content.id).label("content_count"),
         func.sum(ContentAnalytics.impressions).label("impressions"),
         func.sum(ContentAnalytics.reach).label("reach"),
         func.sum(ContentAnalytics.engagement).label("engagement"),
         func.sum(ContentAnalytics.spend).label("spend"),
         func.sum(ContentAnalytics.conversions).label("conversions")
-    ).join(ContentAnalytics, Content.id == ContentAnalytics.content_id).filter(
+    ).join(ContentAnalytics, Content.id == ContentAnalytics.content_id).where(
         Content.campaign_id == campaign_id
-    ).first()
+    ))).first()
     
     # Get content breakdown
-    content_stats = db.query(
+    content_stats = (await db.execute(select(
         Content.content_type,
         Content.status,
         func.count(Content.id).label("count")
-    ).filter(
+    ).where(
         Content.campaign_id == campaign_id
-    ).group_by(Content.content_type, Content.status).all()
+    ).group_by(Content.content_type, Content.status))).all()
     
     return {
         "campaign_id": campaign_id,
@@ -341,7 +371,7 @@ async def get_top_content(
     limit: int = 10,
     metric: str = "engagement",  # engagement, impressions, reach
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get top performing content"""
     order_column = {
@@ -350,11 +380,11 @@ async def get_top_content(
         "reach": ContentAnalytics.reach
     }.get(metric, ContentAnalytics.engagement)
     
-    results = db.query(Content, ContentAnalytics).join(
+    results = (await db.execute(select(Content, ContentAnalytics).join(
         ContentAnalytics, Content.id == ContentAnalytics.content_id
-    ).filter(
+    ).where(
         Content.user_id == current_user.id
-    ).order_by(order_column.desc()).limit(limit).all()
+    ).order_by(order_column.desc()).limit(limit))).all()
     
     return [
         {
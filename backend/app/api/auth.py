@@ -2,11 +2,12 @@
 Authentication API routes
 """
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, EmailStr
 from datetime import timedelta
 
-from app.db.database import get_db
+from app.db.database import get_async_db
 from app.db.models import User
 from app.core.security import (
     verify_password, 
@@ -46,10 +47,10 @@ class UserResponse(BaseModel):
 # ============== Routes ==============
 
 @router.post("/register", response_model=Token)
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register(user_data: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Register a new user"""
     # Check if user exists
-    existing_user = db.query(User).filter(User.email == user_data.email).first()
+    existing_user = await db.scalar(select(User).where(User.email == user_data.email))
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -64,8 +65,8 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
         company_name=user_data.company_name
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
     
     # Create token
     access_token = create_access_token(
@@ -76,9 +77,9 @@ async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/login", response_model=Token)
-async def login(user_data: UserLogin, db: Session = Depends(get_db)):
+async def login(user_data: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """Login and get access token"""
-    user = db.query(User).filter(User.email == user_data.email).first()
+    user = await db.scalar(select(User).where(User.email == user_data.email))
     
     if not user or not verify_password(user_data.password, user.hashed_password):
         raise HTTPException(
@@ -103,7 +104,7 @@ async def update_me(
     name: str | None = None,
     company_name: str | None = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update current user info"""
     if name:
@@ -111,7 +112,7 @@ async def update_me(
     if company_name:
         current_user.company_name = company_name
     
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
     
     return current_user
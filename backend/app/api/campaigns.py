@@ -1,19 +1,41 @@
 """
 Campaigns API routes
 """
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import Optional, List, Dict
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from app.db.database import get_db
-from app.db.models import User, Campaign, Content
+from app.db.database import get_async_db
+from app.db.models import User, Campaign, Content, Job
 from app.core.security import get_current_user
+from app.core.pagination import paginate
 from app.services.ai_service import ai_service
+from app.services.concurrency import cancel_on_disconnect
+from app.services.job_queue import enqueue, serialize
+from app.services.calendar_service import calendar_payload, calendar_status, plan_calendar
 
 router = APIRouter()
 
+async def _add_content_counts(db: AsyncSession, campaigns: List[Campaign]):
+    """Set content_count on each campaign, with one grouped COUNT for all of them"""
+    if not campaigns:
+        return
+    
+    counts = dict((await db.execute(select(
+        Content.campaign_id,
+        func.count(Content.id)
+    ).where(
+        Content.campaign_id.in_([campaign.id for campaign in campaigns])
+    ).group_by(Content.campaign_id))).all())
+    
+    for campaign in campaigns:
+        campaign.content_count = counts.get(campaign.id, 0)
+
 # ============== Schemas ==============
 
 class CampaignCreateRequest(BaseModel):
@@ -49,6 +71,25 @@ class StrategyRequest(BaseModel):
     goals: str
     budget: Optional[int] = None  # In euros
     duration_days: int = 30
+    force_refresh: bool = False  # Bypass the AI result cache
+
+class CalendarRequest(BaseModel):
+    platform: str = "instagram"
+    start_date: Optional[datetime] = None  # Defaults to campaign start, or tomorrow
+    target_audience: Optional[str] = None
+
+class CalendarJobResponse(BaseModel):
+    id: int  # Also followed by /api/jobs/{id}
+    campaign_id: int
+    status: str  # queued, running, succeeded, failed, dead
+    mode: str  # parallel, batch
+    total: int
+    processed: int
+    failed: int
+    content_ids: List[int]
+    error: Optional[str]
+    created_at: datetime
+    finished_at: Optional[datetime]
 
 class CampaignUpdateRequest(BaseModel):
     name: Optional[str] = None
@@ -68,7 +109,7 @@ class CampaignUpdateRequest(BaseModel):
 async def create_campaign(
     request: CampaignCreateRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new campaign"""
     campaign = Campaign(
@@ -84,8 +125,8 @@ async def create_campaign(
     )
     
     db.add(campaign)
-    db.commit()
-    db.refresh(campaign)
+    await db.commit()
+    await db.refresh(campaign)
     
     # Add content count
     campaign.content_count = 0
@@ -94,23 +135,23 @@ async def create_campaign(
 
 @router.get("/", response_model=List[CampaignResponse])
 async def list_campaigns(
+    response: Response,
     is_active: Optional[bool] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """List all campaigns"""
-    query = db.query(Campaign).filter(Campaign.user_id == current_user.id)
+    """List campaigns, newest first (next page: pass the X-Next-Cursor header as cursor)"""
+    query = select(Campaign).where(Campaign.user_id == current_user.id)
     
     if is_active is not None:
-        query = query.filter(Campaign.is_active == is_active)
+        query = query.where(Campaign.is_active == is_active)
     
-    campaigns = query.order_by(Campaign.created_at.desc()).all()
+    campaigns = await paginate(db, query, [Campaign.created_at, Campaign.id], cursor, limit, response)
     
     # Add content counts
-    for campaign in campaigns:
-        campaign.content_count = db.query(Content).filter(
-            Content.campaign_id == campaign.id
-        ).count()
+    await _add_content_counts(db, campaigns)
     
     return campaigns
 
@@ -118,20 +159,18 @@ async def list_campaigns(
 async def get_campaign(
     campaign_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get specific campaign"""
-    campaign = db.query(Campaign).filter(
+    campaign = await db.scalar(select(Campaign).where(
         Campaign.id == campaign_id,
         Campaign.user_id == current_user.id
-    ).first()
+    ))
     
     if not campaign:
         raise HTTPException(status_code=404, detail="Campaign not found")
     
-    campaign.content_count = db.query(Content).filter(
-        Content.campaign_id == campaign.id
-    ).count()
+    await _add_content_counts(db, [campaign])
     
     return campaign
 
@@ -140,13 +179,13 @@ async def update_campaign(
     campaign_id: int,
     request: CampaignUpdateRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update campaign"""
-    campaign = db.query(Campaign).filter(
+    campaign = await db.scalar(select(Campaign).where(
         Campaign.id == campaign_id,
         Campaign.user_id == current_user.id
-    ).first()
+    ))
     
     if not campaign:
         raise HTTPException(status_code=404, detail="Campaign not found")
@@ -155,12 +194,10 @@ async def update_campaign(
     for field, value in update_data.items():
         setattr(campaign, field, value)
     
-    db.commit()
-    db.refresh(campaign)
+    await db.commit()
+    await db.refresh(campaign)
     
-    campaign.content_count = db.query(Content).filter(
-        Content.campaign_id == campaign.id
-    ).count()
+    await _add_content_counts(db, [campaign])
     
     return campaign
 
@@ -168,52 +205,136 @@ async def update_campaign(
 async def generate_strategy(
     campaign_id: int,
     request: StrategyRequest,
+    http_request: Request,
+    background: bool = False,  # Return a job right away instead of waiting for the AI
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Generate AI strategy for campaign"""
-    campaign = db.query(Campaign).filter(
+    campaign = await db.scalar(select(Campaign).where(
         Campaign.id == campaign_id,
         Campaign.user_id == current_user.id
-    ).first()
+    ))
     
     if not campaign:
         raise HTTPException(status_code=404, detail="Campaign not found")
     
+    if background:
+        job = await db.run_sync(
+            enqueue,
+            "generate_strategy",
+            {"campaign_id": campaign.id, **request.model_dump()},
+            user_id=current_user.id
+        )
+        return JSONResponse(status_code=202, content=jsonable_encoder(serialize(job)))
+    
     # Generate strategy
-    strategy = await ai_service.generate_strategy(
+    strategy = await cancel_on_disconnect(http_request, ai_service.generate_strategy(
         business_description=request.business_description,
         goals=request.goals,
         budget=request.budget,
-        duration_days=request.duration_days
-    )
+        duration_days=request.duration_days,
+        user_id=current_user.id,
+        force_refresh=request.force_refresh
+    ))
     
     # Save to campaign
     if "error" not in strategy:
         campaign.strategy = strategy
         campaign.vibe = strategy.get("vibe", "")
-        db.commit()
+        await db.commit()
     
     return strategy
 
+@router.post("/{campaign_id}/generate-calendar", response_model=CalendarJobResponse, status_code=202)
+async def generate_calendar(
+    campaign_id: int,
+    request: CalendarRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Generate draft content, dated for publication, for every idea of the campaign strategy, as a background job"""
+    campaign = await db.scalar(select(Campaign).where(
+        Campaign.id == campaign_id,
+        Campaign.user_id == current_user.id
+    ))
+    
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    
+    if not campaign.strategy or not campaign.strategy.get("content_ideas"):
+        raise HTTPException(status_code=400, detail="Generate a strategy first")
+    
+    start_date = request.start_date or campaign.start_date or (datetime.utcnow() + timedelta(days=1))
+    planned = plan_calendar(campaign.strategy, start_date)
+    if not planned:
+        raise HTTPException(status_code=400, detail="Strategy has no usable content ideas")
+    
+    target_audience = request.target_audience
+    if not target_audience and campaign.target_audience:
+        target_audience = ", ".join(f"{k}: {v}" for k, v in campaign.target_audience.items())
+    
+    job = await db.run_sync(
+        enqueue,
+        "generate_calendar",
+        calendar_payload(
+            campaign.id,
+            planned,
+            platform=request.platform,
+            brand_voice=campaign.vibe,
+            target_audience=target_audience,
+            objective=campaign.objective
+        ),
+        user_id=current_user.id
+    )
+    
+    return calendar_status(job)
+
+@router.get("/{campaign_id}/calendar-jobs/{job_id}", response_model=CalendarJobResponse)
+async def get_calendar_job(
+    campaign_id: int,
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get progress of a calendar generation job"""
+    job = await db.scalar(select(Job).where(
+        Job.id == job_id,
+        Job.type == "generate_calendar",
+        Job.user_id == current_user.id
+    ))
+    
+    if not job or job.payload["campaign_id"] != campaign_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return calendar_status(job)
+
 @router.get("/{campaign_id}/content", response_model=List[dict])
 async def get_campaign_content(
     campaign_id: int,
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get all content for a campaign"""
-    campaign = db.query(Campaign).filter(
+    """Get a campaign's content, newest first (next page: pass the X-Next-Cursor header as cursor)"""
+    campaign = await db.scalar(select(Campaign).where(
         Campaign.id == campaign_id,
         Campaign.user_id == current_user.id
-    ).first()
+    ))
     
     if not campaign:
         raise HTTPException(status_code=404, detail="Campaign not found")
     
-    contents = db.query(Content).filter(
-        Content.campaign_id == campaign_id
-    ).order_by(Content.created_at.desc()).all()
+    contents = await paginate(
+        db,
+        select(Content).where(Content.campaign_id == campaign_id),
+        [Content.created_at, Content.id],
+        cursor,
+        limit,
+        response
+    )
     
     return [
         {
@@ -232,23 +353,23 @@ async def get_campaign_content(
 async def delete_campaign(
     campaign_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete campaign (and unlink content)"""
-    campaign = db.query(Campaign).filter(
+    campaign = await db.scalar(select(Campaign).where(
         Campaign.id == campaign_id,
         Campaign.user_id == current_user.id
-    ).first()
+    ))
     
     if not campaign:
         raise HTTPException(status_code=404, detail="Campaign not found")
     
     # Unlink content (don't delete)
-    db.query(Content).filter(Content.campaign_id == campaign_id).update(
-        {"campaign_id": None}
-    )
+    await db.execute(update(Content).where(Content.campaign_id == campaign_id).values(
+        campaign_id=None
+    ))
     
-    db.delete(campaign)
-    db.commit()
+    await db.delete(campaign)
+    await db.commit()
     
     return {"status": "deleted"}
@@ -1,16 +1,28 @@
 """
 Chat API routes - Talk to Marko
 """
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
+import anyio
+import json
 
-from app.db.database import get_db
+from app.db.database import get_async_db, AsyncSessionLocal
 from app.db.models import User, Conversation, Message, MetaAccount
 from app.core.security import get_current_user
+from app.core.pagination import paginate
 from app.services.ai_service import ai_service
+from app.services.memory_service import conversation_memory
+from app.services.concurrency import (
+    cancel_on_disconnect,
+    ClientDisconnectedError,
+    QueueTimeoutError
+)
 
 router = APIRouter()
 
@@ -28,6 +40,15 @@ class MessageResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class ConversationSummary(BaseModel):
+    id: int
+    title: str
+    created_at: datetime
+    updated_at: datetime
+    
+    class Config:
+        from_attributes = True
+
 class ConversationResponse(BaseModel):
     id: int
     title: str
@@ -48,85 +69,76 @@ class ChatResponse(BaseModel):
 
 # ============== Routes ==============
 
-@router.get("/conversations", response_model=List[ConversationResponse])
+@router.get("/conversations", response_model=List[ConversationSummary])
 async def get_conversations(
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get all conversations for current user"""
-    conversations = db.query(Conversation).filter(
-        Conversation.user_id == current_user.id
-    ).order_by(Conversation.updated_at.desc()).all()
-    return conversations
+    """
+    Get the current user's conversations, most recently active first
+    
+    Messages aren't included (see /conversations/{id}). Next page: pass
+    the X-Next-Cursor header as cursor.
+    """
+    return await paginate(
+        db,
+        select(Conversation).where(Conversation.user_id == current_user.id),
+        [Conversation.updated_at, Conversation.id],
+        cursor,
+        limit,
+        response
+    )
 
 @router.get("/conversations/{conversation_id}", response_model=ConversationResponse)
 async def get_conversation(
     conversation_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get a specific conversation with messages"""
-    conversation = db.query(Conversation).filter(
+    conversation = await db.scalar(select(Conversation).where(
         Conversation.id == conversation_id,
         Conversation.user_id == current_user.id
-    ).first()
+    ).options(selectinload(Conversation.messages)))
     
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
     return conversation
 
-@router.post("/send", response_model=ChatResponse)
-async def send_message(
-    request: ChatRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Send a message to Marko and get a response"""
-    
-    # Get or create conversation
+async def _get_or_create_conversation(
+    db: AsyncSession,
+    current_user: User,
+    request: ChatRequest
+) -> Conversation:
     if request.conversation_id:
-        conversation = db.query(Conversation).filter(
+        conversation = await db.scalar(select(Conversation).where(
             Conversation.id == request.conversation_id,
             Conversation.user_id == current_user.id
-        ).first()
+        ))
         if not conversation:
             raise HTTPException(status_code=404, detail="Conversation not found")
-    else:
-        # Create new conversation
-        conversation = Conversation(
-            user_id=current_user.id,
-            title=request.message[:50] + "..." if len(request.message) > 50 else request.message
-        )
-        db.add(conversation)
-        db.commit()
-        db.refresh(conversation)
+        return conversation
     
-    # Save user message
-    user_message = Message(
-        conversation_id=conversation.id,
-        role="user",
-        content=request.message
+    # Create new conversation
+    conversation = Conversation(
+        user_id=current_user.id,
+        title=request.message[:50] + "..." if len(request.message) > 50 else request.message,
+        updated_at=datetime.utcnow()  # Set from the start: conversations are listed (and paginated) by it
     )
-    db.add(user_message)
-    db.commit()
-    db.refresh(user_message)
-    
-    # Build message history for AI
-    messages = db.query(Message).filter(
-        Message.conversation_id == conversation.id
-    ).order_by(Message.created_at).all()
-    
-    ai_messages = [
-        {"role": m.role, "content": m.content}
-        for m in messages
-    ]
-    
-    # Build context
-    meta_account = db.query(MetaAccount).filter(
+    db.add(conversation)
+    await db.commit()
+    await db.refresh(conversation)
+    return conversation
+
+async def _build_context(db: AsyncSession, current_user: User, summary: Optional[str] = None) -> dict:
+    meta_account = await db.scalar(select(MetaAccount).where(
         MetaAccount.user_id == current_user.id,
         MetaAccount.is_active == True
-    ).first()
+    ))
     
     context = {
         "user_name": current_user.name,
@@ -138,60 +150,181 @@ async def send_message(
         context["instagram_username"] = meta_account.instagram_username
         context["facebook_page"] = meta_account.facebook_page_name
     
-    # Get AI response
-    try:
-        ai_response_text = await ai_service.chat(ai_messages, context)
-    except Exception as e:
-        ai_response_text = f"Désolé, j'ai rencontré un problème technique. Erreur: {str(e)}"
+    if summary:
+        context["summary"] = summary
     
-    # Save AI response
-    ai_message = Message(
+    return context
+
+async def _save_user_message(db: AsyncSession, conversation: Conversation, content: str) -> Message:
+    user_message = Message(
         conversation_id=conversation.id,
+        role="user",
+        content=content
+    )
+    db.add(user_message)
+    await db.commit()
+    await db.refresh(user_message)
+    return user_message
+
+async def _save_ai_message(
+    db: AsyncSession,
+    conversation_id: int,
+    content: str,
+    extra_data: Optional[dict] = None
+) -> Message:
+    ai_message = Message(
+        conversation_id=conversation_id,
         role="assistant",
-        content=ai_response_text
+        content=content,
+        extra_data=extra_data or {}
     )
     db.add(ai_message)
     
     # Update conversation
-    conversation.updated_at = datetime.utcnow()
+    await db.execute(update(Conversation).where(Conversation.id == conversation_id).values(
+        updated_at=datetime.utcnow()
+    ))
+    
+    await db.commit()
+    await db.refresh(ai_message)
+    return ai_message
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@router.post("/send", response_model=ChatResponse)
+async def send_message(
+    request: ChatRequest,
+    http_request: Request,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Send a message to Marko and get a response"""
+    conversation = await _get_or_create_conversation(db, current_user, request)
+    user_message = await _save_user_message(db, conversation, request.message)
+    ai_messages, summary = await conversation_memory.load(db, conversation)
+    context = await _build_context(db, current_user, summary)
+    
+    # Get AI response
+    try:
+        ai_response_text = await cancel_on_disconnect(
+            http_request,
+            ai_service.chat(ai_messages, context, user_id=current_user.id)
+        )
+    except (ClientDisconnectedError, QueueTimeoutError):
+        raise
+    except Exception as e:
+        ai_response_text = f"Désolé, j'ai rencontré un problème technique. Erreur: {str(e)}"
+    
+    ai_message = await _save_ai_message(db, conversation.id, ai_response_text)
     
-    db.commit()
-    db.refresh(ai_message)
+    if await conversation_memory.needs_refresh(db, conversation):
+        background_tasks.add_task(conversation_memory.refresh, conversation.id, current_user.id)
     
     return ChatResponse(
         conversation_id=conversation.id,
-        message=MessageResponse(
-            id=user_message.id,
-            role=user_message.role,
-            content=user_message.content,
-            created_at=user_message.created_at
-        ),
-        response=MessageResponse(
-            id=ai_message.id,
-            role=ai_message.role,
-            content=ai_message.content,
-            created_at=ai_message.created_at
-        )
+        message=MessageResponse.model_validate(user_message),
+        response=MessageResponse.model_validate(ai_message)
+    )
+
+@router.post("/send/stream")
+async def send_message_stream(
+    request: ChatRequest,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Send a message to Marko and stream the response as server-sent events
+    
+    Events:
+        start: {"conversation_id", "message"} - the saved user message
+        token: {"text"} - a chunk of the assistant response
+        error: {"detail"} - generation failed, an apology is saved instead
+        done: {"response"} - the saved assistant message
+    
+    If the client disconnects or the stream fails mid-way, whatever was
+    generated so far is saved with extra_data {"partial": true} (plus
+    "error" for a failure).
+    """
+    conversation = await _get_or_create_conversation(db, current_user, request)
+    user_message = await _save_user_message(db, conversation, request.message)
+    ai_messages, summary = await conversation_memory.load(db, conversation)
+    context = await _build_context(db, current_user, summary)
+    
+    # Counted before this turn's reply, which only delays the refresh by a turn
+    if await conversation_memory.needs_refresh(db, conversation):
+        background_tasks.add_task(conversation_memory.refresh, conversation.id, current_user.id)
+    
+    conversation_id = conversation.id
+    user_id = current_user.id
+    start_event = _sse("start", {
+        "conversation_id": conversation_id,
+        "message": MessageResponse.model_validate(user_message).model_dump(mode="json")
+    })
+    
+    async def event_stream():
+        chunks = []
+        # Until the stream completes, whatever was received is a partial reply
+        extra_data = {"partial": True}
+        yield start_event
+        try:
+            try:
+                async for text in ai_service.chat_stream(ai_messages, context, user_id=user_id):
+                    chunks.append(text)
+                    yield _sse("token", {"text": text})
+                extra_data = {}
+            except Exception as e:
+                if chunks:
+                    extra_data = {"partial": True, "error": str(e)}
+                else:
+                    extra_data = {"error": str(e)}
+                    chunks.append(f"Désolé, j'ai rencontré un problème technique. Erreur: {str(e)}")
+                yield _sse("error", {"detail": str(e)})
+        finally:
+            # The request-scoped session may already be closed, use our own.
+            # Shielded: on a disconnect this runs inside the cancelled scope,
+            # which would cancel the save too
+            ai_message = None
+            if chunks:
+                with anyio.CancelScope(shield=True):
+                    async with AsyncSessionLocal() as stream_db:
+                        ai_message = await _save_ai_message(
+                            stream_db,
+                            conversation_id,
+                            "".join(chunks),
+                            extra_data=extra_data
+                        )
+                        response = MessageResponse.model_validate(ai_message).model_dump(mode="json")
+        
+        if ai_message is not None:
+            yield _sse("done", {"response": response})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 @router.delete("/conversations/{conversation_id}")
 async def delete_conversation(
     conversation_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a conversation"""
-    conversation = db.query(Conversation).filter(
+    conversation = await db.scalar(select(Conversation).where(
         Conversation.id == conversation_id,
         Conversation.user_id == current_user.id
-    ).first()
+    ))
     
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
     # Delete messages first
-    db.query(Message).filter(Message.conversation_id == conversation_id).delete()
-    db.delete(conversation)
-    db.commit()
+    await db.execute(delete(Message).where(Message.conversation_id == conversation_id))
+    await db.delete(conversation)
+    await db.commit()
     
     return {"status": "deleted"}
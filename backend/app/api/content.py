@@ -1,17 +1,28 @@
 """
 Content API routes - Create and manage content
 """
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from app.db.database import get_db
+from app.db.database import get_async_db
 from app.db.models import User, Content, ContentAnalytics, MetaAccount
 from app.core.security import get_current_user
+from app.core.config import settings
+from app.core.idempotency import fingerprint, idempotent
+from app.core.pagination import paginate
 from app.services.ai_service import ai_service
-from app.services.meta_service import meta_service
+from app.services.concurrency import cancel_on_disconnect
+from app.services.publishing_service import (
+    ContainerProcessingError, PublishError, PublishInProgressError, publish_now, wait_for_publish
+)
+from app.services.job_queue import enqueue, serialize
+from app.services.meta_rate_limiter import Priority
 
 router = APIRouter()
 
@@ -24,6 +35,7 @@ class ContentGenerateRequest(BaseModel):
     brand_voice: Optional[str] = None
     target_audience: Optional[str] = None
     objective: Optional[str] = None
+    force_refresh: bool = False  # Bypass the AI result cache
 
 class ContentCreateRequest(BaseModel):
     title: Optional[str] = None
@@ -74,17 +86,20 @@ class ContentUpdateRequest(BaseModel):
 @router.post("/generate")
 async def generate_content(
     request: ContentGenerateRequest,
+    http_request: Request,
     current_user: User = Depends(get_current_user)
 ):
     """Generate content using AI"""
-    result = await ai_service.generate_content(
+    result = await cancel_on_disconnect(http_request, ai_service.generate_content(
         content_type=request.content_type,
         platform=request.platform,
         brief=request.brief,
         brand_voice=request.brand_voice,
         target_audience=request.target_audience,
-        objective=request.objective
-    )
+        objective=request.objective,
+        user_id=current_user.id,
+        force_refresh=request.force_refresh
+    ))
     
     return result
 
@@ -92,7 +107,7 @@ async def generate_content(
 async def create_content(
     request: ContentCreateRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create new content"""
     content = Content(
@@ -112,44 +127,45 @@ async def create_content(
     )
     
     db.add(content)
-    db.commit()
-    db.refresh(content)
+    await db.commit()
+    await db.refresh(content)
     
     return content
 
 @router.get("/", response_model=List[ContentResponse])
 async def list_content(
+    response: Response,
     status: Optional[str] = None,
     content_type: Optional[str] = None,
     platform: Optional[str] = None,
-    limit: int = 50,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """List all content"""
-    query = db.query(Content).filter(Content.user_id == current_user.id)
+    """List content, newest first (next page: pass the X-Next-Cursor header as cursor)"""
+    query = select(Content).where(Content.user_id == current_user.id)
     
     if status:
-        query = query.filter(Content.status == status)
+        query = query.where(Content.status == status)
     if content_type:
-        query = query.filter(Content.content_type == content_type)
+        query = query.where(Content.content_type == content_type)
     if platform:
-        query = query.filter(Content.platform == platform)
+        query = query.where(Content.platform == platform)
     
-    contents = query.order_by(Content.created_at.desc()).limit(limit).all()
-    return contents
+    return await paginate(db, query, [Content.created_at, Content.id], cursor, limit, response)
 
 @router.get("/{content_id}", response_model=ContentResponse)
 async def get_content(
     content_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get specific content"""
-    content = db.query(Content).filter(
+    content = await db.scalar(select(Content).where(
         Content.id == content_id,
         Content.user_id == current_user.id
-    ).first()
+    ))
     
     if not content:
         raise HTTPException(status_code=404, detail="Content not found")
@@ -161,13 +177,13 @@ async def update_content(
     content_id: int,
     request: ContentUpdateRequest,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Update content"""
-    content = db.query(Content).filter(
+    """Update content (not while it is being published)"""
+    content = await db.scalar(select(Content).where(
         Content.id == content_id,
         Content.user_id == current_user.id
-    ).first()
+    ))
     
     if not content:
         raise HTTPException(status_code=404, detail="Content not found")
@@ -176,119 +192,140 @@ async def update_content(
         raise HTTPException(status_code=400, detail="Cannot edit published content")
     
     update_data = request.model_dump(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(content, field, value)
+    if update_data.get("status") == "scheduled" and content.status != "scheduled":
+        # Rescheduled (e.g. after failing): start over with a full set of attempts
+        update_data.update(
+            publish_attempts=0,
+            last_error=None,
+            lease_owner=None,
+            lease_expires_at=None,
+            meta_container_id=None,
+            meta_container_created_at=None
+        )
+    
+    if update_data:
+        # Conditional, so the scheduler can't claim the row between the check and the write
+        result = await db.execute(update(Content).where(
+            Content.id == content.id,
+            Content.status.notin_(["publishing", "published"])
+        ).values(**update_data).execution_options(synchronize_session=False))
+        await db.commit()
+        if not result.rowcount:
+            await db.refresh(content)
+            if content.status == "published":
+                raise HTTPException(status_code=400, detail="Cannot edit published content")
+            raise HTTPException(status_code=409, detail="Content is being published, try again once it is done")
     
-    db.commit()
-    db.refresh(content)
+    await db.refresh(content)
     
     return content
 
-@router.post("/{content_id}/publish")
-async def publish_content(
-    content_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Publish content to Meta"""
-    content = db.query(Content).filter(
+def _published(content: Content) -> dict:
+    return {
+        "status": "published",
+        "post_id": content.meta_post_id,
+        "platform": content.platform
+    }
+
+async def _publish_content(content_id: int, background: bool, current_user: User, db: AsyncSession):
+    content = await db.scalar(select(Content).where(
         Content.id == content_id,
         Content.user_id == current_user.id
-    ).first()
+    ))
     
     if not content:
         raise HTTPException(status_code=404, detail="Content not found")
     
+    # A retry of a publish that went through gets the same result
     if content.status == "published":
-        raise HTTPException(status_code=400, detail="Content already published")
+        return _published(content)
     
     # Get Meta account
-    account = db.query(MetaAccount).filter(
+    account = await db.scalar(select(MetaAccount).where(
         MetaAccount.user_id == current_user.id,
         MetaAccount.is_active == True
-    ).first()
+    ))
     
     if not account:
         raise HTTPException(status_code=400, detail="No active Meta account")
     
-    # Build caption with hashtags
-    full_caption = content.caption or ""
-    if content.hashtags:
-        full_caption += "\n\n" + " ".join([f"#{h}" for h in content.hashtags])
+    if background:
+        job = await db.run_sync(enqueue, "publish_content", {"content_id": content.id}, user_id=current_user.id, priority=Priority.HIGH)
+        return JSONResponse(status_code=202, content=jsonable_encoder(serialize(job)))
     
-    # Publish based on platform
-    if content.platform == "instagram":
-        if not account.instagram_account_id:
-            raise HTTPException(status_code=400, detail="No Instagram account connected")
-        
-        media_url = content.media_urls[0] if content.media_urls else None
-        
-        result = await meta_service.publish_to_instagram(
-            ig_user_id=account.instagram_account_id,
-            access_token=account.access_token,
-            caption=full_caption,
-            image_url=media_url if content.content_type != "reel" else None,
-            video_url=media_url if content.content_type in ["reel", "video"] else None,
-            media_type="REELS" if content.content_type == "reel" else "IMAGE"
+    try:
+        await publish_now(db, content)
+    except ContainerProcessingError as e:
+        # Videos take a while: a job finishes the publish once Instagram processed the media
+        job = await db.run_sync(
+            enqueue,
+            "publish_content",
+            {"content_id": content.id},
+            user_id=current_user.id,
+            priority=Priority.HIGH,
+            run_at=datetime.utcnow() + timedelta(seconds=e.retry_after)
         )
+        return JSONResponse(status_code=202, content=jsonable_encoder(serialize(job)))
+    except PublishInProgressError as e:
+        # Share the outcome of the publish already in flight instead of calling Meta again
+        content = await wait_for_publish(db, content, settings.publish_wait_seconds)
+        if content.status == "failed":
+            raise HTTPException(status_code=400, detail=content.last_error or "Publishing failed")
+        if content.status != "published":
+            raise HTTPException(status_code=409, detail=str(e))
+    except PublishError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    elif content.platform == "facebook":
-        if not account.facebook_page_id:
-            raise HTTPException(status_code=400, detail="No Facebook page connected")
-        
-        media_url = content.media_urls[0] if content.media_urls else None
-        
-        result = await meta_service.publish_to_facebook(
-            page_id=account.facebook_page_id,
-            page_token=account.access_token,
-            message=full_caption,
-            link=content.link_url,
-            photo_url=media_url
-        )
-    
-    else:
-        raise HTTPException(status_code=400, detail="Invalid platform")
-    
-    if "error" in result:
-        content.status = "failed"
-        db.commit()
-        raise HTTPException(status_code=400, detail=result["error"]["message"])
-    
-    # Update content status
-    content.status = "published"
-    content.published_at = datetime.utcnow()
-    content.meta_post_id = result.get("id")
+    return _published(content)
+
+@router.post("/{content_id}/publish")
+async def publish_content(
+    content_id: int,
+    background: bool = False,  # Return a job right away instead of waiting for Meta
+    idempotency_key: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Publish content to Meta
     
-    # Create analytics entry
-    analytics = ContentAnalytics(content_id=content.id)
-    db.add(analytics)
+    Safe to retry: a content goes out once, and concurrent or repeated
+    publishes get the first attempt's result. With an Idempotency-Key
+    header, retries also get the first response back as is (the same job
+    with background=true).
     
-    db.commit()
+    Instagram videos still being processed answer 202 with the job that
+    finishes the publish once they are ready.
+    """
+    if not idempotency_key:
+        return await _publish_content(content_id, background, current_user, db)
     
-    return {
-        "status": "published",
-        "post_id": content.meta_post_id,
-        "platform": content.platform
-    }
+    return await idempotent(
+        db,
+        current_user.id,
+        idempotency_key,
+        fingerprint("content.publish", content_id, background),
+        lambda: _publish_content(content_id, background, current_user, db)
+    )
 
 @router.delete("/{content_id}")
 async def delete_content(
     content_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete content"""
-    content = db.query(Content).filter(
+    content = await db.scalar(select(Content).where(
         Content.id == content_id,
         Content.user_id == current_user.id
-    ).first()
+    ))
     
     if not content:
         raise HTTPException(status_code=404, detail="Content not found")
     
     # Delete analytics if exists
-    db.query(ContentAnalytics).filter(ContentAnalytics.content_id == content_id).delete()
-    db.delete(content)
-    db.commit()
+    await db.execute(delete(ContentAnalytics).where(ContentAnalytics.content_id == content_id))
+    await db.delete(content)
+    await db.commit()
     
     return {"status": "deleted"}
@@ -0,0 +1,84 @@
+"""
+Jobs API routes - follow background jobs
+"""
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+import json
+
+from app.db.database import get_async_db, AsyncSessionLocal
+from app.db.models import User, Job
+from app.core.security import get_current_user
+from app.core.config import settings
+from app.services.job_queue import FINISHED_STATUSES, serialize
+
+router = APIRouter()
+
+async def _get_job(db: AsyncSession, job_id: int, user: User) -> Job:
+    job = await db.scalar(select(Job).where(
+        Job.id == job_id,
+        Job.user_id == user.id
+    ))
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return job
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+# ============== Routes ==============
+
+@router.get("/{job_id}")
+async def get_job(
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get a job's status and, once finished, its result or error"""
+    return serialize(await _get_job(db, job_id, current_user))
+
+@router.get("/{job_id}/events")
+async def stream_job_events(
+    job_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Follow a job as Server-Sent Events
+    
+    Events:
+    - status: {job} whenever its status or attempt count changes
+    - done: {job} once it succeeded, failed or is dead; the stream then ends
+    """
+    await _get_job(db, job_id, current_user)
+    user_id = current_user.id
+    
+    async def event_stream():
+        last = None
+        while not await request.is_disconnected():
+            async with AsyncSessionLocal() as stream_db:
+                job = serialize((await stream_db.execute(select(Job).where(
+                    Job.id == job_id,
+                    Job.user_id == user_id
+                ))).scalar_one())
+            
+            if job["status"] in FINISHED_STATUSES:
+                yield _sse("done", job)
+                return
+            
+            if (job["status"], job["attempts"]) != last:
+                last = (job["status"], job["attempts"])
+                yield _sse("status", job)
+            
+            await asyncio.sleep(settings.job_events_poll_seconds)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
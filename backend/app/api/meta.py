@@ -1,19 +1,36 @@
 """
 Meta Integration API routes
 """
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime, timedelta
+import asyncio
+import logging
 import secrets
 
-from app.db.database import get_db
+from app.db.database import get_async_db
 from app.db.models import User, MetaAccount
 from app.core.security import get_current_user
-from app.services.meta_service import meta_service
+from app.core.idempotency import fingerprint, idempotent
+from app.services.meta_service import meta_service, MetaAPIError
+from app.services.concurrency import gather_settled
+from app.services.job_queue import enqueue, serialize
+from app.services.meta_rate_limiter import Priority
+from app.services.publishing_service import (
+    TRANSIENT_ERROR_CODES,
+    ContainerProcessingError,
+    PublishError,
+    publish_container_when_ready
+)
+from app.core.config import settings
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # Store OAuth states temporarily (in production, use Redis)
 oauth_states = {}
@@ -55,13 +72,13 @@ class PublishRequest(BaseModel):
 @router.get("/status")
 async def get_meta_status(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Check if Meta account is connected"""
-    account = db.query(MetaAccount).filter(
+    account = await db.scalar(select(MetaAccount).where(
         MetaAccount.user_id == current_user.id,
         MetaAccount.is_active == True
-    ).first()
+    ))
     
     if not account:
         return {"connected": False}
@@ -90,7 +107,7 @@ async def get_connect_url(
 @router.post("/callback")
 async def handle_callback(
     request: OAuthCallbackRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Handle OAuth callback from Meta"""
     # Verify state
@@ -117,18 +134,43 @@ async def handle_callback(
     access_token = long_token_response.get("access_token", short_token)
     expires_in = long_token_response.get("expires_in", 3600)
     
-    # Get user info
-    user_info = await meta_service.get_user_info(access_token)
+    # User info, pages and ad accounts are independent: fetch them together
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.meta_callback_timeout_seconds
+    lookups = await gather_settled({
+        "user_info": meta_service.get_user_info(access_token),
+        "pages": meta_service.get_pages(access_token),
+        "ad_accounts": meta_service.get_ad_accounts(access_token)
+    }, timeout=settings.meta_callback_timeout_seconds)
     
-    # Get pages
-    pages = await meta_service.get_pages(access_token)
+    warnings = [name for name, result in lookups.items() if isinstance(result, Exception)]
+    user_info = lookups["user_info"] if "user_info" not in warnings else {}
+    pages = lookups["pages"] if "pages" not in warnings else []
+    ad_accounts = lookups["ad_accounts"] if "ad_accounts" not in warnings else []
     
-    # Get ad accounts
-    ad_accounts = await meta_service.get_ad_accounts(access_token)
+    # Prefetch linked Instagram accounts so page selection needs no extra round trip
+    instagram_accounts = await gather_settled({
+        p["id"]: meta_service.get_instagram_account(p["id"], p.get("access_token", access_token), refresh=True)
+        for p in pages
+        if "instagram_business_account" in p
+    }, timeout=max(deadline - loop.time(), 0))
+    if any(isinstance(result, Exception) for result in instagram_accounts.values()):
+        warnings.append("instagram_accounts")
     
     # Store basic connection (user will select page later)
     # Remove any existing account first
-    db.query(MetaAccount).filter(MetaAccount.user_id == user_id).delete()
+    previous = (await db.scalars(select(MetaAccount).where(MetaAccount.user_id == user_id))).all()
+    for previous_account in previous:
+        await meta_service.invalidate_metadata(previous_account.meta_user_id, [previous_account.facebook_page_id])
+    await db.execute(delete(MetaAccount).where(MetaAccount.user_id == user_id))
+    
+    # Cache what we just fetched for the page selection step
+    if user_info.get("id"):
+        await meta_service.prime_metadata(
+            user_info["id"],
+            pages=pages if "pages" not in warnings else None,
+            ad_accounts=ad_accounts if "ad_accounts" not in warnings else None
+        )
     
     account = MetaAccount(
         user_id=user_id,
@@ -138,39 +180,73 @@ async def handle_callback(
         is_active=False  # Will be activated when page is selected
     )
     db.add(account)
-    db.commit()
-    db.refresh(account)
+    await db.commit()
+    await db.refresh(account)
     
     return {
         "status": "connected",
         "account_id": account.id,
-        "pages": [
-            {
-                "id": p["id"],
-                "name": p["name"],
-                "has_instagram": "instagram_business_account" in p
-            }
-            for p in pages
-        ],
+        "pages": [_page_summary(p, instagram_accounts.get(p["id"])) for p in pages],
         "ad_accounts": [
             {
                 "id": a["id"],
                 "name": a["name"]
             }
             for a in ad_accounts
-        ]
+        ],
+        # Lookups that failed or timed out; their data is missing above
+        "warnings": warnings
+    }
+
+def _page_summary(page: dict, instagram_account) -> dict:
+    return {
+        "id": page["id"],
+        "name": page["name"],
+        "has_instagram": "instagram_business_account" in page,
+        "instagram": {
+            "id": instagram_account.get("id"),
+            "username": instagram_account.get("username"),
+            "profile_picture_url": instagram_account.get("profile_picture_url"),
+            "followers_count": instagram_account.get("followers_count")
+        } if isinstance(instagram_account, dict) else None
     }
 
+@router.get("/pages")
+async def get_pages(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """List the connected user's pages and linked Instagram accounts (served from cache when possible)"""
+    account = await db.scalar(select(MetaAccount).where(
+        MetaAccount.user_id == current_user.id
+    ))
+    
+    if not account:
+        raise HTTPException(status_code=404, detail="No Meta connection found. Please connect first.")
+    
+    try:
+        pages = await meta_service.get_pages(account.access_token, meta_user_id=account.meta_user_id)
+    except MetaAPIError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    instagram_accounts = await gather_settled({
+        p["id"]: meta_service.get_instagram_account(p["id"], p.get("access_token", account.access_token))
+        for p in pages
+        if "instagram_business_account" in p
+    }, timeout=settings.meta_callback_timeout_seconds)
+    
+    return {"pages": [_page_summary(p, instagram_accounts.get(p["id"])) for p in pages]}
+
 @router.post("/select-page")
 async def select_page(
     selection: PageSelection,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Select Facebook Page and Instagram account to use"""
-    account = db.query(MetaAccount).filter(
+    account = await db.scalar(select(MetaAccount).where(
         MetaAccount.user_id == current_user.id
-    ).first()
+    ))
     
     if not account:
         raise HTTPException(status_code=404, detail="No Meta connection found. Please connect first.")
@@ -184,21 +260,21 @@ async def select_page(
         account.instagram_username = selection.instagram_username
     
     account.is_active = True
-    db.commit()
+    await db.commit()
+    
+    # Push feed changes (comments, reactions, shares) of this page to our webhook
+    if settings.meta_webhooks_enabled:
+        result = await meta_service.subscribe_page(selection.page_id, selection.page_token)
+        if "error" in result:
+            logger.warning("Could not subscribe page %s to webhooks: %s", selection.page_id, result["error"].get("message"))
     
     return {"status": "configured", "account": MetaAccountResponse.model_validate(account)}
 
-@router.post("/publish")
-async def publish_content(
-    request: PublishRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Publish content to Meta platform"""
-    account = db.query(MetaAccount).filter(
+async def _publish(request: PublishRequest, current_user: User, db: AsyncSession):
+    account = await db.scalar(select(MetaAccount).where(
         MetaAccount.user_id == current_user.id,
         MetaAccount.is_active == True
-    ).first()
+    ))
     
     if not account:
         raise HTTPException(status_code=400, detail="No active Meta account. Please connect first.")
@@ -207,7 +283,7 @@ async def publish_content(
         if not account.instagram_account_id:
             raise HTTPException(status_code=400, detail="No Instagram account connected")
         
-        result = await meta_service.publish_to_instagram(
+        result = await meta_service.create_media_container(
             ig_user_id=account.instagram_account_id,
             access_token=account.access_token,
             caption=request.caption,
@@ -215,6 +291,25 @@ async def publish_content(
             video_url=request.media_url if request.content_type in ["reel", "video"] else None,
             media_type="REELS" if request.content_type == "reel" else "IMAGE"
         )
+        
+        if "error" not in result:
+            container_id = result["id"]
+            created_at = datetime.utcnow()
+            try:
+                result = await publish_container_when_ready(account, container_id, created_at)
+            except ContainerProcessingError as e:
+                # Videos take a while: a job publishes the container once Instagram processed it
+                job = await db.run_sync(
+                    enqueue,
+                    "publish_instagram_container",
+                    {"container_id": container_id, "created_at": created_at.isoformat()},
+                    user_id=current_user.id,
+                    priority=Priority.HIGH,
+                    run_at=created_at + timedelta(seconds=e.retry_after)
+                )
+                return JSONResponse(status_code=202, content=jsonable_encoder(serialize(job)))
+            except PublishError as e:
+                raise HTTPException(status_code=503 if e.transient else 400, detail=str(e))
     
     elif request.platform == "facebook":
         if not account.facebook_page_id:
@@ -232,27 +327,64 @@ async def publish_content(
         raise HTTPException(status_code=400, detail="Invalid platform")
     
     if "error" in result:
-        raise HTTPException(status_code=400, detail=result["error"]["message"])
+        error = result["error"]
+        # Transient errors aren't stored with the idempotency key, so a retry calls Meta again
+        transient = error.get("code") in TRANSIENT_ERROR_CODES or bool(error.get("is_transient"))
+        raise HTTPException(status_code=503 if transient else 400, detail=error["message"])
     
     return {"status": "published", "post_id": result.get("id")}
 
+@router.post("/publish")
+async def publish_content(
+    request: PublishRequest,
+    idempotency_key: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Publish content to Meta platform
+    
+    Retries with the same Idempotency-Key get the first response back
+    instead of publishing again. Without one, the same request repeated
+    within a few minutes is treated as a retry.
+    
+    Instagram videos still being processed answer 202 with the job that
+    finishes the publish once they are ready.
+    """
+    request_fingerprint = fingerprint("meta.publish", request.model_dump())
+    ttl = None
+    if not idempotency_key:
+        idempotency_key = f"derived:{request_fingerprint}"
+        ttl = timedelta(seconds=settings.idempotency_derived_key_ttl_seconds)
+    
+    return await idempotent(
+        db,
+        current_user.id,
+        idempotency_key,
+        request_fingerprint,
+        lambda: _publish(request, current_user, db),
+        ttl=ttl
+    )
+
 @router.get("/accounts", response_model=List[MetaAccountResponse])
 async def get_accounts(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all Meta accounts for current user"""
-    accounts = db.query(MetaAccount).filter(
+    accounts = (await db.scalars(select(MetaAccount).where(
         MetaAccount.user_id == current_user.id
-    ).all()
+    ))).all()
     return accounts
 
 @router.delete("/disconnect")
 async def disconnect(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Disconnect Meta account"""
-    db.query(MetaAccount).filter(MetaAccount.user_id == current_user.id).delete()
-    db.commit()
+    for account in await db.scalars(select(MetaAccount).where(MetaAccount.user_id == current_user.id)):
+        await meta_service.invalidate_metadata(account.meta_user_id, [account.facebook_page_id])
+    await db.execute(delete(MetaAccount).where(MetaAccount.user_id == current_user.id))
+    await db.commit()
     return {"status": "disconnected"}
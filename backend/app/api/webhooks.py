@@ -0,0 +1,51 @@
+"""
+Meta Webhooks API routes
+"""
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+import json
+
+from app.core.config import settings
+from app.services.webhook_service import verify_signature, webhook_processor
+
+router = APIRouter()
+
+# ============== Routes ==============
+
+@router.get("/meta", response_class=PlainTextResponse)
+async def verify_meta_webhook(
+    mode: str = Query(None, alias="hub.mode"),
+    verify_token: str = Query(None, alias="hub.verify_token"),
+    challenge: str = Query(None, alias="hub.challenge")
+):
+    """Subscription verification handshake from Meta"""
+    if not settings.meta_webhooks_enabled:
+        raise HTTPException(status_code=404, detail="Webhooks are disabled")
+    
+    if (
+        mode != "subscribe"
+        or not settings.meta_webhook_verify_token
+        or verify_token != settings.meta_webhook_verify_token
+    ):
+        raise HTTPException(status_code=403, detail="Invalid verify token")
+    
+    return challenge
+
+@router.post("/meta")
+async def receive_meta_webhook(request: Request):
+    """Change notifications (page feed, Instagram comments, mentions, story insights)"""
+    if not settings.meta_webhooks_enabled:
+        raise HTTPException(status_code=404, detail="Webhooks are disabled")
+    
+    body = await request.body()
+    if not verify_signature(body, request.headers.get("X-Hub-Signature-256")):
+        raise HTTPException(status_code=403, detail="Invalid signature")
+    
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    
+    # Only queue here: Meta expects a fast 200 and retries otherwise
+    queued = webhook_processor.enqueue(payload)
+    return {"status": "ok", "queued": queued}
@@ -12,6 +12,21 @@ class Settings(BaseSettings):
     
     # Database
     database_url: str = "sqlite:///./marko.db"
+    database_pool_size: int = 10  # Connections kept open per engine (PostgreSQL)
+    database_max_overflow: int = 20  # Extra connections opened under load, closed when returned
+    database_pool_timeout_seconds: float = 30.0  # Max wait for a free connection
+    database_pool_recycle_seconds: int = 1800  # Reconnect before the server / a proxy drops idle ones
+    database_pool_pre_ping: bool = True
+    
+    # SQLite (small tenants) - WAL lets readers run while a write is in progress
+    sqlite_tuning: bool = True  # Apply the pragmas below on connect; off = SQLite defaults
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"  # Safe with WAL: fsync at checkpoints, not every commit
+    sqlite_busy_timeout_ms: int = 10000  # Wait for the write lock instead of "database is locked"
+    sqlite_cache_size_kb: int = 64 * 1024
+    sqlite_mmap_size_mb: int = 256
+    sqlite_pool_size: int = 5  # One writer at a time anyway; readers share these
+    sqlite_max_overflow: int = 10
     
     # JWT
     jwt_secret: str = "change-me-in-production"
@@ -20,11 +35,110 @@ class Settings(BaseSettings):
     
     # Anthropic
     anthropic_api_key: str = ""
+    ai_max_concurrency: int = 200  # In-flight Claude calls per worker
+    ai_max_concurrency_per_user: int = 4
+    ai_queue_timeout_seconds: float = 30.0  # Max wait for a free slot
+    ai_request_timeout_seconds: float = 120.0
+    
+    # Chat memory
+    chat_memory_recent_messages: int = 20  # Always sent verbatim
+    chat_memory_summary_batch: int = 20  # Older messages folded into the summary at once
+    
+    # AI result cache (generate_content / generate_strategy)
+    ai_cache_backend: str = "sqlite"  # sqlite, memory or none
+    ai_cache_path: str = "./marko_cache.db"
+    ai_cache_ttl_seconds: int = 60 * 60 * 24  # 1 day
+    ai_cache_max_entries: int = 10000
+    
+    # Content calendar generation
+    calendar_generation_concurrency: int = 4
+    calendar_batch_threshold: int = 40  # From this many ideas, use the Message Batches API
+    ai_batch_poll_seconds: float = 15.0
+    
+    # Scheduled publishing
+    publish_scheduler_enabled: bool = True
+    publish_poll_seconds: float = 15.0
+    publish_batch_size: int = 100  # Contents claimed per round
+    publish_concurrency: int = 16  # Accounts published in parallel
+    publish_lease_seconds: int = 300
+    publish_max_attempts: int = 5
+    publish_retry_base_seconds: float = 60.0  # Doubles after every transient failure
+    publish_retry_max_seconds: float = 60.0 * 30
+    publish_wait_seconds: float = 30.0  # How long a concurrent publish waits for the first one's outcome
+    
+    # Instagram media containers (videos and reels are processed asynchronously)
+    instagram_container_poll_initial_seconds: float = 1.0  # Doubles between status checks
+    instagram_container_poll_max_seconds: float = 60.0
+    instagram_container_inline_wait_seconds: float = 5.0  # Before a publish hands the container off
+    instagram_container_timeout_seconds: int = 3600  # Give up on a container still processing after this
+    
+    # Idempotency keys (publish endpoints)
+    idempotency_key_ttl_hours: int = 24
+    idempotency_derived_key_ttl_seconds: int = 600  # /api/meta/publish without an Idempotency-Key
+    
+    # Background jobs (see worker.py)
+    job_worker_embedded: bool = True  # Also run jobs inside the API process
+    job_worker_concurrency: int = 8
+    job_poll_seconds: float = 1.0
+    job_visibility_timeout_seconds: int = 300  # Lease; renewed while the job runs
+    job_max_attempts: int = 3
+    job_retry_base_seconds: float = 10.0
+    job_retry_max_seconds: float = 60.0 * 10
+    job_events_poll_seconds: float = 1.0
+    
+    # List endpoints (cursor pagination)
+    page_size_default: int = 50
+    page_size_max: int = 200
+    
+    # LLM usage recording
+    llm_usage_flush_seconds: float = 5.0
+    llm_usage_max_buffer: int = 500
+    
+    # Admin endpoints - comma-separated list of admin emails
+    admin_emails: str = ""
     
     # Meta
     meta_app_id: str = ""
     meta_app_secret: str = ""
     meta_redirect_uri: str = "http://localhost:3000/callback/meta"
+    meta_http2: bool = True
+    meta_http_max_connections: int = 100
+    meta_http_max_keepalive_connections: int = 20
+    meta_http_keepalive_expiry_seconds: float = 60.0
+    meta_http_timeout_seconds: float = 30.0
+    meta_http_connect_timeout_seconds: float = 5.0
+    meta_callback_timeout_seconds: float = 10.0  # Shared budget for the OAuth callback lookups
+    meta_page_size: int = 100  # Items per page when following Graph cursors
+    
+    # Meta account metadata cache (pages, Instagram accounts, ad accounts)
+    meta_cache_backend: str = "sqlite"  # sqlite, memory or none
+    meta_cache_path: str = "./marko_meta_cache.db"
+    meta_cache_ttl_seconds: int = 60 * 60  # 1 hour
+    meta_cache_max_entries: int = 10000
+    
+    # Meta webhooks (page feed, Instagram comments / mentions / story insights)
+    meta_webhooks_enabled: bool = False
+    meta_webhook_verify_token: str = ""
+    meta_webhook_queue_size: int = 10000
+    
+    # Meta rate limiting (per app, page / Instagram account and ad account)
+    meta_rate_limit_enabled: bool = True
+    meta_rate_limit_per_second: float = 10.0  # Refill rate at 0% reported usage
+    meta_rate_limit_burst: float = 50.0
+    meta_rate_limit_reserve: float = 0.2  # Share of each bucket kept for publishing
+    meta_rate_limit_shed_usage_pct: float = 75.0  # Above this usage, analytics calls are dropped
+    meta_rate_limit_max_low_priority_delay_seconds: float = 30.0
+    meta_rate_limit_throttle_backoff_seconds: float = 60.0
+    meta_rate_limit_idle_bucket_seconds: float = 600.0  # Unused account buckets are dropped after this
+    meta_rate_limit_usage_decay_seconds: float = 300.0  # A usage report fades to 0% over this, unless renewed
+    
+    # Background analytics sync
+    analytics_sync_enabled: bool = True
+    analytics_sync_interval_seconds: float = 300.0
+    analytics_sync_batch_size: int = 500  # Max contents refreshed per cycle
+    analytics_sync_concurrency: int = 4  # Users synced in parallel
+    analytics_min_refresh_seconds: int = 60  # Manual refresh reuses fresher data
+    analytics_sync_webhook_fallback_factor: int = 6  # Staleness tiers stretched this much when webhooks are on
     
     # Frontend
     frontend_url: str = "http://localhost:3000"
@@ -0,0 +1,145 @@
+"""
+Idempotency keys - replay the first response to retried requests
+"""
+import asyncio
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.models import IdempotencyRecord
+
+POLL_SECONDS = 0.5
+
+
+def fingerprint(*parts: Any) -> str:
+    """Stable hash of what a request asks for"""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _replay(record: IdempotencyRecord) -> JSONResponse:
+    return JSONResponse(
+        status_code=record.status_code,
+        content=record.response,
+        headers={"Idempotent-Replayed": "true"}
+    )
+
+
+async def _begin(db: AsyncSession, user_id: int, key: str, request_fingerprint: str, ttl: timedelta) -> Optional[IdempotencyRecord]:
+    """
+    Lock the key for this request
+
+    Returns the new record, or None if the key is already taken (completed,
+    or locked by a request still running).
+    """
+    now = datetime.utcnow()
+
+    # Expired records, and locks left behind by a crashed request, free the key
+    await db.execute(delete(IdempotencyRecord).where(
+        IdempotencyRecord.user_id == user_id,
+        IdempotencyRecord.key == key,
+        (IdempotencyRecord.expires_at < now) | (
+            (IdempotencyRecord.status == "in_progress") & (IdempotencyRecord.locked_until < now)
+        )
+    ).execution_options(synchronize_session=False))
+    await db.commit()
+
+    record = IdempotencyRecord(
+        user_id=user_id,
+        key=key,
+        fingerprint=request_fingerprint,
+        locked_until=now + timedelta(seconds=settings.publish_lease_seconds),
+        expires_at=now + ttl
+    )
+    db.add(record)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return None
+    return record
+
+
+async def _wait(db: AsyncSession, user_id: int, key: str, request_fingerprint: str) -> JSONResponse:
+    """Wait for the request holding the key and replay its response"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.publish_wait_seconds
+    while True:
+        record = await db.scalar(select(IdempotencyRecord).where(
+            IdempotencyRecord.user_id == user_id,
+            IdempotencyRecord.key == key
+        ).execution_options(populate_existing=True))
+
+        if record and record.fingerprint != request_fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        if record is None or record.status == "completed":
+            break
+        if loop.time() >= deadline:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+        await asyncio.sleep(POLL_SECONDS)
+
+    if record is None:
+        # The first request failed without a response worth keeping; the client may retry
+        raise HTTPException(status_code=409, detail="The request with this Idempotency-Key failed, please retry")
+    return _replay(record)
+
+
+async def idempotent(
+    db: AsyncSession,
+    user_id: int,
+    key: str,
+    request_fingerprint: str,
+    operation: Callable[[], Awaitable[Any]],
+    ttl: Optional[timedelta] = None
+) -> Response:
+    """
+    Run `operation` once per (user, key)
+
+    Retries get the first response back (with an Idempotent-Replayed
+    header); a retry arriving while the first request runs waits for it.
+    Responses and 4xx errors are stored; 409 conflicts (the outcome isn't
+    known yet, e.g. a publish already in progress), 5xx errors and
+    unexpected exceptions release the key so the request can be retried.
+    """
+    ttl = ttl or timedelta(hours=settings.idempotency_key_ttl_hours)
+
+    record = await _begin(db, user_id, key, request_fingerprint, ttl)
+    if record is None:
+        return await _wait(db, user_id, key, request_fingerprint)
+
+    async def store(status_code: int, body: Any):
+        record.status = "completed"
+        record.status_code = status_code
+        record.response = jsonable_encoder(body)
+        record.locked_until = None
+        await db.commit()
+
+    try:
+        result = await operation()
+    except HTTPException as e:
+        if e.status_code >= 500 or e.status_code == 409:
+            await db.rollback()
+            await db.delete(record)
+            await db.commit()
+        else:
+            await store(e.status_code, {"detail": e.detail})
+        raise
+    except Exception:
+        await db.rollback()
+        await db.delete(record)
+        await db.commit()
+        raise
+
+    if isinstance(result, Response):
+        await store(result.status_code, json.loads(result.body))
+        return result
+    await store(200, result)
+    return JSONResponse(content=record.response)
@@ -0,0 +1,93 @@
+"""
+Keyset (cursor) pagination for list endpoints
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence
+
+from fastapi import HTTPException, Response
+from sqlalchemy import DateTime, String, and_, literal, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute
+from sqlalchemy.sql import Select
+
+from app.core.config import settings
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+SQLITE = settings.database_url.startswith("sqlite")
+
+
+def page_size(limit: Optional[int]) -> int:
+    """Requested page size, clamped to 1..page_size_max"""
+    return max(1, min(limit or settings.page_size_default, settings.page_size_max))
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    data = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: Sequence[InstrumentedAttribute]) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError(cursor)
+        return [
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) else value
+            for column, value in zip(columns, values)
+        ]
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _stored_forms(value: Any) -> List[Any]:
+    """The values a column may hold for `value`, lowest first"""
+    if SQLITE and isinstance(value, datetime):
+        # SQLite compares datetimes as text: SQLAlchemy writes them with
+        # microseconds, CURRENT_TIMESTAMP defaults without
+        forms = [value.strftime("%Y-%m-%d %H:%M:%S.%f")]
+        if not value.microsecond:
+            forms.insert(0, value.strftime("%Y-%m-%d %H:%M:%S"))
+        return [literal(form, String) for form in forms]
+    return [value]
+
+
+def _before(columns: Sequence[InstrumentedAttribute], values: Sequence[Any]):
+    """Rows sorting after the cursor in descending (columns) order"""
+    first, *rest = columns
+    forms = _stored_forms(values[0])
+    if not rest:
+        return first < forms[0]
+    return or_(
+        first < forms[0],
+        and_(or_(*[first == form for form in forms]), _before(rest, values[1:]))
+    )
+
+
+async def paginate(
+    db: AsyncSession,
+    query: Select,
+    columns: Sequence[InstrumentedAttribute],
+    cursor: Optional[str],
+    limit: Optional[int],
+    response: Response
+) -> List[Any]:
+    """
+    Fetch one page of `query`, newest first by `columns` (e.g. created_at, id)
+
+    The last column must be unique. When more rows follow, the cursor of
+    the next page is set in the X-Next-Cursor header. Any page costs the
+    same as the first one: no OFFSET, just an index seek.
+    """
+    limit = page_size(limit)
+    if cursor:
+        query = query.where(_before(columns, decode_cursor(cursor, columns)))
+
+    rows = (await db.scalars(query.order_by(*[column.desc() for column in columns]).limit(limit + 1))).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([getattr(rows[-1], column.key) for column in columns])
+    return rows
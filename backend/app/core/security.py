@@ -7,9 +7,10 @@ from jose import JWTError, jwt
 import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.config import settings
-from app.db.database import get_db
+from app.db.database import get_async_db
 from app.db.models import User
 
 security = HTTPBearer()
@@ -41,7 +42,7 @@ def decode_token(token: str) -> dict:
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -60,8 +61,14 @@ async def get_current_user(
         raise credentials_exception
     user_id = int(user_id_str)
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if user is None:
         raise credentials_exception
     
     return user
+
+async def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
+    admin_emails = [email.strip().lower() for email in settings.admin_emails.split(",") if email.strip()]
+    if current_user.email.lower() not in admin_emails:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
@@ -1,21 +1,78 @@
 """
 Database connection and session management
+
+The API and the background loops use the async engine (get_async_db,
+AsyncSessionLocal) so queries don't block the event loop; startup
+migrations and scripts keep the sync engine and SessionLocal.
 """
-from sqlalchemy import create_engine
+from typing import Callable, TypeVar, Union
+
+from sqlalchemy import create_engine, event, make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from app.core.config import settings
 
+T = TypeVar("T")
+
+# Async drivers: aiosqlite for SQLite, asyncpg for PostgreSQL
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg"
+}
+
+def async_database_url(url: str) -> str:
+    scheme, _, rest = url.partition("://")
+    dialect = scheme.split("+")[0]  # Drop a sync driver, e.g. postgresql+psycopg2
+    return f"{ASYNC_DRIVERS.get(dialect, scheme)}://{rest}"
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Production SQLite profile, applied to every new connection"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.sqlite_journal_mode}")
+    cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+    cursor.execute(f"PRAGMA cache_size=-{int(settings.sqlite_cache_size_kb)}")  # Negative: in KiB
+    cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size_mb) * 1024 * 1024}")
+    cursor.close()
+
+def _sqlite_in_memory(url: str) -> bool:
+    """In-memory databases get a single-connection pool that takes no sizing options"""
+    parsed = make_url(url)
+    return parsed.database in (None, "", ":memory:") or parsed.query.get("mode") == "memory"
+
 # Handle SQLite vs PostgreSQL
 if settings.database_url.startswith("sqlite"):
+    pool_options = {} if _sqlite_in_memory(settings.database_url) else {
+        "pool_size": settings.sqlite_pool_size,
+        "max_overflow": settings.sqlite_max_overflow,
+        "pool_timeout": settings.database_pool_timeout_seconds
+    }
     engine = create_engine(
         settings.database_url,
-        connect_args={"check_same_thread": False}
+        connect_args={"check_same_thread": False},
+        **pool_options
     )
+    async_engine = create_async_engine(async_database_url(settings.database_url), **pool_options)
+
+    if settings.sqlite_tuning:
+        for sync_engine in (engine, async_engine.sync_engine):
+            event.listen(sync_engine, "connect", _set_sqlite_pragmas)
 else:
-    engine = create_engine(settings.database_url)
+    pool_options = {
+        "pool_size": settings.database_pool_size,
+        "max_overflow": settings.database_max_overflow,
+        "pool_timeout": settings.database_pool_timeout_seconds,
+        "pool_recycle": settings.database_pool_recycle_seconds,
+        "pool_pre_ping": settings.database_pool_pre_ping
+    }
+    engine = create_engine(settings.database_url, **pool_options)
+    async_engine = create_async_engine(async_database_url(settings.database_url), **pool_options)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Objects stay usable after commit: reloading expired attributes would need an await
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 def get_db():
@@ -25,3 +82,19 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    """Dependency for getting an async database session (API routes)"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def run_sync(db: Union[Session, AsyncSession], fn: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Call fn(session, *args, **kwargs) with a sync Session
+
+    Lets services shared by the API (AsyncSession) and the workers
+    (Session) write their queries once.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return fn(db, *args, **kwargs)
@@ -0,0 +1,83 @@
+"""
+Lightweight schema migrations for databases created by create_all
+
+create_all only creates missing tables. These steps bring existing tables
+up to date with the models: new nullable columns and new indexes
+(after removing the duplicates a new unique index would reject), plus
+backfills for columns the code now relies on.
+"""
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from app.db.database import Base
+
+logger = logging.getLogger(__name__)
+
+
+def add_missing_columns(engine: Engine):
+    """ALTER TABLE ... ADD COLUMN for model columns the table doesn't have yet"""
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                logger.info("Added column %s.%s", table.name, column.name)
+
+
+def dedupe_content_analytics(engine: Engine):
+    """
+    Keep one content_analytics row per content before its unique index is created
+
+    The freshest row (latest last_updated, then highest id) is kept.
+    """
+    inspector = inspect(engine)
+    if "content_analytics" not in inspector.get_table_names():
+        return
+    if any(index["name"] == "ix_content_analytics_content_id" for index in inspector.get_indexes("content_analytics")):
+        return
+
+    with engine.begin() as conn:
+        duplicated = conn.execute(text(
+            "SELECT content_id FROM content_analytics GROUP BY content_id HAVING COUNT(*) > 1"
+        )).scalars().all()
+        removed = 0
+        for content_id in duplicated:
+            rows = conn.execute(text(
+                "SELECT id, last_updated FROM content_analytics WHERE content_id = :content_id"
+            ), {"content_id": content_id}).all()
+            keep = max(rows, key=lambda row: (row.last_updated is not None, row.last_updated or 0, row.id))
+            removed += conn.execute(text(
+                "DELETE FROM content_analytics WHERE content_id = :content_id AND id != :keep"
+            ), {"content_id": content_id, "keep": keep.id}).rowcount
+        if removed:
+            logger.info("Removed %d duplicate content_analytics rows", removed)
+
+
+def backfill_conversation_updated_at(engine: Engine):
+    """Conversations are paginated by updated_at, which older rows left empty until their first reply"""
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE conversations SET updated_at = created_at WHERE updated_at IS NULL"))
+
+
+def create_missing_indexes(engine: Engine):
+    """Create model indexes missing from existing tables"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def run_migrations(engine: Engine):
+    add_missing_columns(engine)
+    dedupe_content_analytics(engine)
+    backfill_conversation_updated_at(engine)
+    create_missing_indexes(engine)
@@ -1,7 +1,7 @@
 """
 Database models for Marko
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, JSON, Enum, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.database import Base
@@ -17,6 +17,7 @@ class ContentType(str, enum.Enum):
 class ContentStatus(str, enum.Enum):
     DRAFT = "draft"
     SCHEDULED = "scheduled"
+    PUBLISHING = "publishing"
     PUBLISHED = "published"
     FAILED = "failed"
 
@@ -87,6 +88,11 @@ class Conversation(Base):
     # Relationships
     user = relationship("User", back_populates="conversations")
     messages = relationship("Message", back_populates="conversation", order_by="Message.created_at")
+    
+    __table_args__ = (
+        # Conversation list, most recently active first
+        Index("ix_conversations_user_id_updated_at", "user_id", "updated_at"),
+    )
 
 class Message(Base):
     __tablename__ = "messages"
@@ -100,6 +106,11 @@ class Message(Base):
     
     # Relationships
     conversation = relationship("Conversation", back_populates="messages")
+    
+    __table_args__ = (
+        # A conversation's messages in order (history, memory)
+        Index("ix_messages_conversation_id_created_at", "conversation_id", "created_at"),
+    )
 
 # ============== Content ==============
 
@@ -126,7 +137,7 @@ class Content(Base):
     link_url = Column(String(500))
     
     # Status
-    status = Column(String(50), default="draft")  # draft, scheduled, published, failed
+    status = Column(String(50), default="draft")  # draft, scheduled, publishing, published, failed
     scheduled_for = Column(DateTime(timezone=True))
     published_at = Column(DateTime(timezone=True))
     
@@ -134,6 +145,16 @@ class Content(Base):
     meta_post_id = Column(String(255))
     meta_ad_id = Column(String(255))
     
+    # Instagram container being processed; kept so a publish resumes instead of re-uploading
+    meta_container_id = Column(String(255))
+    meta_container_created_at = Column(DateTime(timezone=True))
+    
+    # Publishing lease - whoever holds it is publishing the row
+    lease_owner = Column(String(100))
+    lease_expires_at = Column(DateTime(timezone=True))  # Also "not before" while waiting for a retry
+    publish_attempts = Column(Integer, default=0)
+    last_error = Column(Text)
+    
     # AI generation metadata
     ai_prompt = Column(Text)
     ai_model = Column(String(100))
@@ -145,6 +166,19 @@ class Content(Base):
     user = relationship("User", back_populates="contents")
     campaign = relationship("Campaign", back_populates="contents")
     analytics = relationship("ContentAnalytics", back_populates="content", uselist=False)
+    
+    __table_args__ = (
+        # Due scheduled content lookup
+        Index("ix_contents_status_scheduled_for", "status", "scheduled_for"),
+        # Content list, newest first
+        Index("ix_contents_user_id_created_at", "user_id", "created_at"),
+        # Analytics: a user's published contents, by publication date
+        Index("ix_contents_user_id_status_published_at", "user_id", "status", "published_at"),
+        # Campaign contents and counts
+        Index("ix_contents_campaign_id_created_at", "campaign_id", "created_at"),
+        # Webhook notifications are matched by post id
+        Index("ix_contents_meta_post_id", "meta_post_id"),
+    )
 
 class ContentAnalytics(Base):
     __tablename__ = "content_analytics"
@@ -173,6 +207,11 @@ class ContentAnalytics(Base):
     
     # Relationships
     content = relationship("Content", back_populates="analytics")
+    
+    __table_args__ = (
+        # One row per content (a unique index, so existing databases can get it too)
+        Index("ix_content_analytics_content_id", "content_id", unique=True),
+    )
 
 # ============== Campaigns ==============
 
@@ -210,3 +249,96 @@ class Campaign(Base):
     # Relationships
     user = relationship("User", back_populates="campaigns")
     contents = relationship("Content", back_populates="campaign")
+    
+    __table_args__ = (
+        # Campaign list, newest first
+        Index("ix_campaigns_user_id_created_at", "user_id", "created_at"),
+    )
+
+# ============== AI Usage ==============
+
+class LLMUsage(Base):
+    __tablename__ = "llm_usage"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    
+    # What made the call
+    route = Column(String(100))  # e.g. chat.send_message
+    method = Column(String(100))  # AIService method, e.g. chat
+    model = Column(String(100))
+    status = Column(String(20))  # ok, error, queue_timeout, cancelled
+    
+    # Tokens
+    input_tokens = Column(Integer, default=0)
+    output_tokens = Column(Integer, default=0)
+    cache_read_input_tokens = Column(Integer, default=0)
+    cache_creation_input_tokens = Column(Integer, default=0)
+    
+    # Timings in milliseconds
+    queue_wait_ms = Column(Integer)
+    time_to_first_token_ms = Column(Integer)
+    latency_ms = Column(Integer)  # Total, including queue wait
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+# ============== Jobs ==============
+
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    
+    type = Column(String(50), nullable=False)  # publish_content, refresh_content_analytics, ...
+    payload = Column(JSON, default=dict)
+    priority = Column(Integer, default=1)  # 0 = high, 1 = normal, 2 = low
+    
+    # Status
+    status = Column(String(20), default="queued")  # queued, running, succeeded, failed, dead
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    run_at = Column(DateTime(timezone=True))  # Not before (first run or retry backoff)
+    
+    # Lease - a running job whose lease expired is picked up again
+    lease_owner = Column(String(100))
+    lease_expires_at = Column(DateTime(timezone=True))
+    
+    # Outcome
+    result = Column(JSON)
+    error = Column(Text)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    finished_at = Column(DateTime(timezone=True))
+    
+    __table_args__ = (
+        # Next job to run lookup
+        Index("ix_jobs_status_priority_run_at", "status", "priority", "run_at"),
+    )
+
+# ============== Idempotency ==============
+
+class IdempotencyRecord(Base):
+    __tablename__ = "idempotency_records"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    
+    key = Column(String(255), nullable=False)  # Idempotency-Key header, or derived from the request
+    fingerprint = Column(String(64), nullable=False)  # sha256 of the request the key was first used with
+    
+    # The first request holds the lock while it runs; retries wait for its response
+    status = Column(String(20), default="in_progress")  # in_progress, completed
+    locked_until = Column(DateTime(timezone=True))
+    
+    # Stored response, replayed to retries
+    status_code = Column(Integer)
+    response = Column(JSON)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    
+    __table_args__ = (
+        UniqueConstraint("user_id", "key", name="uq_idempotency_records_user_key"),
+    )
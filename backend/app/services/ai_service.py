@@ -2,8 +2,19 @@
 AI Service - Claude integration for Marko
 """
 import anthropic
-from typing import List, Dict, Optional
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, List, Dict, Optional
 from app.core.config import settings
+from app.services.cache import build_cache, make_key
+from app.services.concurrency import ConcurrencyLimiter, QueueTimeoutError
+from app.services.singleflight import SingleFlight
+from app.services.usage_service import usage_recorder
 
 MARKO_SYSTEM_PROMPT = """Tu es Marko, un CMO (Chief Marketing Officer) AI expert en marketing digital et réseaux sociaux.
 
@@ -45,15 +56,127 @@ Tu as accès aux fonctionnalités suivantes que tu peux déclencher:
 
 Réponds toujours de manière utile et actionnable."""
 
+# Marks the end of a prefix Claude may cache server-side (5 min TTL, refreshed on hit)
+CACHE_CONTROL = {"type": "ephemeral"}
+
+logger = logging.getLogger(__name__)
+
+# Arguments that don't change the result, left out of the coalescing key
+# (force_refresh stays in: a forced call must not share a call that may serve the cache)
+COALESCE_IGNORED = {"self", "user_id"}
+
+def coalesce(method):
+    """
+    Share one in-flight call between concurrent identical calls of `method`
+    
+    Calls are identical when the method, the model and the normalized
+    arguments (minus COALESCE_IGNORED) match.
+    """
+    signature = inspect.signature(method)
+    
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        params = {k: v for k, v in bound.arguments.items() if k not in COALESCE_IGNORED}
+        key = make_key(method.__name__, model=self.model, **params)
+        return await self.flight.do(key, lambda: method(self, *args, **kwargs))
+    
+    return wrapper
+
 class AIService:
     def __init__(self):
-        self.client = anthropic.Anthropic(api_key=settings.anthropic_api_key)
+        self.client = anthropic.AsyncAnthropic(
+            api_key=settings.anthropic_api_key,
+            timeout=settings.ai_request_timeout_seconds
+        )
         self.model = "claude-sonnet-4-20250514"
+        self.limiter = ConcurrencyLimiter(
+            max_concurrency=settings.ai_max_concurrency,
+            max_per_user=settings.ai_max_concurrency_per_user,
+            queue_timeout=settings.ai_queue_timeout_seconds
+        )
+        self.cache = build_cache(
+            backend=settings.ai_cache_backend,
+            path=settings.ai_cache_path,
+            ttl=settings.ai_cache_ttl_seconds,
+            max_entries=settings.ai_cache_max_entries
+        )
+        self.flight = SingleFlight()
+    
+    async def _create(self, method: str, user_id: Optional[int] = None, **kwargs):
+        """
+        Call Claude once a concurrency slot is free and return the final message.
+        
+        Streams under the hood so time-to-first-token can be measured.
+        Raises QueueTimeoutError if the slot wait exceeds the queue timeout.
+        Cancelling the caller cancels the in-flight HTTP request.
+        """
+        async with self._tracked(method, kwargs["model"], user_id) as call:
+            async with self.limiter.slot(user_id) as queue_wait:
+                call["queue_wait"] = queue_wait
+                async with self.client.messages.stream(**kwargs) as stream:
+                    async for event in stream:
+                        if call["first_token_at"] is None and event.type == "content_block_delta":
+                            call["first_token_at"] = time.monotonic()
+                    response = await stream.get_final_message()
+            call["usage"] = response.usage
+            return response
+    
+    @asynccontextmanager
+    async def _tracked(self, method: str, model: str, user_id: Optional[int] = None):
+        """
+        Time one Claude call and record its usage when the block exits
+        
+        The block fills in the yielded dict: queue_wait (seconds),
+        first_token_at (time.monotonic()) and usage (response.usage).
+        """
+        call = {"queue_wait": None, "first_token_at": None, "usage": None}
+        started = time.monotonic()
+        status = "error"
+        try:
+            yield call
+            status = "ok"
+        except QueueTimeoutError:
+            status = "queue_timeout"
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            status = "cancelled"
+            raise
+        finally:
+            first_token = None
+            if call["first_token_at"] is not None:
+                first_token = call["first_token_at"] - started
+            self._record_usage(
+                method,
+                model,
+                status,
+                call["usage"],
+                user_id=user_id,
+                queue_wait=call["queue_wait"],
+                time_to_first_token=first_token,
+                latency=time.monotonic() - started
+            )
+    
+    def _record_usage(self, method: str, model: str, status: str, usage=None, **timings):
+        """Log and store token usage, including prompt cache reads/writes, for one call"""
+        if usage is not None:
+            logger.info(
+                "claude usage method=%s model=%s input=%d output=%d cache_read=%d cache_write=%d",
+                method,
+                model,
+                usage.input_tokens,
+                usage.output_tokens,
+                getattr(usage, "cache_read_input_tokens", None) or 0,
+                getattr(usage, "cache_creation_input_tokens", None) or 0
+            )
+        usage_recorder.record(method, model, status, usage, **timings)
     
     async def chat(
         self, 
         messages: List[Dict[str, str]], 
-        context: Optional[Dict] = None
+        context: Optional[Dict] = None,
+        user_id: Optional[int] = None
     ) -> str:
         """
         Chat with Marko
@@ -61,32 +184,139 @@ class AIService:
         Args:
             messages: List of {"role": "user"|"assistant", "content": "..."}
             context: Additional context (user info, campaign info, etc.)
+            user_id: Caller, for the per-user concurrency limit
         
         Returns:
             AI response text
         """
-        system = MARKO_SYSTEM_PROMPT
+        response = await self._create(
+            "chat",
+            user_id=user_id,
+            model=self.model,
+            max_tokens=2048,
+            system=self._chat_system(context),
+            messages=self._cached_history(messages)
+        )
+        
+        return response.content[0].text
+    
+    async def chat_stream(
+        self,
+        messages: List[Dict[str, str]],
+        context: Optional[Dict] = None,
+        user_id: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """
+        Chat with Marko, yielding text deltas as Claude produces them
+        
+        Same arguments as chat(). The concurrency slot is held until the
+        stream is exhausted or the consumer stops iterating.
+        """
+        async with self._tracked("chat_stream", self.model, user_id) as call:
+            async with self.limiter.slot(user_id) as queue_wait:
+                call["queue_wait"] = queue_wait
+                async with self.client.messages.stream(
+                    model=self.model,
+                    max_tokens=2048,
+                    system=self._chat_system(context),
+                    messages=self._cached_history(messages)
+                ) as stream:
+                    async for text in stream.text_stream:
+                        if call["first_token_at"] is None:
+                            call["first_token_at"] = time.monotonic()
+                        yield text
+                    final_message = await stream.get_final_message()
+            call["usage"] = final_message.usage
+    
+    def _chat_system(self, context: Optional[Dict] = None) -> List[Dict]:
+        """
+        Build the chat system blocks
+        
+        The static Marko prompt and the per-user context are separate cached
+        blocks, so a context change only invalidates the second one.
+        """
+        system = [{"type": "text", "text": MARKO_SYSTEM_PROMPT, "cache_control": CACHE_CONTROL}]
         
         if context:
-            system += f"\n\nContexte actuel:\n"
+            context_text = "Contexte actuel:\n"
             if context.get("user_name"):
-                system += f"- Utilisateur: {context['user_name']}\n"
+                context_text += f"- Utilisateur: {context['user_name']}\n"
             if context.get("company_name"):
-                system += f"- Entreprise: {context['company_name']}\n"
+                context_text += f"- Entreprise: {context['company_name']}\n"
             if context.get("campaign"):
-                system += f"- Campagne active: {context['campaign']}\n"
+                context_text += f"- Campagne active: {context['campaign']}\n"
             if context.get("meta_connected"):
-                system += f"- Compte Meta connecté: Oui\n"
+                context_text += f"- Compte Meta connecté: Oui\n"
+            system.append({"type": "text", "text": context_text, "cache_control": CACHE_CONTROL})
+        
+        if context and context.get("summary"):
+            system.append({
+                "type": "text",
+                "text": f"Résumé de la conversation jusqu'ici:\n{context['summary']}",
+                "cache_control": CACHE_CONTROL
+            })
+        
+        return system
+    
+    def _cached_history(self, messages: List[Dict[str, str]]) -> List[Dict]:
+        """
+        Put a cache breakpoint on the last message
+        
+        Next turn, everything up to this point is an unchanged prefix and is
+        read back from the cache instead of being reprocessed.
+        """
+        if not messages:
+            return messages
+        
+        last = messages[-1]
+        return messages[:-1] + [{
+            "role": last["role"],
+            "content": [{"type": "text", "text": last["content"], "cache_control": CACHE_CONTROL}]
+        }]
+    
+    async def summarize_conversation(
+        self,
+        messages: List[Dict[str, str]],
+        previous_summary: Optional[str] = None,
+        user_id: Optional[int] = None
+    ) -> str:
+        """
+        Fold older chat turns into a rolling summary
         
-        response = self.client.messages.create(
+        Args:
+            messages: Turns to fold in, oldest first
+            previous_summary: Summary of everything before `messages`
+        
+        Returns:
+            The updated summary
+        """
+        transcript = "\n\n".join(
+            f"{'Utilisateur' if m['role'] == 'user' else 'Marko'}: {m['content']}"
+            for m in messages
+        )
+        
+        prompt = ""
+        if previous_summary:
+            prompt += f"Résumé précédent:\n{previous_summary}\n\n"
+        prompt += f"""Nouveaux échanges:\n{transcript}
+
+Mets à jour le résumé de cette conversation entre un utilisateur et Marko.
+Conserve les faits utiles pour la suite: infos sur l'entreprise, objectifs, ton de la marque,
+décisions prises, contenus créés ou planifiés, questions en suspens.
+Réponds uniquement avec le résumé, en français, en 300 mots maximum."""
+        
+        response = await self._create(
+            "summarize_conversation",
+            user_id=user_id,
             model=self.model,
-            max_tokens=2048,
-            system=system,
-            messages=messages
+            max_tokens=1024,
+            system="Tu résumes des conversations marketing de manière factuelle et concise.",
+            messages=[{"role": "user", "content": prompt}]
         )
         
         return response.content[0].text
     
+    @coalesce
     async def generate_content(
         self,
         content_type: str,  # post, story, reel, carousel, ad
@@ -94,11 +324,16 @@ class AIService:
         brief: str,
         brand_voice: Optional[str] = None,
         target_audience: Optional[str] = None,
-        objective: Optional[str] = None
+        objective: Optional[str] = None,
+        user_id: Optional[int] = None,
+        force_refresh: bool = False
     ) -> Dict:
         """
         Generate marketing content
         
+        Results are cached on the normalized brief; force_refresh skips the
+        lookup and overwrites the cached entry.
+        
         Returns:
             {
                 "caption": str,
@@ -109,6 +344,120 @@ class AIService:
                 "strategy_notes": str
             }
         """
+        cache_key = make_key(
+            "generate_content",
+            content_type=content_type,
+            platform=platform,
+            brief=brief,
+            brand_voice=brand_voice,
+            target_audience=target_audience,
+            objective=objective,
+            model=self.model
+        )
+        if not force_refresh:
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
+        response = await self._create(
+            "generate_content",
+            user_id=user_id,
+            **self._content_params(
+                content_type, platform, brief, brand_voice, target_audience, objective
+            )
+        )
+        
+        result = self._parse_content(response.content[0].text)
+        if result is None:
+            # Fallback if JSON parsing fails
+            return {
+                "caption": response.content[0].text,
+                "hashtags": [],
+                "cta": "",
+                "visual_suggestion": "",
+                "best_time": "",
+                "strategy_notes": ""
+            }
+        
+        await self.cache.set(cache_key, result)
+        return result
+    
+    async def generate_content_batch(
+        self,
+        briefs: List[Dict],
+        on_progress: Optional[Callable[[int, int], Awaitable[None]]] = None,
+        user_id: Optional[int] = None
+    ) -> List[Optional[Dict]]:
+        """
+        Generate many pieces of content through the Message Batches API
+        
+        Half the price of individual calls and no concurrency slots held,
+        but results can take minutes to come back, so this is for bulk jobs.
+        Briefs already in the result cache are not sent.
+        
+        Args:
+            briefs: generate_content keyword arguments, one dict per item
+            on_progress: Awaited with (processed, total) on every poll
+            user_id: On whose behalf, for the usage records
+        
+        Returns:
+            One parsed result per brief, in order, None where it failed
+        """
+        keys = [make_key("generate_content", **brief, model=self.model) for brief in briefs]
+        results: List[Optional[Dict]] = [await self.cache.get(key) for key in keys]
+        pending = [i for i, result in enumerate(results) if result is None]
+        if not pending:
+            return results
+        cached = len(briefs) - len(pending)
+        
+        started = time.monotonic()
+        batch = await self.client.messages.batches.create(
+            requests=[
+                {"custom_id": str(i), "params": self._content_params(**briefs[i])}
+                for i in pending
+            ]
+        )
+        
+        while batch.processing_status != "ended":
+            await asyncio.sleep(settings.ai_batch_poll_seconds)
+            batch = await self.client.messages.batches.retrieve(batch.id)
+            if on_progress:
+                counts = batch.request_counts
+                await on_progress(
+                    cached + counts.succeeded + counts.errored + counts.canceled + counts.expired,
+                    len(briefs)
+                )
+        
+        async for entry in await self.client.messages.batches.results(batch.id):
+            if entry.result.type != "succeeded":
+                continue
+            message = entry.result.message
+            self._record_usage(
+                "generate_content_batch",
+                message.model,
+                "ok",
+                message.usage,
+                user_id=user_id,
+                latency=time.monotonic() - started
+            )
+            results[int(entry.custom_id)] = self._parse_content(message.content[0].text)
+        
+        for i in pending:
+            if results[i] is not None:
+                await self.cache.set(keys[i], results[i])
+        
+        return results
+    
+    def _content_params(
+        self,
+        content_type: str,
+        platform: str,
+        brief: str,
+        brand_voice: Optional[str] = None,
+        target_audience: Optional[str] = None,
+        objective: Optional[str] = None
+    ) -> Dict:
+        """messages.create parameters for one generate_content call"""
         prompt = f"""Génère du contenu marketing avec les spécifications suivantes:
 
 Type de contenu: {content_type}
@@ -134,18 +483,16 @@ Réponds en JSON avec cette structure exacte:
 }
 """
         
-        response = self.client.messages.create(
-            model=self.model,
-            max_tokens=1024,
-            system="Tu es un expert en marketing digital. Réponds uniquement en JSON valide.",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        
-        # Parse JSON response
-        import json
+        return {
+            "model": self.model,
+            "max_tokens": 1024,
+            "system": "Tu es un expert en marketing digital. Réponds uniquement en JSON valide.",
+            "messages": [{"role": "user", "content": prompt}]
+        }
+    
+    def _parse_content(self, text: str) -> Optional[Dict]:
+        """Extract the JSON object from a generate_content reply, None if invalid"""
         try:
-            # Extract JSON from response
-            text = response.content[0].text
             # Handle potential markdown code blocks
             if "```json" in text:
                 text = text.split("```json")[1].split("```")[0]
@@ -153,21 +500,15 @@ Réponds en JSON avec cette structure exacte:
                 text = text.split("```")[1].split("```")[0]
             return json.loads(text.strip())
         except:
-            # Fallback if JSON parsing fails
-            return {
-                "caption": response.content[0].text,
-                "hashtags": [],
-                "cta": "",
-                "visual_suggestion": "",
-                "best_time": "",
-                "strategy_notes": ""
-            }
+            return None
     
+    @coalesce
     async def analyze_performance(
         self,
         metrics: Dict,
         content_type: str,
-        industry: Optional[str] = None
+        industry: Optional[str] = None,
+        user_id: Optional[int] = None
     ) -> str:
         """
         Analyze content performance and provide insights
@@ -199,25 +540,45 @@ Fournis une analyse en français avec:
 4. Recommandations concrètes pour le prochain contenu
 """
         
-        response = self.client.messages.create(
+        response = await self._create(
+            "analyze_performance",
+            user_id=user_id,
             model=self.model,
             max_tokens=1024,
-            system=MARKO_SYSTEM_PROMPT,
+            system=[{"type": "text", "text": MARKO_SYSTEM_PROMPT, "cache_control": CACHE_CONTROL}],
             messages=[{"role": "user", "content": prompt}]
         )
         
         return response.content[0].text
     
+    @coalesce
     async def generate_strategy(
         self,
         business_description: str,
         goals: str,
         budget: Optional[int] = None,
-        duration_days: int = 30
+        duration_days: int = 30,
+        user_id: Optional[int] = None,
+        force_refresh: bool = False
     ) -> Dict:
         """
         Generate a marketing strategy/calendar
+        
+        Cached like generate_content.
         """
+        cache_key = make_key(
+            "generate_strategy",
+            business_description=business_description,
+            goals=goals,
+            budget=budget,
+            duration_days=duration_days,
+            model=self.model
+        )
+        if not force_refresh:
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
         prompt = f"""Crée une stratégie marketing pour:
 
 Business: {business_description}
@@ -252,7 +613,9 @@ Réponds en JSON avec cette structure:
 }
 """
         
-        response = self.client.messages.create(
+        response = await self._create(
+            "generate_strategy",
+            user_id=user_id,
             model=self.model,
             max_tokens=2048,
             system="Tu es un stratège marketing expert. Réponds uniquement en JSON valide.",
@@ -266,9 +629,12 @@ Réponds en JSON avec cette structure:
                 text = text.split("```json")[1].split("```")[0]
             elif "```" in text:
                 text = text.split("```")[1].split("```")[0]
-            return json.loads(text.strip())
+            strategy = json.loads(text.strip())
         except:
             return {"error": "Could not parse strategy", "raw": response.content[0].text}
+        
+        await self.cache.set(cache_key, strategy)
+        return strategy
 
 # Singleton instance
 ai_service = AIService()
@@ -0,0 +1,263 @@
+"""
+Analytics Service - sync content metrics from Meta
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Union
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal, run_sync
+from app.db.models import Content, ContentAnalytics, Job, MetaAccount
+from app.services.job_queue import enqueue
+from app.services.meta_rate_limiter import Priority
+from app.services.meta_service import meta_service
+
+logger = logging.getLogger(__name__)
+
+# Graph insight name -> ContentAnalytics column
+INSIGHT_FIELDS = {
+    "impressions": "impressions",
+    "reach": "reach",
+    "engagement": "engagement",
+    "likes": "likes",
+    "comments": "comments",
+    "shares": "shares",
+    "saved": "saves"
+}
+
+# (post age, max staleness): young posts change fastest, so refresh them most often
+STALENESS_TIERS = [
+    (timedelta(days=1), timedelta(minutes=15)),
+    (timedelta(days=7), timedelta(hours=2)),
+    (timedelta(days=30), timedelta(hours=12)),
+    (None, timedelta(days=3))
+]
+
+
+def content_metrics(analytics: ContentAnalytics) -> Dict:
+    """Metrics of a content as sent to the AI performance analysis"""
+    return {
+        "impressions": analytics.impressions,
+        "reach": analytics.reach,
+        "engagement": analytics.engagement,
+        "likes": analytics.likes,
+        "comments": analytics.comments,
+        "shares": analytics.shares,
+        "clicks": analytics.clicks,
+        "spend": analytics.spend,
+        "cpc": analytics.cpc,
+        "roas": analytics.roas
+    }
+
+
+def apply_insights(analytics: ContentAnalytics, insights: Dict):
+    """Copy a Graph insights response onto a ContentAnalytics row"""
+    for metric in insights.get("data", []):
+        field = INSIGHT_FIELDS.get(metric.get("name"))
+        if field:
+            setattr(analytics, field, metric.get("values", [{}])[0].get("value", 0))
+
+    analytics.last_updated = datetime.utcnow()
+
+
+def usage_account_id(account: MetaAccount) -> Optional[str]:
+    """The account Meta reports the usage of content calls against"""
+    return account.instagram_account_id or account.facebook_page_id
+
+
+async def refresh_contents(
+    db: Union[Session, AsyncSession],
+    contents: List[Content],
+    access_token: str,
+    account_id: Optional[str] = None
+) -> Dict:
+    """
+    Refresh analytics of published contents with batched Graph calls
+
+    Commits once at the end. Works with the API's AsyncSession as well as
+    the workers' Session.
+
+    Returns:
+        {"refreshed": [content_id, ...], "failed": {content_id: error message}}
+    """
+    contents = [c for c in contents if c.meta_post_id]
+    if not contents:
+        return {"refreshed": [], "failed": {}}
+
+    insights_by_media = await meta_service.get_posts_insights(
+        [c.meta_post_id for c in contents],
+        access_token,
+        account_id=account_id
+    )
+
+    def store(session: Session) -> Dict:
+        existing = {
+            a.content_id: a
+            for a in session.query(ContentAnalytics).filter(
+                ContentAnalytics.content_id.in_([c.id for c in contents])
+            )
+        }
+
+        refreshed, failed = [], {}
+        for content in contents:
+            insights = insights_by_media.get(content.meta_post_id, {})
+            if "error" in insights:
+                failed[content.id] = insights["error"].get("message", "Unknown error")
+                continue
+
+            analytics = existing.get(content.id)
+            if not analytics:
+                analytics = ContentAnalytics(content_id=content.id)
+                session.add(analytics)
+            apply_insights(analytics, insights)
+            refreshed.append(content.id)
+
+        session.commit()
+        return {"refreshed": refreshed, "failed": failed}
+
+    return await run_sync(db, store)
+
+
+class AnalyticsSyncWorker:
+    """
+    Keeps ContentAnalytics fresh in the background.
+
+    Every cycle it picks the published contents whose analytics are older
+    than their tier allows (see STALENESS_TIERS), most recently published
+    first, and refreshes them per user in batched Graph calls at LOW
+    priority. Contents that fail are retried with a growing delay.
+
+    With webhooks pushing changes, polling is only a fallback: the
+    tiers are stretched by `staleness_factor`.
+
+    Cycles run as "sync_analytics" jobs on the job queue, each one
+    scheduling the next `interval` seconds later, so one cycle runs at a
+    time however many API processes and workers there are. The failure
+    backoff is handed from one cycle to the next in the job payload.
+    """
+
+    def __init__(self, interval: float, batch_size: int, concurrency: int, staleness_factor: int = 1):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.staleness_factor = staleness_factor
+
+    def schedule(self, db: Session, backoff: Optional[Dict] = None, delay: float = 0) -> Optional[Job]:
+        """Queue the next cycle, unless one is already queued (a second chain merges into it)"""
+        if db.query(Job.id).filter(Job.type == "sync_analytics", Job.status == "queued").first():
+            return None
+        return enqueue(
+            db,
+            "sync_analytics",
+            {"backoff": backoff or {}},
+            priority=Priority.LOW,
+            run_at=datetime.utcnow() + timedelta(seconds=delay)
+        )
+
+    def _stale_contents(self, db: Session, now: datetime, backed_off: List[int]) -> List[tuple]:
+        """(content_id, user_id, access_token, account_id) of the stalest contents, most recent first"""
+        stale = []
+        for max_age, max_staleness in STALENESS_TIERS:
+            condition = or_(
+                ContentAnalytics.id.is_(None),
+                ContentAnalytics.last_updated < now - max_staleness * self.staleness_factor
+            )
+            if max_age is not None:
+                condition = and_(Content.published_at >= now - max_age, condition)
+            stale.append(condition)
+
+        # One active account per user, or its contents would come back once per account
+        account_id = select(MetaAccount.id).where(
+            MetaAccount.user_id == Content.user_id,
+            MetaAccount.is_active == True
+        ).order_by(MetaAccount.id).limit(1).correlate(Content).scalar_subquery()
+
+        query = db.query(
+            Content.id,
+            Content.user_id,
+            MetaAccount.access_token,
+            func.coalesce(MetaAccount.instagram_account_id, MetaAccount.facebook_page_id)
+        ).join(
+            MetaAccount, MetaAccount.id == account_id
+        ).outerjoin(
+            ContentAnalytics, ContentAnalytics.content_id == Content.id
+        ).filter(
+            Content.status == "published",
+            Content.meta_post_id.isnot(None),
+            or_(*stale)
+        )
+        if backed_off:
+            query = query.filter(Content.id.notin_(backed_off))
+
+        return query.order_by(Content.published_at.desc().nullslast()).limit(self.batch_size).all()
+
+    async def _sync_user(self, content_ids: List[int], access_token: str, account_id: Optional[str]) -> Dict:
+        async with AsyncSessionLocal() as db:
+            contents = (await db.scalars(select(Content).where(Content.id.in_(content_ids)))).all()
+            return await refresh_contents(db, contents, access_token, account_id)
+
+    async def sync_once(self, backoff: Optional[Dict] = None) -> Dict:
+        """
+        Run one sync cycle
+
+        Args:
+            backoff: From the previous cycle, content id -> [consecutive failures, retry at]
+
+        Returns:
+            {"refreshed": n, "failed": n, "backoff": for the next cycle}
+        """
+        now = datetime.utcnow()
+        backoff = {
+            content_id: entry for content_id, entry in (backoff or {}).items()
+            # Not retried a day after it was due: the content is gone
+            if datetime.fromisoformat(entry[1]) > now - timedelta(days=1)
+        }
+        backed_off = [int(content_id) for content_id, entry in backoff.items() if datetime.fromisoformat(entry[1]) > now]
+
+        async with AsyncSessionLocal() as db:
+            rows = await db.run_sync(self._stale_contents, now, backed_off)
+
+        by_user: Dict[int, tuple] = {}
+        for content_id, user_id, access_token, account_id in rows:
+            by_user.setdefault(user_id, (access_token, account_id, []))[2].append(content_id)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def sync(access_token: str, account_id: Optional[str], content_ids: List[int]) -> Dict:
+            async with semaphore:
+                try:
+                    return await self._sync_user(content_ids, access_token, account_id)
+                except Exception as e:
+                    logger.exception("Analytics sync failed for %d contents", len(content_ids))
+                    return {"refreshed": [], "failed": {content_id: str(e) for content_id in content_ids}}
+
+        results = await asyncio.gather(*[sync(*user) for user in by_user.values()])
+
+        refreshed = failed = 0
+        for result in results:
+            for content_id in result["refreshed"]:
+                backoff.pop(str(content_id), None)
+            for content_id in result["failed"]:
+                failures = backoff.get(str(content_id), [0])[0] + 1
+                delay = min(self.interval * 2 ** failures, timedelta(days=1).total_seconds())
+                backoff[str(content_id)] = [failures, (now + timedelta(seconds=delay)).isoformat()]
+            refreshed += len(result["refreshed"])
+            failed += len(result["failed"])
+
+        if rows:
+            logger.info("Analytics sync: %d refreshed, %d failed", refreshed, failed)
+        return {"refreshed": refreshed, "failed": failed, "backoff": backoff}
+
+
+# Singleton instance
+analytics_sync = AnalyticsSyncWorker(
+    interval=settings.analytics_sync_interval_seconds,
+    batch_size=settings.analytics_sync_batch_size,
+    concurrency=settings.analytics_sync_concurrency,
+    staleness_factor=settings.analytics_sync_webhook_fallback_factor if settings.meta_webhooks_enabled else 1
+)
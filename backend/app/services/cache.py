@@ -0,0 +1,181 @@
+"""
+Result cache with TTL + LRU eviction and pluggable backends
+"""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+def _normalize(value: Any) -> Any:
+    """Make near-identical inputs hash the same (case, spacing, key order)"""
+    if isinstance(value, str):
+        return " ".join(value.lower().split())
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def make_key(namespace: str, **params) -> str:
+    """Build a cache key from a namespace and normalized keyword arguments"""
+    payload = json.dumps(_normalize(params), sort_keys=True, ensure_ascii=False)
+    return f"{namespace}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+class MemoryCacheBackend:
+    """In-process backend, lost on restart and not shared across workers"""
+
+    blocking = False
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: int):
+        self._entries[key] = (value, time.time() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """
+    SQLite file backend, survives restarts and is shared by every worker
+    on the host. Values must be JSON-serializable. Calls block (up to
+    the 5 s busy timeout), so ResultCache runs them in a worker thread.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_cache_entries_accessed_at "
+            "ON cache_entries (accessed_at)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value, expires_at FROM cache_entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] < now:
+            conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE cache_entries SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: int):
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_entries (key, value, expires_at, accessed_at) "
+            "VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), now + ttl, now)
+        )
+        conn.execute("DELETE FROM cache_entries WHERE expires_at < ?", (now,))
+        conn.execute(
+            "DELETE FROM cache_entries WHERE key IN ("
+            "SELECT key FROM cache_entries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def delete(self, key: str):
+        self._conn().execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+
+
+class ResultCache:
+    """TTL cache in front of a backend, counting hits and misses"""
+
+    def __init__(self, backend, ttl: int):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    async def _call(self, fn, *args):
+        """Run a backend call, off the event loop when it blocks"""
+        if self.backend.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = await self._call(self.backend.get, key) if self.backend is not None else None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        if self.backend is not None:
+            await self._call(self.backend.set, key, value, ttl or self.ttl)
+
+    async def delete(self, key: str):
+        if self.backend is not None:
+            await self._call(self.backend.delete, key)
+
+    async def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend is not None else None,
+            "entries": await self._call(len, self.backend) if self.backend is not None else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+
+def build_cache(backend: str, path: str, ttl: int, max_entries: int) -> ResultCache:
+    """Build a ResultCache from settings (backend: memory, sqlite or none)"""
+    if backend == "sqlite":
+        return ResultCache(SQLiteCacheBackend(path, max_entries), ttl)
+    if backend == "memory":
+        return ResultCache(MemoryCacheBackend(max_entries), ttl)
+    return ResultCache(None, ttl)
@@ -0,0 +1,206 @@
+"""
+Calendar Service - turn a campaign strategy into dated draft content
+"""
+import asyncio
+import logging
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.models import Content, Job
+from app.services.ai_service import ai_service
+
+logger = logging.getLogger(__name__)
+
+WEEKDAYS = {
+    "lundi": 0, "monday": 0,
+    "mardi": 1, "tuesday": 1,
+    "mercredi": 2, "wednesday": 2,
+    "jeudi": 3, "thursday": 3,
+    "vendredi": 4, "friday": 4,
+    "samedi": 5, "saturday": 5,
+    "dimanche": 6, "sunday": 6
+}
+
+CONTENT_TYPES = {"post", "story", "reel", "carousel", "ad"}
+
+
+def _posting_times(strategy: Dict) -> List[tuple]:
+    """Parse best_posting_times ("10h", "18h30", "12:00") into (hour, minute)"""
+    times = []
+    for raw in strategy.get("best_posting_times") or []:
+        match = re.match(r"\s*(\d{1,2})\s*[h:]\s*(\d{2})?", str(raw))
+        if match and int(match.group(1)) < 24:
+            times.append((int(match.group(1)), int(match.group(2) or 0)))
+    return times or [(10, 0)]
+
+
+def plan_calendar(strategy: Dict, start_date: datetime) -> List[Dict]:
+    """
+    Give every content idea of a strategy a publication date
+
+    An idea for "mercredi" lands on the first Wednesday on or after
+    start_date; the next "mercredi" idea lands a week later, and so on.
+    Ideas without a recognizable day fill the days after start_date in order.
+    """
+    times = _posting_times(strategy)
+    seen_per_day: Dict[int, int] = {}
+    planned = []
+
+    for i, idea in enumerate(strategy.get("content_ideas") or []):
+        if not isinstance(idea, dict) or not idea.get("idea"):
+            continue
+
+        weekday = WEEKDAYS.get(str(idea.get("day", "")).strip().lower())
+        if weekday is None:
+            day = start_date + timedelta(days=i)
+        else:
+            occurrence = seen_per_day.get(weekday, 0)
+            seen_per_day[weekday] = occurrence + 1
+            offset = (weekday - start_date.weekday()) % 7
+            day = start_date + timedelta(days=offset + 7 * occurrence)
+
+        hour, minute = times[i % len(times)]
+        content_type = str(idea.get("type", "post")).lower()
+        planned.append({
+            "content_type": content_type if content_type in CONTENT_TYPES else "post",
+            "idea": idea["idea"],
+            "scheduled_for": day.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        })
+
+    return planned
+
+
+def calendar_payload(
+    campaign_id: int,
+    planned: List[Dict],
+    platform: str,
+    brand_voice: Optional[str] = None,
+    target_audience: Optional[str] = None,
+    objective: Optional[str] = None
+) -> Dict:
+    """Job payload of a generate_calendar job (see job_handlers.py)"""
+    return {
+        "campaign_id": campaign_id,
+        "mode": "batch" if len(planned) >= settings.calendar_batch_threshold else "parallel",
+        "planned": [
+            {**item, "scheduled_for": item["scheduled_for"].isoformat()}
+            for item in planned
+        ],
+        "platform": platform,
+        "brand_voice": brand_voice,
+        "target_audience": target_audience,
+        "objective": objective
+    }
+
+
+def calendar_status(job: Job) -> Dict:
+    """Progress of a generate_calendar job, as saved by run_calendar_job"""
+    progress = job.result or {}
+    return {
+        "id": job.id,
+        "campaign_id": job.payload["campaign_id"],
+        "status": job.status,
+        "mode": job.payload["mode"],
+        "total": len(job.payload["planned"]),
+        "processed": progress.get("processed", 0),
+        "failed": progress.get("failed", 0),
+        "content_ids": progress.get("content_ids", []),
+        "error": job.error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at
+    }
+
+
+async def run_calendar_job(db: AsyncSession, job: Job) -> Dict:
+    """
+    Generate content for every planned idea and insert it as draft Content
+
+    Drafts keep their planned scheduled_for but the scheduler ignores them
+    until the user reviewed the caption, added media and scheduled them.
+
+    Progress is saved in job.result as it goes, so any worker can report
+    it. The Content rows are committed together with their ids, so a job
+    run again after that point does not insert them twice.
+    """
+    if job.result and "content_ids" in job.result:
+        return job.result
+
+    payload = job.payload
+    planned = payload["planned"]
+    briefs = [
+        {
+            "content_type": item["content_type"],
+            "platform": payload["platform"],
+            "brief": item["idea"],
+            "brand_voice": payload["brand_voice"],
+            "target_audience": payload["target_audience"],
+            "objective": payload["objective"]
+        }
+        for item in planned
+    ]
+
+    lock = asyncio.Lock()
+
+    async def on_progress(processed: int, total: int):
+        async with lock:
+            job.result = {"processed": processed}
+            await db.commit()
+
+    await on_progress(0, len(briefs))
+    if payload["mode"] == "batch":
+        results = await ai_service.generate_content_batch(briefs, on_progress=on_progress, user_id=job.user_id)
+    else:
+        results = await _generate_parallel(job.user_id, briefs, on_progress)
+
+    contents = []
+    for item, result in zip(planned, results):
+        if result is None:
+            continue
+        contents.append(Content(
+            user_id=job.user_id,
+            campaign_id=payload["campaign_id"],
+            title=item["idea"][:255],
+            content_type=item["content_type"],
+            platform=payload["platform"],
+            caption=result.get("caption", ""),
+            hashtags=[h.lstrip("#") for h in result.get("hashtags") or []],
+            cta_text=(result.get("cta") or "")[:50] or None,
+            status="draft",
+            scheduled_for=datetime.fromisoformat(item["scheduled_for"]),
+            ai_prompt=item["idea"],
+            ai_model=ai_service.model
+        ))
+
+    db.add_all(contents)
+    await db.flush()
+    job.result = {
+        "processed": len(briefs),
+        "failed": len(briefs) - len(contents),
+        "content_ids": [c.id for c in contents]
+    }
+    await db.commit()
+    return job.result
+
+
+async def _generate_parallel(user_id: int, briefs: List[Dict], on_progress) -> List[Optional[Dict]]:
+    """Fan out generate_content calls with bounded parallelism"""
+    semaphore = asyncio.Semaphore(settings.calendar_generation_concurrency)
+    processed = 0
+
+    async def generate(brief: Dict) -> Optional[Dict]:
+        nonlocal processed
+        async with semaphore:
+            try:
+                return await ai_service.generate_content(**brief, user_id=user_id)
+            except Exception:
+                logger.exception("Calendar item generation failed")
+                return None
+            finally:
+                processed += 1
+                await on_progress(processed, len(briefs))
+
+    return await asyncio.gather(*[generate(brief) for brief in briefs])
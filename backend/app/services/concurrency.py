@@ -0,0 +1,143 @@
+"""
+Concurrency limits for outbound LLM calls
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Awaitable, Dict, Optional, TypeVar
+
+from fastapi import Request
+
+T = TypeVar("T")
+
+
+class QueueTimeoutError(Exception):
+    """Raised when a call waited longer than the queue timeout for a free slot"""
+
+
+class ClientDisconnectedError(Exception):
+    """Raised when the HTTP client went away while we were still working"""
+
+
+class ConcurrencyLimiter:
+    """
+    Global + per-user concurrency limit.
+
+    A call first takes a slot in its user's semaphore, then one in the global
+    semaphore, so a single busy user queues behind themselves instead of
+    holding global slots while they wait.
+    """
+
+    def __init__(self, max_concurrency: int, max_per_user: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_per_user = max_per_user
+        self.queue_timeout = queue_timeout
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._per_user: Dict[int, asyncio.Semaphore] = {}
+        self._user_refs: Dict[int, int] = {}
+
+    def _user_semaphore(self, user_id: int) -> asyncio.Semaphore:
+        if user_id not in self._per_user:
+            self._per_user[user_id] = asyncio.Semaphore(self.max_per_user)
+            self._user_refs[user_id] = 0
+        self._user_refs[user_id] += 1
+        return self._per_user[user_id]
+
+    def _release_user(self, user_id: int):
+        self._user_refs[user_id] -= 1
+        if self._user_refs[user_id] == 0:
+            del self._user_refs[user_id]
+            del self._per_user[user_id]
+
+    @asynccontextmanager
+    async def slot(self, user_id: Optional[int] = None):
+        """
+        Hold one slot for the duration of the block.
+
+        Yields the number of seconds spent waiting in the queue.
+        Raises QueueTimeoutError if no slot frees up within queue_timeout.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + self.queue_timeout
+        user_sem = self._user_semaphore(user_id) if user_id is not None else None
+        acquired = []
+        try:
+            for sem in (user_sem, self._global):
+                if sem is None:
+                    continue
+                if sem.locked():
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        raise QueueTimeoutError("Timed out waiting for an AI slot")
+                    try:
+                        await asyncio.wait_for(sem.acquire(), remaining)
+                    except asyncio.TimeoutError:
+                        raise QueueTimeoutError("Timed out waiting for an AI slot")
+                else:
+                    await sem.acquire()
+                acquired.append(sem)
+            yield loop.time() - started
+        finally:
+            for sem in acquired:
+                sem.release()
+            if user_id is not None:
+                self._release_user(user_id)
+
+    def stats(self) -> Dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_per_user": self.max_per_user,
+            "active_users": len(self._per_user),
+        }
+
+
+async def cancel_on_disconnect(
+    request: Request,
+    awaitable: Awaitable[T],
+    poll_interval: float = 0.5
+) -> T:
+    """
+    Await `awaitable`, cancelling it if the HTTP client disconnects first.
+
+    Starlette does not cancel a regular (non-streaming) handler when the
+    client goes away, so long LLM calls would otherwise run to completion
+    and hold their slot for nothing.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                raise ClientDisconnectedError()
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+async def gather_settled(awaitables: Dict[str, Awaitable], timeout: float) -> Dict[str, object]:
+    """
+    Run awaitables concurrently under one shared timeout
+
+    Never raises for a single failure: each key maps to its result, or to
+    the exception it raised (asyncio.TimeoutError if it didn't finish in
+    time, in which case it is cancelled).
+    """
+    tasks = {key: asyncio.ensure_future(aw) for key, aw in awaitables.items()}
+    if not tasks:
+        return {}
+    _, pending = await asyncio.wait(tasks.values(), timeout=timeout)
+    for task in pending:
+        task.cancel()
+
+    results = {}
+    for key, task in tasks.items():
+        if task in pending:
+            results[key] = asyncio.TimeoutError()
+        elif task.exception() is not None:
+            results[key] = task.exception()
+        else:
+            results[key] = task.result()
+    return results
@@ -0,0 +1,184 @@
+"""
+Job handlers - the slow work endpoints can hand to the job queue
+"""
+from datetime import datetime
+from typing import Dict
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.models import Campaign, Content, ContentAnalytics, Job, MetaAccount, User
+from app.services.ai_service import ai_service
+from app.services.analytics_service import analytics_sync, content_metrics, refresh_contents, usage_account_id
+from app.services.calendar_service import run_calendar_job
+from app.services.job_queue import JobDeferred, JobError, job_handler
+from app.services.publishing_service import (
+    TRANSIENT_ERROR_CODES,
+    ContainerProcessingError,
+    PublishError,
+    PublishInProgressError,
+    publish_container_when_ready,
+    publish_now
+)
+
+
+async def _get_content(db: AsyncSession, job: Job) -> Content:
+    content = await db.scalar(select(Content).where(
+        Content.id == job.payload["content_id"],
+        Content.user_id == job.user_id
+    ))
+    if not content:
+        raise JobError("Content not found", retryable=False)
+    return content
+
+
+@job_handler("publish_content")
+async def publish_content(db: AsyncSession, job: Job) -> Dict:
+    content = await _get_content(db, job)
+
+    # Already done by an earlier attempt (or the scheduler)
+    if content.status != "published":
+        try:
+            await publish_now(db, content, retrying=job.attempts < job.max_attempts)
+        except ContainerProcessingError as e:
+            # Resume once Instagram had time to process the media
+            raise JobDeferred(e.retry_after)
+        except PublishInProgressError as e:
+            raise JobError(str(e))
+        except PublishError as e:
+            raise JobError(str(e), retryable=e.transient)
+
+    return {
+        "status": "published",
+        "post_id": content.meta_post_id,
+        "platform": content.platform
+    }
+
+
+@job_handler("publish_instagram_container")
+async def publish_instagram_container(db: AsyncSession, job: Job) -> Dict:
+    account = await db.scalar(select(MetaAccount).where(
+        MetaAccount.user_id == job.user_id,
+        MetaAccount.is_active == True
+    ))
+    if not account or not account.instagram_account_id:
+        raise JobError("No Instagram account connected", retryable=False)
+
+    try:
+        result = await publish_container_when_ready(
+            account,
+            job.payload["container_id"],
+            datetime.fromisoformat(job.payload["created_at"])
+        )
+    except ContainerProcessingError as e:
+        raise JobDeferred(e.retry_after)
+    except PublishError as e:
+        # Unlike a Content, there is nothing to create a new container from
+        raise JobError(str(e), retryable=False)
+
+    if "error" in result:
+        error = result["error"]
+        raise JobError(
+            error.get("message", "Unknown error"),
+            retryable=error.get("code") in TRANSIENT_ERROR_CODES or bool(error.get("is_transient"))
+        )
+
+    return {"status": "published", "post_id": result.get("id")}
+
+
+@job_handler("refresh_content_analytics")
+async def refresh_content_analytics(db: AsyncSession, job: Job) -> Dict:
+    content = await _get_content(db, job)
+
+    account = await db.scalar(select(MetaAccount).where(
+        MetaAccount.user_id == job.user_id,
+        MetaAccount.is_active == True
+    ))
+    if not account:
+        raise JobError("No active Meta account", retryable=False)
+
+    result = await refresh_contents(db, [content], account.access_token, usage_account_id(account))
+    if content.id in result["failed"]:
+        raise JobError(result["failed"][content.id])
+
+    return {"status": "refreshed", "content_id": content.id}
+
+
+@job_handler("sync_analytics")
+async def sync_analytics(db: AsyncSession, job: Job) -> Dict:
+    backoff = job.payload.get("backoff")
+    try:
+        result = await analytics_sync.sync_once(backoff)
+        backoff = result.pop("backoff")
+        return result
+    finally:
+        # Keep the chain going, even after a failed cycle
+        if settings.analytics_sync_enabled:
+            await db.run_sync(analytics_sync.schedule, backoff, delay=analytics_sync.interval)
+
+
+@job_handler("generate_strategy")
+async def generate_strategy(db: AsyncSession, job: Job) -> Dict:
+    payload = job.payload
+    campaign = await db.scalar(select(Campaign).where(
+        Campaign.id == payload["campaign_id"],
+        Campaign.user_id == job.user_id
+    ))
+    if not campaign:
+        raise JobError("Campaign not found", retryable=False)
+
+    strategy = await ai_service.generate_strategy(
+        business_description=payload["business_description"],
+        goals=payload["goals"],
+        budget=payload.get("budget"),
+        duration_days=payload.get("duration_days", 30),
+        user_id=job.user_id,
+        force_refresh=payload.get("force_refresh", False)
+    )
+
+    if "error" in strategy:
+        raise JobError(strategy["error"])
+
+    campaign.strategy = strategy
+    campaign.vibe = strategy.get("vibe", "")
+    await db.commit()
+    return strategy
+
+
+@job_handler("generate_calendar")
+async def generate_calendar(db: AsyncSession, job: Job) -> Dict:
+    campaign = await db.scalar(select(Campaign).where(
+        Campaign.id == job.payload["campaign_id"],
+        Campaign.user_id == job.user_id
+    ))
+    if not campaign:
+        raise JobError("Campaign not found", retryable=False)
+
+    return await run_calendar_job(db, job)
+
+
+@job_handler("analyze_content_performance")
+async def analyze_content_performance(db: AsyncSession, job: Job) -> Dict:
+    content = await _get_content(db, job)
+
+    analytics = await db.scalar(select(ContentAnalytics).where(
+        ContentAnalytics.content_id == content.id
+    ))
+    if not analytics:
+        raise JobError("No analytics available", retryable=False)
+
+    user = await db.get(User, job.user_id)
+    metrics = content_metrics(analytics)
+    analysis = await ai_service.analyze_performance(
+        metrics=metrics,
+        content_type=content.content_type,
+        industry=user.company_name if user else None,
+        user_id=job.user_id
+    )
+
+    return {
+        "content_id": content.id,
+        "metrics": metrics,
+        "analysis": analysis
+    }
@@ -0,0 +1,281 @@
+"""
+Job Queue - durable background jobs stored in the database
+"""
+import asyncio
+import logging
+import os
+import secrets
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.db.models import Job
+from app.services.meta_rate_limiter import Priority
+from app.services.usage_service import current_route
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = {"succeeded", "failed", "dead"}
+
+JobHandler = Callable[[AsyncSession, Job], Awaitable[Optional[Dict]]]
+
+# Job type -> handler, filled by @job_handler (see job_handlers.py)
+handlers: Dict[str, JobHandler] = {}
+
+
+class JobError(Exception):
+    """Raised by handlers; non-retryable errors fail the job right away"""
+
+    def __init__(self, message: str, retryable: bool = True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class JobDeferred(Exception):
+    """Raised by handlers to run the job again in `delay` seconds, without using up an attempt"""
+
+    def __init__(self, delay: float):
+        super().__init__(f"Deferred for {delay:.0f}s")
+        self.delay = delay
+
+
+def job_handler(job_type: str):
+    """Register the coroutine handling one job type"""
+    def register(handler: JobHandler) -> JobHandler:
+        handlers[job_type] = handler
+        return handler
+    return register
+
+
+def enqueue(
+    db: Session,
+    job_type: str,
+    payload: Dict,
+    user_id: Optional[int] = None,
+    priority: Priority = Priority.NORMAL,
+    max_attempts: Optional[int] = None,
+    run_at: Optional[datetime] = None
+) -> Job:
+    """Store a new job; a worker picks it up once run_at has passed"""
+    job = Job(
+        type=job_type,
+        payload=payload,
+        user_id=user_id,
+        priority=int(priority),
+        max_attempts=max_attempts or settings.job_max_attempts,
+        run_at=run_at or datetime.utcnow()
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def serialize(job: Job) -> Dict:
+    return {
+        "id": job.id,
+        "type": job.type,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at
+    }
+
+
+def claim(db: Session, owner: str, limit: int) -> List[int]:
+    """
+    Atomically lease up to `limit` runnable jobs to `owner`, most urgent first
+
+    Runnable: queued and due, or running with an expired lease (its worker
+    died or hung past the visibility timeout).
+    """
+    now = datetime.utcnow()
+    runnable = or_(
+        and_(Job.status == "queued", Job.run_at <= now),
+        and_(Job.status == "running", Job.lease_expires_at < now)
+    )
+    candidates = db.query(Job.id).filter(runnable).order_by(
+        Job.priority, Job.run_at, Job.id
+    ).limit(limit)
+
+    db.query(Job).filter(
+        Job.id.in_(candidates.scalar_subquery()),
+        runnable
+    ).update({
+        Job.status: "running",
+        Job.lease_owner: owner,
+        Job.lease_expires_at: now + timedelta(seconds=settings.job_visibility_timeout_seconds),
+        Job.attempts: Job.attempts + 1
+    }, synchronize_session=False)
+    db.commit()
+
+    return [
+        job_id for job_id, in db.query(Job.id).filter(
+            Job.lease_owner == owner,
+            Job.status == "running"
+        ).order_by(Job.priority, Job.run_at, Job.id)
+    ]
+
+
+def _finish(job: Job, status: str, result: Optional[Dict] = None, error: Optional[str] = None):
+    job.status = status
+    job.result = result
+    job.error = error
+    job.lease_owner = None
+    job.lease_expires_at = None
+    job.finished_at = datetime.utcnow()
+
+
+def _retry_or_bury(job: Job, error: str, retryable: bool):
+    """Schedule a retry with backoff, or fail / dead-letter the job"""
+    if not retryable:
+        _finish(job, "failed", error=error)
+    elif job.attempts >= job.max_attempts:
+        # Dead letter: kept for inspection, never retried automatically
+        _finish(job, "dead", error=error)
+    else:
+        job.status = "queued"
+        job.error = error
+        job.lease_owner = None
+        job.lease_expires_at = None
+        job.run_at = datetime.utcnow() + timedelta(
+            seconds=min(settings.job_retry_base_seconds * 2 ** (job.attempts - 1), settings.job_retry_max_seconds)
+        )
+
+
+class JobWorker:
+    """
+    Runs queued jobs with up to `concurrency` in flight.
+
+    Claimed jobs are leased for the visibility timeout and the lease is
+    renewed while the handler runs; if the worker dies, the lease expires
+    and another worker runs the job again (handlers must be idempotent).
+    Failed attempts are retried with exponential backoff; jobs that run
+    out of attempts end up "dead".
+    """
+
+    def __init__(self, concurrency: int, poll_interval: float):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.owner = f"{os.getpid()}:{secrets.token_hex(6)}"
+        self._running: Dict[int, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    async def _execute(self, job_id: int):
+        db = AsyncSessionLocal()
+        try:
+            job = await db.scalar(select(Job).where(Job.id == job_id, Job.lease_owner == self.owner))
+            if not job:
+                return
+
+            handler = handlers.get(job.type)
+            if handler is None:
+                _finish(job, "failed", error=f"Unknown job type {job.type}")
+                await db.commit()
+                return
+
+            # A job reclaimed after its worker died may already be out of attempts
+            if job.attempts > job.max_attempts:
+                _finish(job, "dead", error=job.error or "Lease expired too many times")
+                await db.commit()
+                return
+
+            # LLM usage recorded by the handler is attributed to the job type
+            current_route.set(f"job.{job.type}")
+            try:
+                result = await handler(db, job)
+            except JobDeferred as e:
+                await db.rollback()
+                await db.refresh(job)
+                job.status = "queued"
+                job.attempts -= 1
+                job.lease_owner = None
+                job.lease_expires_at = None
+                job.run_at = datetime.utcnow() + timedelta(seconds=e.delay)
+            except JobError as e:
+                await db.rollback()
+                await db.refresh(job)
+                _retry_or_bury(job, str(e), e.retryable)
+            except Exception as e:
+                await db.rollback()
+                await db.refresh(job)
+                logger.exception("Job %s (%s) failed", job.id, job.type)
+                _retry_or_bury(job, str(e) or type(e).__name__, True)
+            else:
+                _finish(job, "succeeded", result=result)
+            await db.commit()
+        finally:
+            await db.close()
+            self._running.pop(job_id, None)
+
+    async def _renew_leases(self):
+        if not self._running:
+            return
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(Job).where(
+                Job.id.in_(list(self._running)),
+                Job.lease_owner == self.owner
+            ).values(
+                lease_expires_at=datetime.utcnow() + timedelta(seconds=settings.job_visibility_timeout_seconds)
+            ))
+            await db.commit()
+
+    async def run_once(self) -> int:
+        """Claim jobs for the free slots and start them; returns how many were started"""
+        free = self.concurrency - len(self._running)
+        if free <= 0:
+            return 0
+
+        async with AsyncSessionLocal() as db:
+            job_ids = await db.run_sync(claim, self.owner, free)
+
+        # The claim also returns the jobs this worker is already running
+        job_ids = [job_id for job_id in job_ids if job_id not in self._running]
+        for job_id in job_ids:
+            self._running[job_id] = asyncio.create_task(self._execute(job_id))
+        return len(job_ids)
+
+    async def run(self):
+        """Poll for jobs until stop() is called"""
+        last_renewal = 0.0
+        loop = asyncio.get_running_loop()
+        while not self._stopping:
+            try:
+                started = await self.run_once()
+                if loop.time() - last_renewal > settings.job_visibility_timeout_seconds / 3:
+                    await self._renew_leases()
+                    last_renewal = loop.time()
+            except Exception:
+                logger.exception("Job polling failed")
+                started = 0
+            await asyncio.sleep(0 if started else self.poll_interval)
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self, timeout: Optional[float] = None):
+        """Stop claiming jobs and wait for running ones (their leases expire if we give up)"""
+        self._stopping = True
+        if self._task is not None:
+            await self._task
+            self._task = None
+        if self._running:
+            await asyncio.wait(list(self._running.values()), timeout=timeout)
+
+
+# Singleton instance
+job_worker = JobWorker(
+    concurrency=settings.job_worker_concurrency,
+    poll_interval=settings.job_poll_seconds
+)
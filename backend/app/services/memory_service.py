@@ -0,0 +1,128 @@
+"""
+Conversation memory - bounded chat history with a rolling summary
+"""
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.db.models import Conversation, Message
+from app.services.ai_service import ai_service
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationMemory:
+    """
+    Keeps what we send to Claude bounded for long conversations.
+
+    Conversation.context holds {"summary": str, "summarized_until_id": int}.
+    Only messages after summarized_until_id are sent verbatim, capped at
+    recent_messages + summary_batch. Once that many have piled up, the
+    oldest ones are folded into the summary by a background refresh, leaving
+    the last recent_messages verbatim.
+
+    The verbatim window only moves when the summary is refreshed, so between
+    refreshes the history is an append-only prefix that stays prompt-cached.
+    """
+
+    def __init__(self, recent_messages: int, summary_batch: int):
+        self.recent_messages = recent_messages
+        self.summary_batch = summary_batch
+        self._refreshing: Set[int] = set()
+
+    @property
+    def max_messages(self) -> int:
+        return self.recent_messages + self.summary_batch
+
+    def _state(self, conversation: Conversation) -> Dict:
+        return conversation.context or {}
+
+    async def load(self, db: AsyncSession, conversation: Conversation) -> Tuple[List[Dict[str, str]], Optional[str]]:
+        """
+        Get the history to send to Claude and the summary of what came before
+
+        Returns:
+            (messages, summary) where messages is a list of
+            {"role", "content"} starting with a user message
+        """
+        state = self._state(conversation)
+        messages = list((await db.scalars(select(Message).where(
+            Message.conversation_id == conversation.id,
+            Message.id > state.get("summarized_until_id", 0)
+        ).order_by(Message.id.desc()).limit(self.max_messages))).all())
+        messages.reverse()
+
+        # Claude expects the history to open with a user turn
+        while messages and messages[0].role != "user":
+            messages.pop(0)
+
+        return (
+            [{"role": m.role, "content": m.content} for m in messages],
+            state.get("summary")
+        )
+
+    async def needs_refresh(self, db: AsyncSession, conversation: Conversation) -> bool:
+        state = self._state(conversation)
+        unsummarized = await db.scalar(select(func.count(Message.id)).where(
+            Message.conversation_id == conversation.id,
+            Message.id > state.get("summarized_until_id", 0)
+        ))
+        return unsummarized >= self.max_messages
+
+    async def refresh(self, conversation_id: int, user_id: Optional[int] = None):
+        """Fold everything but the last recent_messages into the summary"""
+        if conversation_id in self._refreshing:
+            return
+        self._refreshing.add(conversation_id)
+
+        db = AsyncSessionLocal()
+        try:
+            conversation = await db.get(Conversation, conversation_id)
+            if not conversation:
+                return
+
+            state = self._state(conversation)
+            messages = list((await db.scalars(select(Message).where(
+                Message.conversation_id == conversation_id,
+                Message.id > state.get("summarized_until_id", 0)
+            ).order_by(Message.id))).all())
+
+            fold = messages[:-self.recent_messages] if self.recent_messages else messages
+            keep = messages[len(fold):]
+            # The verbatim window has to start on a user turn
+            while keep and keep[0].role != "user":
+                fold.append(keep.pop(0))
+
+            if not fold:
+                return
+
+            summary = await ai_service.summarize_conversation(
+                [{"role": m.role, "content": m.content} for m in fold],
+                previous_summary=state.get("summary"),
+                user_id=user_id
+            )
+
+            # Reassign (not mutate) so SQLAlchemy notices the JSON change
+            await db.refresh(conversation)
+            conversation.context = {
+                **self._state(conversation),
+                "summary": summary,
+                "summarized_until_id": fold[-1].id
+            }
+            await db.commit()
+        except Exception:
+            logger.exception("Summary refresh failed for conversation %s", conversation_id)
+        finally:
+            await db.close()
+            self._refreshing.discard(conversation_id)
+
+
+# Singleton instance
+conversation_memory = ConversationMemory(
+    recent_messages=settings.chat_memory_recent_messages,
+    summary_batch=settings.chat_memory_summary_batch
+)
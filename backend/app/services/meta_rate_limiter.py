@@ -0,0 +1,282 @@
+"""
+Meta rate limiting - pace Graph API calls from the usage headers Meta returns
+"""
+import asyncio
+import json
+import logging
+import time
+from enum import IntEnum
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Graph error codes meaning "throttled" (app, user, page, custom / business use case)
+THROTTLE_ERROR_CODES = {4, 17, 32, 613} | set(range(80000, 80015))
+
+
+class Priority(IntEnum):
+    HIGH = 0  # Publishing
+    NORMAL = 1  # Interactive reads (account connection, pages...)
+    LOW = 2  # Analytics refresh, background sync
+
+
+class RateLimitShedError(Exception):
+    """Raised when low-priority work is dropped to keep quota for the rest"""
+
+    def __init__(self, key: str, retry_after: float):
+        super().__init__(f"Meta rate limit nearly reached for {key}, request deferred")
+        self.key = key
+        self.retry_after = retry_after
+
+
+class AdaptiveBucket:
+    """
+    Token bucket whose refill rate follows the usage Meta last reported.
+
+    At 0% usage it refills at the configured rate; the closer usage gets
+    to 100%, the slower it refills. Without a newer report, the reported
+    usage decays to 0 over `usage_decay` seconds, so a bucket nothing is
+    sent through (shed calls) still recovers. A throttling error blocks it
+    until Meta says access is regained.
+    """
+
+    def __init__(self, rate: float, capacity: float, usage_decay: float = 300.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.usage_decay = usage_decay
+        self.tokens = capacity
+        self._reported_usage = 0.0  # Highest percentage from the last usage header
+        self._usage_at = 0.0
+        self.blocked_until = 0.0
+        self.waiting = [0] * len(Priority)
+        self._updated = time.monotonic()
+        self.last_used = self._updated
+
+    @property
+    def usage(self) -> float:
+        if not self._reported_usage:
+            return 0.0
+        age = time.monotonic() - self._usage_at
+        return self._reported_usage * max(1 - age / self.usage_decay, 0.0)
+
+    @usage.setter
+    def usage(self, value: float):
+        self._reported_usage = value
+        self._usage_at = time.monotonic()
+
+    @property
+    def effective_rate(self) -> float:
+        return self.rate * max(1 - self.usage / 100, 0.05)
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.effective_rate)
+        self._updated = now
+
+    def wait_time(self, priority: Priority, cost: float, reserve: float, now: float) -> float:
+        """Seconds until `cost` tokens can be taken at this priority (0 = now)"""
+        self._refill(now)
+        if self.blocked_until > now:
+            return self.blocked_until - now
+
+        # Higher-priority callers waiting on this bucket go first
+        if any(self.waiting[:priority]):
+            return 1 / self.effective_rate
+
+        # Everything below HIGH leaves a reserve for publishing. A full bucket
+        # always admits the call, even one costing more than what's above the
+        # reserve (a 50-item batch): take() runs into debt instead
+        needed = min(cost + (reserve * self.capacity if priority > Priority.HIGH else 0), self.capacity)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.effective_rate
+
+    def take(self, cost: float):
+        # May go negative for a large batch: the debt is paid off before the next call
+        self.tokens -= cost
+        self.last_used = time.monotonic()
+
+    def idle(self, now: float, ttl: float) -> bool:
+        """Unused for `ttl` seconds and back to its initial state, so it can be dropped"""
+        self._refill(now)
+        return (
+            now - self.last_used > ttl
+            and not any(self.waiting)
+            and self.blocked_until <= now
+            and self.tokens >= self.capacity
+        )
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        self._refill(now)
+        return {
+            "usage": round(self.usage, 1),
+            "tokens": round(self.tokens, 2),
+            "effective_rate": round(self.effective_rate, 2),
+            "blocked_for": round(max(self.blocked_until - now, 0), 1),
+            "waiting": {p.name.lower(): self.waiting[p] for p in Priority}
+        }
+
+
+class MetaRateLimiter:
+    """
+    Schedules Graph API calls against per-app, per-object (page, Instagram
+    account) and per-ad-account buckets.
+
+    Every call takes a token from each of its buckets; buckets unused for
+    `idle_bucket_ttl` are dropped. Usage headers
+    (X-App-Usage, X-Business-Use-Case-Usage, X-Ad-Account-Usage) slow the
+    matching buckets down as quota gets used; a report decays over
+    `usage_decay` seconds. LOW priority calls are shed once usage passes
+    `shed_usage`, or when they'd wait longer than `max_low_priority_delay`.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float,
+        reserve: float,
+        shed_usage: float,
+        max_low_priority_delay: float,
+        throttle_backoff: float,
+        idle_bucket_ttl: float = 600.0,
+        usage_decay: float = 300.0
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.reserve = reserve
+        self.shed_usage = shed_usage
+        self.max_low_priority_delay = max_low_priority_delay
+        self.throttle_backoff = throttle_backoff
+        self.idle_bucket_ttl = idle_bucket_ttl
+        self.usage_decay = usage_decay
+        self._buckets: Dict[str, AdaptiveBucket] = {}
+        self._next_eviction = time.monotonic() + idle_bucket_ttl
+        self.shed = 0
+
+    def _bucket(self, key: str) -> AdaptiveBucket:
+        if key not in self._buckets:
+            self._evict_idle()
+            self._buckets[key] = AdaptiveBucket(self.rate, self.burst, self.usage_decay)
+        return self._buckets[key]
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        if now < self._next_eviction:
+            return
+        self._next_eviction = now + self.idle_bucket_ttl
+        for key in [key for key, bucket in self._buckets.items() if key != "app" and bucket.idle(now, self.idle_bucket_ttl)]:
+            del self._buckets[key]
+
+    @staticmethod
+    def keys_for(path: str, account_id: Optional[str] = None) -> List[str]:
+        """
+        Buckets a Graph path counts against: the app, plus the account it acts on
+
+        Meta reports usage per page / Instagram account, so calls on one of
+        their objects (a media, a container) pass the owning account_id;
+        without it, the node in the path is taken to be the account.
+        """
+        keys = ["app"]
+        node = path.strip("/").split("/")[0].split("?")[0]
+        if node.startswith("act_"):
+            keys.append(f"ad_account:{node}")
+        elif account_id:
+            keys.append(f"object:{account_id}")
+        elif node.isdigit():
+            keys.append(f"object:{node}")
+        return keys
+
+    async def acquire(self, keys: List[str], priority: Priority = Priority.NORMAL, cost: float = 1):
+        """Wait until every bucket in `keys` has room; raises RateLimitShedError for dropped LOW work"""
+        buckets = [(key, self._bucket(key)) for key in keys]
+        for _, bucket in buckets:
+            bucket.waiting[priority] += 1
+        try:
+            waited = 0.0
+            while True:
+                now = time.monotonic()
+                if priority == Priority.LOW:
+                    for key, bucket in buckets:
+                        if bucket.usage >= self.shed_usage:
+                            self.shed += 1
+                            raise RateLimitShedError(key, max(bucket.blocked_until - now, self.throttle_backoff))
+
+                key, wait = max(
+                    ((key, bucket.wait_time(priority, cost, self.reserve, now)) for key, bucket in buckets),
+                    key=lambda item: item[1]
+                )
+                if wait <= 0:
+                    for _, bucket in buckets:
+                        bucket.take(cost)
+                    return
+                if priority == Priority.LOW and waited + wait > self.max_low_priority_delay:
+                    self.shed += 1
+                    raise RateLimitShedError(key, wait)
+
+                # Re-check at least every second: usage headers from other calls may change things
+                sleep = min(wait, 1.0)
+                await asyncio.sleep(sleep)
+                waited += sleep
+        finally:
+            for _, bucket in buckets:
+                bucket.waiting[priority] -= 1
+
+    def observe(self, keys: List[str], headers, body=None):
+        """Update buckets from a Graph response's usage headers and throttling errors"""
+        app_usage = _parse_header(headers.get("x-app-usage"))
+        if isinstance(app_usage, dict):
+            self._bucket("app").usage = _max_pct(app_usage)
+
+        regain = None
+        buc_usage = _parse_header(headers.get("x-business-use-case-usage"))
+        if isinstance(buc_usage, dict):
+            for object_id, entries in buc_usage.items():
+                entries = entries if isinstance(entries, list) else [entries]
+                bucket = self._bucket(f"object:{object_id}")
+                bucket.usage = max((_max_pct(e) for e in entries), default=0.0)
+                minutes = max((e.get("estimated_time_to_regain_access") or 0 for e in entries), default=0)
+                if minutes:
+                    bucket.blocked_until = time.monotonic() + minutes * 60
+                    regain = max(regain or 0, minutes * 60)
+
+        ad_usage = _parse_header(headers.get("x-ad-account-usage"))
+        if isinstance(ad_usage, dict):
+            for key in keys:
+                if key.startswith("ad_account:"):
+                    bucket = self._bucket(key)
+                    bucket.usage = float(ad_usage.get("acc_id_util_pct") or 0)
+                    if bucket.usage >= 100 and ad_usage.get("reset_time_duration"):
+                        bucket.blocked_until = time.monotonic() + float(ad_usage["reset_time_duration"])
+
+        error = body.get("error") if isinstance(body, dict) else None
+        if isinstance(error, dict) and error.get("code") in THROTTLE_ERROR_CODES:
+            # App-level throttling blocks everything; the others block the targeted object
+            targets = ["app"] if error.get("code") == 4 else [k for k in keys if k != "app"] or ["app"]
+            until = time.monotonic() + (regain or self.throttle_backoff)
+            for key in targets:
+                bucket = self._bucket(key)
+                bucket.blocked_until = max(bucket.blocked_until, until)
+            logger.warning("Meta throttled %s (code %s), backing off", ", ".join(targets), error.get("code"))
+
+    def stats(self) -> Dict:
+        return {
+            "shed": self.shed,
+            "buckets": {key: bucket.stats() for key, bucket in self._buckets.items()}
+        }
+
+
+def _parse_header(value: Optional[str]):
+    if not value:
+        return None
+    try:
+        return json.loads(value)
+    except ValueError:
+        return None
+
+
+def _max_pct(usage: Dict) -> float:
+    """Highest of the call count / CPU time / total time percentages"""
+    return float(max(
+        (v for k, v in usage.items() if k in ("call_count", "total_cputime", "total_time") and isinstance(v, (int, float))),
+        default=0
+    ))
@@ -1,18 +1,149 @@
 """
 Meta (Facebook/Instagram) API Service
 """
+import asyncio
 import httpx
-from typing import Optional, Dict, List
+import json
+from typing import AsyncIterator, Optional, Dict, List
 from datetime import datetime, timedelta
 from app.core.config import settings
+from app.services.cache import build_cache
+from app.services.meta_rate_limiter import MetaRateLimiter, Priority, RateLimitShedError
+
+class MetaAPIError(Exception):
+    """Graph API error response, for calls that can't return it as a dict"""
+    
+    def __init__(self, error: Dict):
+        super().__init__(error.get("message", "Meta API error"))
+        self.error = error
 
 class MetaService:
     BASE_URL = "https://graph.facebook.com/v19.0"
+    BATCH_LIMIT = 50  # Max sub-requests per Graph batch call
+    POST_INSIGHT_METRICS = ["impressions", "reach", "engagement", "saved", "likes", "comments", "shares"]
     
     def __init__(self):
         self.app_id = settings.meta_app_id
         self.app_secret = settings.meta_app_secret
         self.redirect_uri = settings.meta_redirect_uri
+        self._client: Optional[httpx.AsyncClient] = None
+        self.rate_limiter = MetaRateLimiter(
+            rate=settings.meta_rate_limit_per_second,
+            burst=settings.meta_rate_limit_burst,
+            reserve=settings.meta_rate_limit_reserve,
+            shed_usage=settings.meta_rate_limit_shed_usage_pct,
+            max_low_priority_delay=settings.meta_rate_limit_max_low_priority_delay_seconds,
+            throttle_backoff=settings.meta_rate_limit_throttle_backoff_seconds,
+            idle_bucket_ttl=settings.meta_rate_limit_idle_bucket_seconds,
+            usage_decay=settings.meta_rate_limit_usage_decay_seconds
+        )
+        # Pages, Instagram accounts and ad accounts rarely change
+        self.metadata_cache = build_cache(
+            backend=settings.meta_cache_backend,
+            path=settings.meta_cache_path,
+            ttl=settings.meta_cache_ttl_seconds,
+            max_entries=settings.meta_cache_max_entries
+        )
+    
+    # ============== HTTP client ==============
+    
+    def _build_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            http2=settings.meta_http2,
+            limits=httpx.Limits(
+                max_connections=settings.meta_http_max_connections,
+                max_keepalive_connections=settings.meta_http_max_keepalive_connections,
+                keepalive_expiry=settings.meta_http_keepalive_expiry_seconds
+            ),
+            timeout=httpx.Timeout(
+                settings.meta_http_timeout_seconds,
+                connect=settings.meta_http_connect_timeout_seconds
+            )
+        )
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """
+        Application-lifetime HTTP client shared by every Graph API call
+        
+        Keeps connections (and their TLS sessions) alive between calls.
+        Created on first use if startup() wasn't called, e.g. in scripts.
+        """
+        if self._client is None or self._client.is_closed:
+            self._client = self._build_client()
+        return self._client
+    
+    async def startup(self):
+        """Open the shared HTTP client (app lifespan startup)"""
+        if self._client is None:
+            self._client = self._build_client()
+    
+    async def shutdown(self):
+        """Close the shared HTTP client (app lifespan shutdown)"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        priority: Priority = Priority.NORMAL,
+        cost: int = 1,
+        account_id: Optional[str] = None,
+        **kwargs
+    ) -> Dict:
+        """
+        Send one Graph API call through the rate limiter
+        
+        account_id is the page / Instagram account owning the object the
+        call targets, when that object isn't the account itself (a media,
+        a container, a batch). Returns the parsed response body. Shed
+        low-priority calls return a throttling-style {"error": {...}}
+        without reaching Meta.
+        """
+        keys = self.rate_limiter.keys_for(path, account_id)
+        if settings.meta_rate_limit_enabled:
+            try:
+                await self.rate_limiter.acquire(keys, priority, cost)
+            except RateLimitShedError as e:
+                return {"error": {"message": str(e), "code": 4, "retry_after": round(e.retry_after)}}
+        
+        response = await self.client.request(method, f"{self.BASE_URL}/{path}".rstrip("/"), **kwargs)
+        data = response.json()
+        self.rate_limiter.observe(keys, response.headers, data)
+        return data
+    
+    async def paginate(
+        self,
+        path: str,
+        params: Dict,
+        priority: Priority = Priority.NORMAL,
+        page_size: Optional[int] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        Yield every item of a Graph list edge, following cursors lazily
+        
+        The next page is only requested once the caller has consumed the
+        current one, so breaking out of the loop stops fetching.
+        
+        Raises:
+            MetaAPIError: if Meta returns an error for any page
+        """
+        params = {**params, "limit": page_size or settings.meta_page_size}
+        while True:
+            data = await self._request("GET", path, priority=priority, params=params)
+            if "error" in data:
+                raise MetaAPIError(data["error"])
+            
+            for item in data.get("data", []):
+                yield item
+            
+            paging = data.get("paging") or {}
+            after = (paging.get("cursors") or {}).get("after")
+            if not paging.get("next") or not after:
+                return
+            params = {**params, "after": after}
     
     def get_oauth_url(self, state: str) -> str:
         """Get the OAuth URL for Meta login"""
@@ -29,147 +160,292 @@ class MetaService:
         ]
         
         return (
-            f"https://www.facebook.com/v19.0/dialog/oauth?"
+            "https://www.facebook.com/v19.0/dialog/oauth?"
             f"client_id={self.app_id}"
             f"&redirect_uri={self.redirect_uri}"
             f"&scope={','.join(scopes)}"
             f"&state={state}"
-            f"&response_type=code"
+            "&response_type=code"
         )
     
     async def exchange_code(self, code: str) -> Dict:
         """Exchange auth code for access token"""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.BASE_URL}/oauth/access_token",
-                params={
-                    "client_id": self.app_id,
-                    "client_secret": self.app_secret,
-                    "redirect_uri": self.redirect_uri,
-                    "code": code
-                }
-            )
-            return response.json()
+        return await self._request(
+            "GET",
+            "oauth/access_token",
+            params={
+                "client_id": self.app_id,
+                "client_secret": self.app_secret,
+                "redirect_uri": self.redirect_uri,
+                "code": code
+            }
+        )
     
     async def get_long_lived_token(self, short_token: str) -> Dict:
         """Exchange short-lived token for long-lived token (60 days)"""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.BASE_URL}/oauth/access_token",
-                params={
-                    "grant_type": "fb_exchange_token",
-                    "client_id": self.app_id,
-                    "client_secret": self.app_secret,
-                    "fb_exchange_token": short_token
-                }
-            )
-            return response.json()
+        return await self._request(
+            "GET",
+            "oauth/access_token",
+            params={
+                "grant_type": "fb_exchange_token",
+                "client_id": self.app_id,
+                "client_secret": self.app_secret,
+                "fb_exchange_token": short_token
+            }
+        )
     
     async def get_user_info(self, access_token: str) -> Dict:
         """Get basic user info"""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.BASE_URL}/me",
-                params={
-                    "fields": "id,name,email",
-                    "access_token": access_token
-                }
-            )
-            return response.json()
-    
-    async def get_pages(self, access_token: str) -> List[Dict]:
-        """Get user's Facebook pages"""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.BASE_URL}/me/accounts",
-                params={
-                    "fields": "id,name,access_token,instagram_business_account",
-                    "access_token": access_token
-                }
-            )
-            data = response.json()
-            return data.get("data", [])
-    
-    async def get_instagram_account(self, page_id: str, page_token: str) -> Optional[Dict]:
-        """Get Instagram Business Account linked to a Facebook Page"""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.BASE_URL}/{page_id}",
-                params={
-                    "fields": "instagram_business_account{id,username,profile_picture_url,followers_count}",
-                    "access_token": page_token
-                }
-            )
-            data = response.json()
-            return data.get("instagram_business_account")
-    
-    async def get_ad_accounts(self, access_token: str) -> List[Dict]:
-        """Get user's ad accounts"""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.BASE_URL}/me/adaccounts",
-                params={
-                    "fields": "id,name,account_status,currency,timezone_name",
-                    "access_token": access_token
-                }
-            )
-            data = response.json()
-            return data.get("data", [])
+        return await self._request(
+            "GET",
+            "me",
+            params={
+                "fields": "id,name,email",
+                "access_token": access_token
+            }
+        )
+    
+    # ============== Account metadata ==============
+    
+    async def prime_metadata(
+        self,
+        meta_user_id: str,
+        pages: Optional[List[Dict]] = None,
+        ad_accounts: Optional[List[Dict]] = None
+    ):
+        """Store freshly fetched pages / ad accounts of a Meta user (e.g. on connect)"""
+        if pages is not None:
+            await self.metadata_cache.set(f"meta:pages:{meta_user_id}", pages)
+        if ad_accounts is not None:
+            await self.metadata_cache.set(f"meta:ad_accounts:{meta_user_id}", ad_accounts)
+    
+    async def invalidate_metadata(self, meta_user_id: Optional[str] = None, page_ids: List[str] = ()):
+        """Drop cached metadata of a Meta user, its pages and their Instagram accounts"""
+        page_ids = {page_id for page_id in page_ids if page_id}
+        if meta_user_id:
+            page_ids.update(p["id"] for p in (await self.metadata_cache.get(f"meta:pages:{meta_user_id}")) or [])
+            await self.metadata_cache.delete(f"meta:pages:{meta_user_id}")
+            await self.metadata_cache.delete(f"meta:ad_accounts:{meta_user_id}")
+        for page_id in page_ids:
+            await self.metadata_cache.delete(f"meta:instagram:{page_id}")
+    
+    def iter_pages(self, access_token: str) -> AsyncIterator[Dict]:
+        """Stream user's Facebook pages"""
+        return self.paginate(
+            "me/accounts",
+            params={
+                "fields": "id,name,access_token,instagram_business_account",
+                "access_token": access_token
+            }
+        )
+    
+    async def get_pages(self, access_token: str, meta_user_id: Optional[str] = None) -> List[Dict]:
+        """Get all user's Facebook pages (cached per Meta user when meta_user_id is given)"""
+        key = f"meta:pages:{meta_user_id}"
+        if meta_user_id:
+            cached = await self.metadata_cache.get(key)
+            if cached is not None:
+                return cached
+        
+        pages = [page async for page in self.iter_pages(access_token)]
+        if meta_user_id:
+            await self.metadata_cache.set(key, pages)
+        return pages
+    
+    async def get_instagram_account(self, page_id: str, page_token: str, refresh: bool = False) -> Optional[Dict]:
+        """Get Instagram Business Account linked to a Facebook Page (cached per page)"""
+        key = f"meta:instagram:{page_id}"
+        if not refresh:
+            cached = await self.metadata_cache.get(key)
+            if cached is not None:
+                return cached or None
+        
+        data = await self._request(
+            "GET",
+            page_id,
+            params={
+                "fields": "instagram_business_account{id,username,profile_picture_url,followers_count}",
+                "access_token": page_token
+            }
+        )
+        if "error" in data:
+            return None
+        
+        instagram_account = data.get("instagram_business_account")
+        # Cache "no Instagram account" too, as an empty dict
+        await self.metadata_cache.set(key, instagram_account or {})
+        return instagram_account
+    
+    def iter_ad_accounts(self, access_token: str) -> AsyncIterator[Dict]:
+        """Stream user's ad accounts"""
+        return self.paginate(
+            "me/adaccounts",
+            params={
+                "fields": "id,name,account_status,currency,timezone_name",
+                "access_token": access_token
+            }
+        )
+    
+    async def get_ad_accounts(self, access_token: str, meta_user_id: Optional[str] = None) -> List[Dict]:
+        """Get all user's ad accounts (cached per Meta user when meta_user_id is given)"""
+        key = f"meta:ad_accounts:{meta_user_id}"
+        if meta_user_id:
+            cached = await self.metadata_cache.get(key)
+            if cached is not None:
+                return cached
+        
+        ad_accounts = [account async for account in self.iter_ad_accounts(access_token)]
+        if meta_user_id:
+            await self.metadata_cache.set(key, ad_accounts)
+        return ad_accounts
+    
+    async def subscribe_page(self, page_id: str, page_token: str, fields: List[str] = None) -> Dict:
+        """Subscribe the app to a Page's webhooks (feed changes by default)"""
+        return await self._request(
+            "POST",
+            f"{page_id}/subscribed_apps",
+            data={
+                "subscribed_fields": ",".join(fields or ["feed"]),
+                "access_token": page_token
+            }
+        )
     
     # ============== Publishing ==============
     
-    async def publish_to_instagram(
+    async def create_media_container(
         self,
         ig_user_id: str,
         access_token: str,
-        caption: str,
+        caption: Optional[str] = None,
         image_url: Optional[str] = None,
         video_url: Optional[str] = None,
-        media_type: str = "IMAGE"  # IMAGE, VIDEO, CAROUSEL, REELS, STORIES
+        media_type: str = "IMAGE",  # IMAGE, VIDEO, REELS, STORIES, CAROUSEL
+        is_carousel_item: bool = False,
+        children: Optional[List[str]] = None
     ) -> Dict:
+        """Create an Instagram media container ({"id": container id})"""
+        container_params = {"access_token": access_token}
+        
+        if caption is not None:
+            container_params["caption"] = caption
+        if is_carousel_item:
+            container_params["is_carousel_item"] = "true"
+        
+        if media_type == "IMAGE" and image_url:
+            container_params["image_url"] = image_url
+        elif media_type in ["VIDEO", "REELS"] and video_url:
+            container_params["video_url"] = video_url
+            container_params["media_type"] = media_type
+        elif media_type == "STORIES":
+            container_params["media_type"] = "STORIES"
+            if video_url:
+                container_params["video_url"] = video_url
+            else:
+                container_params["image_url"] = image_url
+        elif media_type == "CAROUSEL":
+            container_params["media_type"] = "CAROUSEL"
+            container_params["children"] = ",".join(children or [])
+        
+        return await self._request(
+            "POST",
+            f"{ig_user_id}/media",
+            priority=Priority.HIGH,
+            data=container_params
+        )
+    
+    async def create_carousel_container(
+        self,
+        ig_user_id: str,
+        access_token: str,
+        caption: str,
+        items: List[Dict]
+    ) -> Dict:
+        """
+        Create a carousel container
+        
+        Args:
+            items: 2 to 10 {"image_url": ...} or {"video_url": ...}
+        
+        The child containers are created in parallel, then the parent.
+        """
+        children = await asyncio.gather(*[
+            self.create_media_container(
+                ig_user_id,
+                access_token,
+                image_url=item.get("image_url"),
+                video_url=item.get("video_url"),
+                media_type="VIDEO" if item.get("video_url") else "IMAGE",
+                is_carousel_item=True
+            )
+            for item in items
+        ])
+        
+        for child in children:
+            if "error" in child:
+                return child
+        
+        return await self.create_media_container(
+            ig_user_id,
+            access_token,
+            caption=caption,
+            media_type="CAROUSEL",
+            children=[child["id"] for child in children]
+        )
+    
+    async def get_container_status(self, container_id: str, access_token: str, ig_user_id: Optional[str] = None) -> Dict:
         """
-        Publish content to Instagram
+        Get a media container's processing status
         
-        For images/videos, we need to:
-        1. Create a media container
-        2. Publish the container
+        status_code is IN_PROGRESS, FINISHED, ERROR, EXPIRED or PUBLISHED.
         """
-        async with httpx.AsyncClient() as client:
-            # Step 1: Create media container
-            container_params = {
-                "access_token": access_token,
-                "caption": caption
+        return await self._request(
+            "GET",
+            container_id,
+            account_id=ig_user_id,
+            params={
+                "fields": "status_code,status",
+                "access_token": access_token
             }
+        )
+    
+    async def wait_for_container(
+        self,
+        container_id: str,
+        access_token: str,
+        timeout: float,
+        ig_user_id: Optional[str] = None
+    ) -> Dict:
+        """
+        Poll a container's status with exponential backoff until it is done
+        processing or `timeout` seconds passed
+        
+        Returns the last status (still IN_PROGRESS on timeout) or an error.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        delay = settings.instagram_container_poll_initial_seconds
+        while True:
+            status = await self.get_container_status(container_id, access_token, ig_user_id)
+            if "error" in status or status.get("status_code") != "IN_PROGRESS":
+                return status
             
-            if media_type == "IMAGE" and image_url:
-                container_params["image_url"] = image_url
-            elif media_type == "VIDEO" and video_url:
-                container_params["video_url"] = video_url
-                container_params["media_type"] = "VIDEO"
-            elif media_type == "REELS" and video_url:
-                container_params["video_url"] = video_url
-                container_params["media_type"] = "REELS"
-            
-            response = await client.post(
-                f"{self.BASE_URL}/{ig_user_id}/media",
-                data=container_params
-            )
-            container_data = response.json()
-            
-            if "error" in container_data:
-                return container_data
-            
-            container_id = container_data.get("id")
-            
-            # Step 2: Publish the container
-            response = await client.post(
-                f"{self.BASE_URL}/{ig_user_id}/media_publish",
-                data={
-                    "creation_id": container_id,
-                    "access_token": access_token
-                }
-            )
-            return response.json()
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return status
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, settings.instagram_container_poll_max_seconds)
+    
+    async def publish_container(self, ig_user_id: str, container_id: str, access_token: str) -> Dict:
+        """Publish a finished media container ({"id": media id})"""
+        return await self._request(
+            "POST",
+            f"{ig_user_id}/media_publish",
+            priority=Priority.HIGH,
+            data={
+                "creation_id": container_id,
+                "access_token": access_token
+            }
+        )
     
     async def publish_to_facebook(
         self,
@@ -180,23 +456,21 @@ class MetaService:
         photo_url: Optional[str] = None
     ) -> Dict:
         """Publish a post to Facebook Page"""
-        async with httpx.AsyncClient() as client:
-            data = {
-                "message": message,
-                "access_token": page_token
-            }
-            
-            if link:
-                data["link"] = link
-            
-            endpoint = f"{self.BASE_URL}/{page_id}/feed"
-            
-            if photo_url:
-                endpoint = f"{self.BASE_URL}/{page_id}/photos"
-                data["url"] = photo_url
-            
-            response = await client.post(endpoint, data=data)
-            return response.json()
+        data = {
+            "message": message,
+            "access_token": page_token
+        }
+        
+        if link:
+            data["link"] = link
+        
+        endpoint = f"{page_id}/feed"
+        
+        if photo_url:
+            endpoint = f"{page_id}/photos"
+            data["url"] = photo_url
+        
+        return await self._request("POST", endpoint, priority=Priority.HIGH, data=data)
     
     # ============== Analytics ==============
     
@@ -205,62 +479,190 @@ class MetaService:
         ig_user_id: str,
         access_token: str,
         metrics: List[str] = None,
-        period: str = "day"
+        period: str = "day",
+        priority: Priority = Priority.LOW
     ) -> Dict:
         """Get Instagram account insights"""
         if metrics is None:
             metrics = ["impressions", "reach", "profile_views", "follower_count"]
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.BASE_URL}/{ig_user_id}/insights",
-                params={
-                    "metric": ",".join(metrics),
-                    "period": period,
-                    "access_token": access_token
-                }
-            )
-            return response.json()
+        return await self._request(
+            "GET",
+            f"{ig_user_id}/insights",
+            priority=priority,
+            params={
+                "metric": ",".join(metrics),
+                "period": period,
+                "access_token": access_token
+            }
+        )
     
     async def get_post_insights(
         self,
         media_id: str,
-        access_token: str
+        access_token: str,
+        priority: Priority = Priority.LOW,
+        account_id: Optional[str] = None
     ) -> Dict:
-        """Get insights for a specific Instagram post"""
-        metrics = ["impressions", "reach", "engagement", "saved", "likes", "comments", "shares"]
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.BASE_URL}/{media_id}/insights",
-                params={
-                    "metric": ",".join(metrics),
-                    "access_token": access_token
-                }
-            )
-            return response.json()
+        """Get insights for a specific Instagram post (account_id: the account owning it)"""
+        return await self._request(
+            "GET",
+            f"{media_id}/insights",
+            priority=priority,
+            account_id=account_id,
+            params={
+                "metric": ",".join(self.POST_INSIGHT_METRICS),
+                "access_token": access_token
+            }
+        )
     
     async def get_page_insights(
         self,
         page_id: str,
         page_token: str,
         metrics: List[str] = None,
-        period: str = "day"
+        period: str = "day",
+        priority: Priority = Priority.LOW
     ) -> Dict:
         """Get Facebook Page insights"""
         if metrics is None:
             metrics = ["page_impressions", "page_engaged_users", "page_fans"]
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{self.BASE_URL}/{page_id}/insights",
-                params={
-                    "metric": ",".join(metrics),
-                    "period": period,
-                    "access_token": page_token
-                }
-            )
-            return response.json()
+        return await self._request(
+            "GET",
+            f"{page_id}/insights",
+            priority=priority,
+            params={
+                "metric": ",".join(metrics),
+                "period": period,
+                "access_token": page_token
+            }
+        )
+
+    def iter_media(
+        self,
+        ig_user_id: str,
+        access_token: str,
+        fields: str = "id,caption,media_type,media_url,permalink,timestamp",
+        priority: Priority = Priority.LOW
+    ) -> AsyncIterator[Dict]:
+        """Stream an Instagram account's media, newest first"""
+        return self.paginate(
+            f"{ig_user_id}/media",
+            params={"fields": fields, "access_token": access_token},
+            priority=priority
+        )
+    
+    def iter_ad_insights(
+        self,
+        ad_account_id: str,
+        access_token: str,
+        fields: str = "ad_id,ad_name,impressions,reach,clicks,spend,cpc,cpm,actions",
+        level: str = "ad",
+        date_preset: str = "last_30d",
+        priority: Priority = Priority.LOW
+    ) -> AsyncIterator[Dict]:
+        """Stream an ad account's insights rows (one per ad by default)"""
+        if not ad_account_id.startswith("act_"):
+            ad_account_id = f"act_{ad_account_id}"
+        return self.paginate(
+            f"{ad_account_id}/insights",
+            params={
+                "fields": fields,
+                "level": level,
+                "date_preset": date_preset,
+                "access_token": access_token
+            },
+            priority=priority
+        )
+    
+    async def get_posts_insights(
+        self,
+        media_ids: List[str],
+        access_token: str,
+        priority: Priority = Priority.LOW,
+        account_id: Optional[str] = None
+    ) -> Dict[str, Dict]:
+        """
+        Get insights for many Instagram posts (of account_id) through batch calls
+        
+        Returns:
+            {media_id: insights response}, where a failed item holds
+            {"error": {...}} like a single get_post_insights call would
+        """
+        metric = ",".join(self.POST_INSIGHT_METRICS)
+        results = await self.batch(
+            [{"method": "GET", "relative_url": f"{media_id}/insights?metric={metric}"} for media_id in media_ids],
+            access_token,
+            priority=priority,
+            account_id=account_id
+        )
+        return dict(zip(media_ids, results))
+    
+    # ============== Batch ==============
+    
+    async def batch(
+        self,
+        requests: List[Dict],
+        access_token: str,
+        concurrency: int = 4,
+        priority: Priority = Priority.NORMAL,
+        account_id: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Run Graph API requests through batch calls of up to 50 sub-requests
+        
+        Args:
+            requests: [{"method": "GET", "relative_url": "{id}/insights?..."}]
+            concurrency: Max batch calls in flight at once
+            priority: Rate limiter priority; each sub-request counts as one call
+            account_id: Page / Instagram account the sub-requests act on
+        
+        Returns:
+            One parsed response body per request, in order. Failed items
+            (including ones Meta timed out on) hold {"error": {...}}.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        chunks = [requests[i:i + self.BATCH_LIMIT] for i in range(0, len(requests), self.BATCH_LIMIT)]
+        
+        async def run_chunk(chunk: List[Dict]) -> List[Dict]:
+            async with semaphore:
+                try:
+                    data = await self._request(
+                        "POST",
+                        "",
+                        priority=priority,
+                        cost=len(chunk),
+                        account_id=account_id,
+                        data={
+                            "access_token": access_token,
+                            "batch": json.dumps(chunk),
+                            "include_headers": "false"
+                        }
+                    )
+                except (httpx.HTTPError, ValueError) as e:
+                    data = {"error": {"message": str(e)}}
+            
+            # The whole call failed (bad token, throttled...): every item gets its error
+            if isinstance(data, dict):
+                error = data.get("error") or {"message": "Unexpected batch response"}
+                return [{"error": error} for _ in chunk]
+            
+            return [self._parse_batch_item(item) for item in data]
+        
+        results = await asyncio.gather(*[run_chunk(chunk) for chunk in chunks])
+        return [item for chunk_results in results for item in chunk_results]
+    
+    def _parse_batch_item(self, item: Optional[Dict]) -> Dict:
+        if item is None:
+            return {"error": {"message": "Request timed out in batch"}}
+        try:
+            body = json.loads(item.get("body") or "{}")
+        except ValueError:
+            body = {}
+        if item.get("code", 500) >= 400 and "error" not in body:
+            body = {"error": {"message": f"HTTP {item.get('code')}", "code": item.get("code")}}
+        return body
 
 # Singleton instance
 meta_service = MetaService()
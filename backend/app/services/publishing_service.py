@@ -0,0 +1,497 @@
+"""
+Publishing Service - publish Content to Meta, now or when it is due
+"""
+import asyncio
+import logging
+import os
+import secrets
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Union
+
+import httpx
+from sqlalchemy import and_, exists, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased
+
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal, run_sync
+from app.db.models import Content, ContentAnalytics, MetaAccount
+from app.services.meta_rate_limiter import THROTTLE_ERROR_CODES
+from app.services.meta_service import meta_service
+
+logger = logging.getLogger(__name__)
+
+# Graph error codes worth retrying: unknown / service errors, throttling
+TRANSIENT_ERROR_CODES = {1, 2} | THROTTLE_ERROR_CODES
+
+
+class PublishError(Exception):
+    """Content could not be published; `transient` errors are worth retrying"""
+
+    def __init__(self, message: str, transient: bool = False):
+        super().__init__(message)
+        self.transient = transient
+
+
+class PublishInProgressError(PublishError):
+    """Someone else holds the content's publishing lease"""
+
+
+class ContainerProcessingError(PublishError):
+    """Instagram is still processing the media; publish again after `retry_after` seconds to resume"""
+
+    def __init__(self, container_id: str, retry_after: float):
+        super().__init__(f"Instagram is still processing media container {container_id}", transient=True)
+        self.container_id = container_id
+        self.retry_after = retry_after
+
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".m4v")
+
+
+def new_lease_owner() -> str:
+    return f"{os.getpid()}:{secrets.token_hex(6)}"
+
+
+def build_caption(content: Content) -> str:
+    """Caption with hashtags appended"""
+    full_caption = content.caption or ""
+    if content.hashtags:
+        full_caption += "\n\n" + " ".join([f"#{h}" for h in content.hashtags])
+    return full_caption
+
+
+def _is_video(url: str) -> bool:
+    return url.lower().split("?")[0].endswith(VIDEO_EXTENSIONS)
+
+
+async def _create_container(content: Content, account: MetaAccount) -> Dict:
+    media_urls = content.media_urls or []
+    if content.content_type == "carousel":
+        if not 2 <= len(media_urls) <= 10:
+            raise PublishError("A carousel needs 2 to 10 media")
+        return await meta_service.create_carousel_container(
+            ig_user_id=account.instagram_account_id,
+            access_token=account.access_token,
+            caption=build_caption(content),
+            items=[{"video_url": url} if _is_video(url) else {"image_url": url} for url in media_urls]
+        )
+
+    media_url = media_urls[0] if media_urls else None
+    if content.content_type == "reel":
+        media_type = "REELS"
+    elif content.content_type == "story":
+        media_type = "STORIES"
+    elif content.content_type == "video" or (media_url and _is_video(media_url)):
+        media_type = "VIDEO"
+    else:
+        media_type = "IMAGE"
+    is_video = media_type in ["REELS", "VIDEO"] or (media_type == "STORIES" and media_url and _is_video(media_url))
+
+    return await meta_service.create_media_container(
+        ig_user_id=account.instagram_account_id,
+        access_token=account.access_token,
+        caption=build_caption(content) if media_type != "STORIES" else None,
+        image_url=None if is_video else media_url,
+        video_url=media_url if is_video else None,
+        media_type=media_type
+    )
+
+
+async def publish_container_when_ready(account: MetaAccount, container_id: str, created_at: datetime) -> Dict:
+    """
+    Publish an Instagram media container once Instagram processed it
+
+    Waits up to instagram_container_inline_wait_seconds, then hands back
+    to the caller, who calls again later (a job, the scheduler).
+
+    Returns:
+        The Graph response ({"id": media id}) or error
+
+    Raises:
+        ContainerProcessingError: still processing after the inline wait
+        PublishError: the container failed, expired or took too long; create a new one
+    """
+    status = await meta_service.wait_for_container(
+        container_id,
+        account.access_token,
+        settings.instagram_container_inline_wait_seconds,
+        ig_user_id=account.instagram_account_id
+    )
+    if "error" in status:
+        return status
+
+    status_code = status.get("status_code")
+    if status_code == "PUBLISHED":
+        # An earlier attempt published it but its response was lost
+        logger.warning("Container %s was already published", container_id)
+        return {"id": None}
+
+    if status_code in ["ERROR", "EXPIRED"]:
+        # An expired container is simply created again on the next attempt
+        raise PublishError(
+            f"Instagram could not process the media: {status.get('status') or status_code}",
+            transient=status_code == "EXPIRED"
+        )
+
+    if status_code == "FINISHED":
+        result = await meta_service.publish_container(account.instagram_account_id, container_id, account.access_token)
+        # 9007: media not ready to publish yet
+        if result.get("error", {}).get("code") != 9007:
+            return result
+
+    age = (datetime.utcnow() - created_at).total_seconds()
+    if age > settings.instagram_container_timeout_seconds:
+        raise PublishError("Instagram took too long to process the media")
+
+    # Check again after as long as it has been processing so far: exponential backoff
+    raise ContainerProcessingError(
+        container_id,
+        retry_after=min(
+            max(age, settings.instagram_container_poll_initial_seconds),
+            settings.instagram_container_poll_max_seconds
+        )
+    )
+
+
+async def _publish_instagram(content: Content, account: MetaAccount) -> Dict:
+    """
+    Create (or reuse) the content's media container, then publish it once processed
+
+    The container id is kept on the content (the caller commits), so a
+    publish interrupted while Instagram processes a video resumes with the
+    same container instead of uploading the media again.
+
+    Raises:
+        ContainerProcessingError: still processing after the inline wait
+    """
+    if not content.meta_container_id:
+        container = await _create_container(content, account)
+        if "error" in container:
+            return container
+        content.meta_container_id = container["id"]
+        content.meta_container_created_at = datetime.utcnow()
+
+    try:
+        return await publish_container_when_ready(account, content.meta_container_id, content.meta_container_created_at)
+    except ContainerProcessingError:
+        raise
+    except PublishError:
+        content.meta_container_id = None
+        content.meta_container_created_at = None
+        raise
+
+
+async def publish(content: Content, account: MetaAccount) -> Dict:
+    """
+    Publish a content to its platform through MetaService
+
+    Returns:
+        The Graph response ({"id": post id})
+
+    Raises:
+        PublishError (ContainerProcessingError while Instagram processes a video)
+    """
+    media_url = content.media_urls[0] if content.media_urls else None
+
+    try:
+        if content.platform == "instagram":
+            if not account.instagram_account_id:
+                raise PublishError("No Instagram account connected")
+
+            result = await _publish_instagram(content, account)
+
+        elif content.platform == "facebook":
+            if not account.facebook_page_id:
+                raise PublishError("No Facebook page connected")
+
+            result = await meta_service.publish_to_facebook(
+                page_id=account.facebook_page_id,
+                page_token=account.access_token,
+                message=build_caption(content),
+                link=content.link_url,
+                photo_url=media_url
+            )
+
+        else:
+            raise PublishError("Invalid platform")
+    except httpx.HTTPError as e:
+        raise PublishError(f"Meta API unreachable: {e}", transient=True)
+
+    if "error" in result:
+        error = result["error"]
+        raise PublishError(
+            error.get("message", "Unknown error"),
+            transient=error.get("code") in TRANSIENT_ERROR_CODES or bool(error.get("is_transient"))
+        )
+
+    return result
+
+
+def mark_published(db: Session, content: Content, result: Dict):
+    """Record a successful publication (caller commits)"""
+    content.status = "published"
+    content.published_at = datetime.utcnow()
+    content.meta_post_id = result.get("id")
+    content.meta_container_id = None
+    content.meta_container_created_at = None
+    content.lease_owner = None
+    content.lease_expires_at = None
+    content.last_error = None
+
+    if not db.query(ContentAnalytics).filter(ContentAnalytics.content_id == content.id).first():
+        db.add(ContentAnalytics(content_id=content.id))
+
+
+def claim(db: Session, owner: str, content_ids: Optional[List[int]] = None, limit: int = 100) -> List[int]:
+    """
+    Atomically move contents to "publishing" and lease them to `owner`
+
+    Without content_ids, claims due scheduled contents whose user has no
+    other content currently publishing, so each account publishes in order.
+    With content_ids (publish now), claims those unless already published.
+    Leased rows (or rows waiting for a retry) are skipped either way; a
+    "publishing" row whose lease expired (its worker died) is claimable again.
+    Safe to run from several workers at once: the conditional UPDATE only
+    succeeds for one of them, so a content is never sent to Meta twice
+    at the same time.
+
+    Returns the ids of the claimed contents.
+    """
+    now = datetime.utcnow()
+    not_leased = or_(Content.lease_expires_at.is_(None), Content.lease_expires_at < now)
+
+    if content_ids is None:
+        other = aliased(Content)
+        claimable = and_(
+            Content.status.in_(["scheduled", "publishing"]),
+            not_leased,
+            ~exists().where(
+                other.user_id == Content.user_id,
+                other.id != Content.id,
+                other.status == "publishing",
+                other.lease_expires_at >= now
+            )
+        )
+        candidates = db.query(Content.id).filter(
+            claimable,
+            Content.scheduled_for <= now
+        ).order_by(Content.scheduled_for, Content.id).limit(limit)
+    else:
+        claimable = and_(Content.status != "published", not_leased)
+        candidates = db.query(Content.id).filter(Content.id.in_(content_ids))
+
+    db.query(Content).filter(
+        Content.id.in_(candidates.scalar_subquery()),
+        claimable
+    ).update({
+        Content.status: "publishing",
+        Content.lease_owner: owner,
+        Content.lease_expires_at: now + timedelta(seconds=settings.publish_lease_seconds)
+    }, synchronize_session=False)
+    db.commit()
+
+    return [
+        content_id for content_id, in db.query(Content.id).filter(
+            Content.lease_owner == owner
+        ).order_by(Content.scheduled_for, Content.id)
+    ]
+
+
+def active_account(db: Session, user_id: int) -> Optional[MetaAccount]:
+    return db.query(MetaAccount).filter(
+        MetaAccount.user_id == user_id,
+        MetaAccount.is_active == True
+    ).first()
+
+
+async def publish_now(db: Union[Session, AsyncSession], content: Content, retrying: bool = False) -> Dict:
+    """
+    Publish a content right away (manual publish, publish job)
+
+    Moves the content to "publishing" first so the scheduler or a
+    concurrent request can't publish it too. On failure the content is
+    marked failed, unless `retrying` and the error is transient (it goes
+    back to its previous status and the caller retries).
+
+    Works with the API's AsyncSession as well as the workers' Session.
+
+    Raises:
+        PublishInProgressError, ContainerProcessingError, PublishError
+    """
+    account = await run_sync(db, active_account, content.user_id)
+    if not account:
+        raise PublishError("No active Meta account")
+
+    previous_status = content.status
+    if previous_status == "publishing":
+        # Left behind by a publish that died; claim() only succeeds once its lease expired
+        previous_status = "scheduled" if content.scheduled_for else "draft"
+
+    if not await run_sync(db, claim, new_lease_owner(), content_ids=[content.id]):
+        raise PublishInProgressError("Content is already being published")
+    await run_sync(db, Session.refresh, content)
+
+    try:
+        result = await publish(content, account)
+    except ContainerProcessingError as e:
+        # Stays "publishing"; claimable again (to resume) once retry_after passed
+        content.lease_owner = None
+        content.lease_expires_at = datetime.utcnow() + timedelta(seconds=e.retry_after)
+        await run_sync(db, Session.commit)
+        raise
+    except PublishError as e:
+        content.last_error = str(e)
+        content.lease_owner = None
+        content.lease_expires_at = None
+        content.status = previous_status if retrying and e.transient else "failed"
+        await run_sync(db, Session.commit)
+        raise
+
+    await run_sync(db, mark_published, content, result)
+    await run_sync(db, Session.commit)
+    return result
+
+
+async def wait_for_publish(db: Union[Session, AsyncSession], content: Content, timeout: float) -> Content:
+    """Wait until a publish in progress elsewhere finished (or `timeout` passed)"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    await run_sync(db, Session.refresh, content)
+    while content.status == "publishing" and loop.time() < deadline:
+        await asyncio.sleep(0.5)
+        await run_sync(db, Session.refresh, content)
+    return content
+
+
+def release(db: Session, content: Content, error: PublishError):
+    """Give a lease back after a failure: retry later with backoff, or mark the content failed"""
+    if isinstance(error, ContainerProcessingError):
+        # Not a failure: resume once Instagram had time to process; the
+        # content stays "publishing" so this account's next ones wait
+        content.lease_owner = None
+        content.lease_expires_at = datetime.utcnow() + timedelta(seconds=error.retry_after)
+        return
+
+    content.publish_attempts = (content.publish_attempts or 0) + 1
+    content.last_error = str(error)
+    content.lease_owner = None
+
+    if error.transient and content.publish_attempts < settings.publish_max_attempts:
+        content.status = "scheduled"
+        backoff = min(
+            settings.publish_retry_base_seconds * 2 ** (content.publish_attempts - 1),
+            settings.publish_retry_max_seconds
+        )
+        # Not claimable again before the backoff ends
+        content.lease_expires_at = datetime.utcnow() + timedelta(seconds=backoff)
+    else:
+        content.status = "failed"
+        content.lease_expires_at = None
+
+
+class PublishingScheduler:
+    """
+    Publishes scheduled contents once their scheduled_for is due.
+
+    Each cycle claims due contents in batches (leases in the DB, so any
+    number of workers can run it) and publishes them with bounded
+    concurrency across accounts, one at a time and in order per account.
+    It keeps claiming until nothing is due, so a burst scheduled for the
+    same slot is drained at full speed.
+    """
+
+    def __init__(self, poll_interval: float, batch_size: int, concurrency: int):
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self._task: Optional[asyncio.Task] = None
+        self.published = 0
+        self.failed = 0
+
+    async def _publish_account(self, owner: str, content_ids: List[int]):
+        """Publish one account's claimed contents in order"""
+        async with AsyncSessionLocal() as db:
+            for content_id in content_ids:
+                content = await db.scalar(select(Content).where(
+                    Content.id == content_id,
+                    Content.lease_owner == owner
+                ))
+                if not content:
+                    continue
+
+                account = await db.run_sync(active_account, content.user_id)
+
+                # Keep the lease alive while this account's earlier contents were publishing
+                content.lease_expires_at = datetime.utcnow() + timedelta(seconds=settings.publish_lease_seconds)
+                await db.commit()
+
+                try:
+                    if not account:
+                        raise PublishError("No active Meta account")
+                    result = await publish(content, account)
+                except PublishError as e:
+                    release(db, content, e)
+                    await db.commit()
+                    if content.status == "failed":
+                        self.failed += 1
+                        logger.warning("Scheduled content %s failed: %s", content.id, e)
+                    continue
+
+                await db.run_sync(mark_published, content, result)
+                await db.commit()
+                self.published += 1
+
+    async def run_once(self) -> int:
+        """Publish everything currently due; returns how many contents were claimed"""
+        total = 0
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def publish_account(owner: str, content_ids: List[int]):
+            async with semaphore:
+                await self._publish_account(owner, content_ids)
+
+        while True:
+            owner = new_lease_owner()
+            async with AsyncSessionLocal() as db:
+                content_ids = await db.run_sync(claim, owner, limit=self.batch_size)
+                by_user: Dict[int, List[int]] = {}
+                for content_id, user_id in await db.execute(select(Content.id, Content.user_id).where(
+                    Content.id.in_(content_ids)
+                ).order_by(Content.scheduled_for, Content.id)):
+                    by_user.setdefault(user_id, []).append(content_id)
+
+            if not content_ids:
+                return total
+            total += len(content_ids)
+
+            await asyncio.gather(*[publish_account(owner, ids) for ids in by_user.values()])
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Publishing cycle failed")
+            await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Singleton instance
+publishing_scheduler = PublishingScheduler(
+    poll_interval=settings.publish_poll_seconds,
+    batch_size=settings.publish_batch_size,
+    concurrency=settings.publish_concurrency
+)
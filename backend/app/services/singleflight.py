@@ -0,0 +1,58 @@
+"""
+Single-flight - share one in-flight call between concurrent identical requests
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key onto one task.
+
+    The first caller starts the call; later callers with the same key
+    await the same task until it completes. A caller that gets cancelled
+    (e.g. its HTTP client disconnected) only stops waiting. The shared
+    call is cancelled once nobody is waiting on it anymore.
+    """
+
+    def __init__(self):
+        self._flights: Dict[str, _Flight] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[T]]) -> T:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _, key=key, flight=flight: self._forget(key, flight))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    def _forget(self, key: str, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def stats(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._flights)
+        }
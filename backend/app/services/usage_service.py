@@ -0,0 +1,121 @@
+"""
+Usage Service - record token usage and latency of every Claude call
+"""
+import asyncio
+import logging
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from fastapi import Request
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.db.models import LLMUsage
+
+logger = logging.getLogger(__name__)
+
+# Route that triggered the current call, e.g. "chat.send_message" ("job.<type>" in job handlers)
+current_route: ContextVar[Optional[str]] = ContextVar("current_route", default=None)
+
+
+async def tag_llm_route(request: Request):
+    """
+    Router dependency tagging LLM calls with the calling route
+
+    Background tasks started by the request inherit the tag.
+    """
+    endpoint = request.scope.get("endpoint")
+    if endpoint is not None:
+        module = endpoint.__module__.rsplit(".", 1)[-1]
+        current_route.set(f"{module}.{endpoint.__name__}")
+
+
+class UsageRecorder:
+    """
+    Buffers usage rows in memory and bulk-inserts them periodically,
+    so recording never adds a DB round trip to an LLM call.
+    """
+
+    def __init__(self, flush_interval: float, max_buffer: int):
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer: List[Dict] = []
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def record(
+        self,
+        method: str,
+        model: str,
+        status: str,
+        usage=None,
+        user_id: Optional[int] = None,
+        queue_wait: Optional[float] = None,
+        time_to_first_token: Optional[float] = None,
+        latency: Optional[float] = None
+    ):
+        """Queue one usage row (timings in seconds)"""
+        def ms(seconds: Optional[float]) -> Optional[int]:
+            return int(seconds * 1000) if seconds is not None else None
+
+        self._buffer.append({
+            "user_id": user_id,
+            "route": current_route.get(),
+            "method": method,
+            "model": model,
+            "status": status,
+            "input_tokens": getattr(usage, "input_tokens", None) or 0,
+            "output_tokens": getattr(usage, "output_tokens", None) or 0,
+            "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", None) or 0,
+            "cache_creation_input_tokens": getattr(usage, "cache_creation_input_tokens", None) or 0,
+            "queue_wait_ms": ms(queue_wait),
+            "time_to_first_token_ms": ms(time_to_first_token),
+            "latency_ms": ms(latency),
+            "created_at": datetime.utcnow()
+        })
+        if len(self._buffer) >= self.max_buffer:
+            # Flush now rather than at the next interval
+            self._full.set()
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        rows, self._buffer = self._buffer, []
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(LLMUsage), rows)
+                await db.commit()
+        except Exception:
+            logger.exception("Could not write %d LLM usage rows", len(rows))
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+# Singleton instance
+usage_recorder = UsageRecorder(
+    flush_interval=settings.llm_usage_flush_seconds,
+    max_buffer=settings.llm_usage_max_buffer
+)
@@ -0,0 +1,211 @@
+"""
+Webhook Service - apply Meta change notifications to content analytics
+"""
+import asyncio
+import hashlib
+import hmac
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import case
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.db.models import Content, ContentAnalytics
+
+logger = logging.getLogger(__name__)
+
+# Page feed item -> ContentAnalytics counter
+FEED_ITEM_FIELDS = {
+    "comment": "comments",
+    "reaction": "likes",
+    "like": "likes",
+    "share": "shares"
+}
+
+FEED_VERB_DELTAS = {"add": 1, "remove": -1}
+
+# Instagram story insights -> ContentAnalytics column
+STORY_INSIGHT_FIELDS = {
+    "impressions": "impressions",
+    "reach": "reach",
+    "replies": "comments"
+}
+
+
+def verify_signature(body: bytes, signature: Optional[str]) -> bool:
+    """Check an X-Hub-Signature-256 header ("sha256=<hex>") against the app secret"""
+    if not signature or not signature.startswith("sha256=") or not settings.meta_app_secret:
+        return False
+    expected = hmac.new(settings.meta_app_secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature[len("sha256="):])
+
+
+class WebhookProcessor:
+    """
+    Queue of Meta change notifications, applied to ContentAnalytics in batches.
+
+    The webhook endpoint only enqueues, so Meta gets its 200 right away.
+    Counters (comments, likes, shares) are adjusted with atomic
+    "column = column + delta" updates; story insights carry full values
+    and overwrite the row.
+    """
+
+    def __init__(self, max_queue: int, batch_size: int = 200):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+        self.received = 0
+        self.applied = 0
+        self.ignored = 0
+        self.dropped = 0
+
+    def enqueue(self, payload: Dict) -> int:
+        """Queue every change of a webhook payload; returns how many were queued"""
+        queued = 0
+        for entry in payload.get("entry", []):
+            for change in entry.get("changes", []):
+                notification = {
+                    "object": payload.get("object"),
+                    "entry_id": entry.get("id"),
+                    "field": change.get("field"),
+                    "value": change.get("value") or {}
+                }
+                try:
+                    self.queue.put_nowait(notification)
+                    queued += 1
+                except asyncio.QueueFull:
+                    # Polling picks these posts up later
+                    self.dropped += 1
+        self.received += queued
+        return queued
+
+    def _parse(self, notification: Dict, deltas: Dict, snapshots: Dict):
+        field, value = notification["field"], notification["value"]
+
+        if field == "feed":
+            column = FEED_ITEM_FIELDS.get(value.get("item"))
+            delta = FEED_VERB_DELTAS.get(value.get("verb"), 0)
+            post_id = value.get("post_id")
+            if column and delta and post_id:
+                deltas[post_id][column] += delta
+                deltas[post_id]["engagement"] += delta
+                return True
+
+        elif field in ("comments", "live_comments"):
+            media_id = (value.get("media") or {}).get("id")
+            if media_id:
+                deltas[media_id]["comments"] += 1
+                deltas[media_id]["engagement"] += 1
+                return True
+
+        elif field == "story_insights":
+            media_id = value.get("media_id")
+            values = {
+                column: value[metric]
+                for metric, column in STORY_INSIGHT_FIELDS.items()
+                if isinstance(value.get(metric), int)
+            }
+            if media_id and values:
+                snapshots[media_id].update(values)
+                return True
+
+        # mentions and anything else don't map to one of our contents
+        return False
+
+    async def apply(self, notifications: List[Dict]):
+        """Apply a batch of notifications in one transaction"""
+        deltas: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        snapshots: Dict[str, Dict[str, int]] = defaultdict(dict)
+        for notification in notifications:
+            if self._parse(notification, deltas, snapshots):
+                self.applied += 1
+            else:
+                self.ignored += 1
+
+        post_ids = set(deltas) | set(snapshots)
+        if not post_ids:
+            return
+
+        async with AsyncSessionLocal() as db:
+            await db.run_sync(self._store, post_ids, deltas, snapshots)
+
+    def _store(self, db: Session, post_ids: Set[str], deltas: Dict[str, Dict[str, int]], snapshots: Dict[str, Dict[str, int]]):
+        """Write the merged deltas and snapshots to ContentAnalytics"""
+        contents = db.query(Content.id, Content.meta_post_id).filter(
+            Content.meta_post_id.in_(post_ids)
+        ).all()
+        existing = {
+            a.content_id: a
+            for a in db.query(ContentAnalytics).filter(
+                ContentAnalytics.content_id.in_([content_id for content_id, _ in contents])
+            )
+        }
+
+        now = datetime.utcnow()
+        for content_id, post_id in contents:
+            analytics = existing.get(content_id)
+            counters = {column: delta for column, delta in deltas.get(post_id, {}).items() if delta}
+
+            if analytics is None:
+                analytics = ContentAnalytics(
+                    content_id=content_id,
+                    **{column: max(delta, 0) for column, delta in counters.items()}
+                )
+                db.add(analytics)
+            elif counters:
+                db.query(ContentAnalytics).filter(
+                    ContentAnalytics.id == analytics.id
+                ).update({
+                    getattr(ContentAnalytics, column): case(
+                        (getattr(ContentAnalytics, column) + delta < 0, 0),
+                        else_=getattr(ContentAnalytics, column) + delta
+                    )
+                    for column, delta in counters.items()
+                }, synchronize_session=False)
+
+            if post_id in snapshots:
+                for column, value in snapshots[post_id].items():
+                    setattr(analytics, column, value)
+                analytics.last_updated = now
+
+        db.commit()
+
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            try:
+                await self.apply(batch)
+            except Exception:
+                logger.exception("Could not apply %d webhook notifications", len(batch))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            "received": self.received,
+            "applied": self.applied,
+            "ignored": self.ignored,
+            "dropped": self.dropped,
+            "queued": self.queue.qsize()
+        }
+
+
+# Singleton instance
+webhook_processor = WebhookProcessor(max_queue=settings.meta_webhook_queue_size)
@@ -1,25 +1,54 @@
 """
 Marko Backend - AI CMO API
 """
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from app.api import auth, chat, meta, content, campaigns, analytics
-from app.db.database import engine, Base
+from app.api import auth, chat, meta, content, campaigns, analytics, admin, webhooks, jobs
+from app.db.database import engine, async_engine, Base, SessionLocal
+from app.db.migrations import run_migrations
 from app.core.config import settings
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.services.concurrency import ClientDisconnectedError, QueueTimeoutError
+from app.services.usage_service import tag_llm_route, usage_recorder
+from app.services.meta_service import meta_service
+from app.services.analytics_service import analytics_sync
+from app.services.webhook_service import webhook_processor
+from app.services.publishing_service import publishing_scheduler
+from app.services.job_queue import job_worker
+import app.services.job_handlers  # noqa: F401 - registers the job handlers
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    usage_recorder.start()
+    await meta_service.startup()
+    if settings.analytics_sync_enabled:
+        # Starts the chain of sync jobs, if no cycle is queued yet
+        with SessionLocal() as db:
+            analytics_sync.schedule(db)
+    if settings.meta_webhooks_enabled:
+        webhook_processor.start()
+    if settings.publish_scheduler_enabled:
+        publishing_scheduler.start()
+    if settings.job_worker_embedded:
+        job_worker.start()
     yield
     # Shutdown
-    pass
+    await job_worker.stop(timeout=10)
+    await publishing_scheduler.stop()
+    await webhook_processor.stop()
+    await meta_service.shutdown()
+    await usage_recorder.stop()
+    await async_engine.dispose()
 
 app = FastAPI(
     title="Marko API",
@@ -37,15 +66,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+@app.exception_handler(QueueTimeoutError)
+async def queue_timeout_handler(request: Request, exc: QueueTimeoutError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "AI service is busy, please retry shortly"},
+        headers={"Retry-After": "5"}
+    )
+
+@app.exception_handler(ClientDisconnectedError)
+async def client_disconnected_handler(request: Request, exc: ClientDisconnectedError):
+    # Nobody is listening anymore; 499 is the nginx convention for this
+    return JSONResponse(status_code=499, content={"detail": "Client disconnected"})
+
 # Routes
-app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
-app.include_router(chat.router, prefix="/api/chat", tags=["Chat"])
-app.include_router(meta.router, prefix="/api/meta", tags=["Meta Integration"])
-app.include_router(content.router, prefix="/api/content", tags=["Content"])
-app.include_router(campaigns.router, prefix="/api/campaigns", tags=["Campaigns"])
-app.include_router(analytics.router, prefix="/api/analytics", tags=["Analytics"])
+# Tag every LLM call with the route that triggered it
+route_tagging = [Depends(tag_llm_route)]
+app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"], dependencies=route_tagging)
+app.include_router(chat.router, prefix="/api/chat", tags=["Chat"], dependencies=route_tagging)
+app.include_router(meta.router, prefix="/api/meta", tags=["Meta Integration"], dependencies=route_tagging)
+app.include_router(content.router, prefix="/api/content", tags=["Content"], dependencies=route_tagging)
+app.include_router(campaigns.router, prefix="/api/campaigns", tags=["Campaigns"], dependencies=route_tagging)
+app.include_router(analytics.router, prefix="/api/analytics", tags=["Analytics"], dependencies=route_tagging)
+app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
+app.include_router(webhooks.router, prefix="/api/webhooks", tags=["Webhooks"])
+app.include_router(jobs.router, prefix="/api/jobs", tags=["Jobs"])
 
 @app.get("/")
 async def root():
@@ -0,0 +1,49 @@
+"""
+Marko Worker - runs background jobs (publishing, analytics refresh, AI)
+
+Usage:
+    python worker.py
+
+Run as many as needed next to the API: jobs are leased in the database,
+so workers never run the same job twice at once.
+"""
+import asyncio
+import logging
+import signal
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.db.database import engine, async_engine, Base
+from app.db.migrations import run_migrations
+from app.services.job_queue import job_worker
+from app.services.meta_service import meta_service
+from app.services.usage_service import usage_recorder
+import app.services.job_handlers  # noqa: F401 - registers the job handlers
+
+logger = logging.getLogger("marko.worker")
+
+async def main():
+    Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    usage_recorder.start()
+    await meta_service.startup()
+    
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    
+    job_worker.start()
+    logger.info("Worker %s started", job_worker.owner)
+    await stop.wait()
+    
+    logger.info("Stopping, waiting for running jobs")
+    await job_worker.stop(timeout=30)
+    await meta_service.shutdown()
+    await usage_recorder.stop()
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
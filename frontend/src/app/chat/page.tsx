@@ -24,6 +24,7 @@ export default function ChatPage() {
   const { t, locale, changeLocale } = useTranslation();
   const [user, setUser] = useState<{ name: string | null; email: string } | null>(null);
   const [conversations, setConversations] = useState<Conversation[]>([]);
+  const [conversationsCursor, setConversationsCursor] = useState<string | null>(null);
   const [currentConversationId, setCurrentConversationId] = useState<number | null>(null);
   const [messages, setMessages] = useState<Message[]>([]);
   const [inputValue, setInputValue] = useState('');
@@ -52,7 +53,8 @@ export default function ChatPage() {
           api.getMetaStatus(),
         ]);
         
-        setConversations(convos);
+        setConversations(convos.items);
+        setConversationsCursor(convos.nextCursor);
         setMetaStatus(meta);
       } catch {
         router.push('/login');
@@ -63,6 +65,23 @@ export default function ChatPage() {
     init();
   }, [router]);
 
+  const refreshConversations = async () => {
+    const page = await api.getConversations();
+    setConversations(page.items);
+    setConversationsCursor(page.nextCursor);
+  };
+
+  const loadMoreConversations = async () => {
+    if (!conversationsCursor) return;
+    try {
+      const page = await api.getConversations(conversationsCursor);
+      setConversations((prev) => [...prev, ...page.items]);
+      setConversationsCursor(page.nextCursor);
+    } catch (err) {
+      console.error('Error loading conversations:', err);
+    }
+  };
+
   const loadConversation = async (id: number) => {
     try {
       const convo = await api.getConversation(id);
@@ -89,19 +108,42 @@ export default function ChatPage() {
     };
     setMessages((prev) => [...prev, tempUserMessage]);
 
-    try {
-      const response = await api.sendMessage(messageText, currentConversationId || undefined);
-      
-      if (!currentConversationId) {
-        setCurrentConversationId(response.conversation_id);
-        const convos = await api.getConversations();
-        setConversations(convos);
-      }
+    const streamingId = tempUserMessage.id + 1;
+    let streamStarted = false;
 
-      setMessages((prev) => {
-        const filtered = prev.filter((m) => m.id !== tempUserMessage.id);
-        return [...filtered, response.message as Message, response.response as Message];
+    try {
+      const done = await api.sendMessageStream(messageText, currentConversationId || undefined, {
+        onStart: (data) => {
+          if (!currentConversationId) {
+            setCurrentConversationId(data.conversation_id);
+            refreshConversations().catch(() => {});
+          }
+          setMessages((prev) => [
+            ...prev.filter((m) => m.id !== tempUserMessage.id),
+            data.message as Message,
+          ]);
+        },
+        onToken: (text) => {
+          if (!streamStarted) {
+            streamStarted = true;
+            setMessages((prev) => [
+              ...prev,
+              { id: streamingId, role: 'assistant', content: text, created_at: new Date().toISOString() },
+            ]);
+            return;
+          }
+          setMessages((prev) =>
+            prev.map((m) => (m.id === streamingId ? { ...m, content: m.content + text } : m))
+          );
+        },
       });
+
+      if (done) {
+        setMessages((prev) => [
+          ...prev.filter((m) => m.id !== streamingId),
+          done.response as Message,
+        ]);
+      }
     } catch (err) {
       setMessages((prev) => prev.filter((m) => m.id !== tempUserMessage.id));
       console.error('Error sending message:', err);
@@ -180,6 +222,14 @@ export default function ChatPage() {
               </div>
             </button>
           ))}
+          {conversationsCursor && (
+            <button
+              onClick={loadMoreConversations}
+              className="w-full p-3 rounded-lg text-xs text-[var(--muted)] hover:bg-[var(--card-hover)] transition-all"
+            >
+              {t('chat.loadMore')}
+            </button>
+          )}
         </div>
 
         <div className="p-4 border-t border-[var(--border)]">
@@ -267,7 +317,7 @@ export default function ChatPage() {
                   />
                 </div>
               ))}
-              {isSending && (
+              {isSending && messages[messages.length - 1]?.role !== 'assistant' && (
                 <div className="flex justify-start">
                   <div className="message message-assistant">
                     <div className="typing-indicator">
@@ -20,7 +20,7 @@ export default function DashboardPage() {
           api.getMe(),
           api.getMetaStatus(),
           api.getAnalyticsOverview(30).catch(() => null),
-          api.listContent({ limit: 5 } as any).catch(() => []),
+          api.listContent({ limit: 5 }).then((page) => page.items).catch(() => []),
         ]);
         
         setUser(userData);
@@ -4,6 +4,20 @@
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
 
+export interface Page<T> {
+  items: T[];
+  nextCursor: string | null; // Pass as `cursor` to get the next page, null on the last one
+}
+
+function toQuery(params: Record<string, string | number | undefined> = {}): string {
+  const query = new URLSearchParams();
+  for (const [key, value] of Object.entries(params)) {
+    if (value !== undefined && value !== '') query.set(key, String(value));
+  }
+  const text = query.toString();
+  return text ? `?${text}` : '';
+}
+
 class ApiClient {
   private token: string | null = null;
 
@@ -24,10 +38,10 @@ class ApiClient {
     return this.token;
   }
 
-  private async request<T>(
+  private async send(
     endpoint: string,
     options: RequestInit = {}
-  ): Promise<T> {
+  ): Promise<Response> {
     const token = this.getToken();
     
     const headers: HeadersInit = {
@@ -49,9 +63,26 @@ class ApiClient {
       throw new Error(error.detail || 'An error occurred');
     }
 
+    return response;
+  }
+
+  private async request<T>(
+    endpoint: string,
+    options: RequestInit = {}
+  ): Promise<T> {
+    const response = await this.send(endpoint, options);
     return response.json();
   }
 
+  // List endpoints: one page, plus the cursor of the next one (X-Next-Cursor header)
+  private async requestPage<T>(endpoint: string): Promise<Page<T>> {
+    const response = await this.send(endpoint);
+    return {
+      items: await response.json(),
+      nextCursor: response.headers.get('X-Next-Cursor'),
+    };
+  }
+
   // Auth
   async register(email: string, password: string, name?: string, companyName?: string) {
     const data = await this.request<{ access_token: string }>('/api/auth/register', {
@@ -85,12 +116,12 @@ class ApiClient {
   }
 
   // Chat
-  async getConversations() {
-    return this.request<Array<{
+  async getConversations(cursor?: string) {
+    return this.requestPage<{
       id: number;
       title: string;
       created_at: string;
-    }>>('/api/chat/conversations');
+    }>(`/api/chat/conversations${toQuery({ cursor })}`);
   }
 
   async getConversation(id: number) {
@@ -117,6 +148,74 @@ class ApiClient {
     });
   }
 
+  /**
+   * Send a message and receive the reply as server-sent events.
+   * `onToken` is called for every chunk; resolves once the reply is saved.
+   */
+  async sendMessageStream(
+    message: string,
+    conversationId: number | undefined,
+    handlers: {
+      onStart?: (data: {
+        conversation_id: number;
+        message: { id: number; role: string; content: string; created_at: string };
+      }) => void;
+      onToken?: (text: string) => void;
+      onError?: (detail: string) => void;
+    } = {},
+    signal?: AbortSignal
+  ) {
+    const token = this.getToken();
+    const response = await fetch(`${API_URL}/api/chat/send/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        ...(token ? { Authorization: `Bearer ${token}` } : {}),
+      },
+      body: JSON.stringify({ message, conversation_id: conversationId }),
+      signal,
+    });
+
+    if (!response.ok || !response.body) {
+      const error = await response.json().catch(() => ({ detail: 'An error occurred' }));
+      throw new Error(error.detail || 'An error occurred');
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let done: { response: { id: number; role: string; content: string; created_at: string } } | null = null;
+
+    while (true) {
+      const { value, done: finished } = await reader.read();
+      if (finished) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      let boundary = buffer.indexOf('\n\n');
+      while (boundary !== -1) {
+        const raw = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        boundary = buffer.indexOf('\n\n');
+
+        let event = 'message';
+        let data = '';
+        for (const line of raw.split('\n')) {
+          if (line.startsWith('event: ')) event = line.slice(7);
+          else if (line.startsWith('data: ')) data += line.slice(6);
+        }
+        if (!data) continue;
+        const payload = JSON.parse(data);
+
+        if (event === 'start') handlers.onStart?.(payload);
+        else if (event === 'token') handlers.onToken?.(payload.text);
+        else if (event === 'error') handlers.onError?.(payload.detail);
+        else if (event === 'done') done = payload;
+      }
+    }
+
+    return done;
+  }
+
   async deleteConversation(id: number) {
     return this.request<{ status: string }>(`/api/chat/conversations/${id}`, {
       method: 'DELETE',
@@ -183,9 +282,10 @@ class ApiClient {
     status?: string;
     content_type?: string;
     platform?: string;
+    limit?: number;
+    cursor?: string;
   }) {
-    const query = new URLSearchParams(params as Record<string, string>).toString();
-    return this.request<Array<any>>(`/api/content/?${query}`);
+    return this.requestPage<any>(`/api/content/${toQuery(params)}`);
   }
 
   async publishContent(id: number) {
@@ -195,8 +295,12 @@ class ApiClient {
   }
 
   // Campaigns
-  async listCampaigns() {
-    return this.request<Array<any>>('/api/campaigns/');
+  async listCampaigns(cursor?: string) {
+    return this.requestPage<any>(`/api/campaigns/${toQuery({ cursor })}`);
+  }
+
+  async listCampaignContent(campaignId: number, cursor?: string) {
+    return this.requestPage<any>(`/api/campaigns/${campaignId}/content${toQuery({ cursor })}`);
   }
 
   async createCampaign(data: { name: string; description?: string; objective?: string }) {
@@ -89,6 +89,7 @@ export const translations = {
     'chat.suggestions.2': 'What strategy should I use to increase engagement?',
     'chat.suggestions.3': 'Generate a week of content for me',
     'chat.newChat': 'New chat',
+    'chat.loadMore': 'Load more',
     'chat.disclaimer': 'Marko can make mistakes. Verify important information.',
     
     // Dashboard
@@ -190,6 +191,7 @@ export const translations = {
     'chat.suggestions.2': 'Quelle stratégie pour augmenter mon engagement ?',
     'chat.suggestions.3': 'Génère-moi une semaine de contenu',
     'chat.newChat': 'Nouvelle conversation',
+    'chat.loadMore': 'Charger plus',
     'chat.disclaimer': 'Marko peut faire des erreurs. Vérifie les informations importantes.',
     
     // Dashboard